@@ -6,6 +6,8 @@ export const API_ENDPOINTS = {
   LOGIN: `${API_BASE_URL}/api/auth/login/`,
   AUTH_USERS: `${API_BASE_URL}/api/auth-users/`,
   ME: `${API_BASE_URL}/api/me/`,
+  ME_RESERVAS: `${API_BASE_URL}/api/me/reservas/`,
+  ME_PAGOS: `${API_BASE_URL}/api/me/pagos/`,
   
   // Recursos
   USUARIOS: `${API_BASE_URL}/api/usuarios/`,
@@ -13,6 +15,7 @@ export const API_ENDPOINTS = {
   RESERVAS: `${API_BASE_URL}/api/reservas/`,
   PAGOS: `${API_BASE_URL}/api/pagos/`,
   DIFUNTOS: `${API_BASE_URL}/api/difuntos/`,
+  STATS: `${API_BASE_URL}/api/stats/`,
 };
 
 export default API_BASE_URL;
@@ -41,70 +41,33 @@ import {
   Legend,
   ResponsiveContainer,
 } from 'recharts';
-import {
-  usuarioService,
-  parcelaService,
-  reservaService,
-  pagoService,
-  difuntoService,
-} from '../../services/apiService';
+import { statsService } from '../../services/apiService';
 
 const DashboardPage = () => {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
-  const [rawData, setRawData] = useState({
-    parcelas: [],
-    reservas: [],
-    pagos: [],
-  });
 
   useEffect(() => {
     const fetchStats = async () => {
       try {
         setLoading(true);
-        const [usuarios, parcelas, reservas, pagos, difuntos] = await Promise.all([
-          usuarioService.getAll(),
-          parcelaService.getAll(),
-          reservaService.getAll(),
-          pagoService.getAll(),
-          difuntoService.getAll(),
-        ]);
-
-        const parcelasArray = Array.isArray(parcelas) ? parcelas : parcelas.results || [];
-        const reservasArray = Array.isArray(reservas) ? reservas : reservas.results || [];
-        const pagosArray = Array.isArray(pagos) ? pagos : pagos.results || [];
-
-        setRawData({
-          parcelas: parcelasArray,
-          reservas: reservasArray,
-          pagos: pagosArray,
-        });
+        // Una sola petición: los conteos y sumas se calculan en el servidor
+        const data = await statsService.get();
 
         setStats({
-          usuarios: Array.isArray(usuarios) ? usuarios.length : usuarios.results?.length || 0,
-          parcelas: {
-            total: parcelasArray.length,
-            disponibles: parcelasArray.filter(p => p.estado === 'DISPONIBLE').length,
-            ocupadas: parcelasArray.filter(p => p.estado === 'OCUPADA').length,
-            reservadas: parcelasArray.filter(p => p.estado === 'RESERVADA').length,
-          },
-          reservas: {
-            total: reservasArray.length,
-            pendientes: reservasArray.filter(r => r.estado === 'PENDIENTE').length,
-            confirmadas: reservasArray.filter(r => r.estado === 'CONFIRMADA').length,
-            canceladas: reservasArray.filter(r => r.estado === 'CANCELADA').length,
-          },
+          usuarios: data.usuarios,
+          parcelas: data.parcelas,
+          reservas: data.reservas,
           pagos: {
-            total: pagosArray.length,
-            pendientes: pagosArray.filter(p => p.estado_pago === 'PENDIENTE').length,
-            pagados: pagosArray.filter(p => p.estado_pago === 'PAGADO').length,
-            totalMonto: pagosArray.reduce((sum, p) => sum + parseFloat(p.monto || 0), 0),
-            montoPagado: pagosArray
-              .filter(p => p.estado_pago === 'PAGADO')
-              .reduce((sum, p) => sum + parseFloat(p.monto || 0), 0),
+            total: data.pagos.total,
+            pendientes: data.pagos.pendientes,
+            pagados: data.pagos.pagados,
+            totalMonto: Number(data.pagos.monto_total),
+            montoPagado: Number(data.pagos.monto_pagado),
+            montoPorMetodo: data.pagos.monto_por_metodo,
           },
-          difuntos: Array.isArray(difuntos) ? difuntos.length : difuntos.results?.length || 0,
+          difuntos: data.difuntos,
         });
         setError(null);
       } catch (err) {
@@ -143,16 +106,9 @@ const DashboardPage = () => {
     { name: 'Canceladas', value: stats?.reservas.canceladas || 0, color: '#ef4444' },
   ];
 
-  const metodosPago = rawData.pagos.reduce((acc, pago) => {
-    const metodo = pago.metodo_pago || 'Otro';
-    if (!acc[metodo]) acc[metodo] = 0;
-    acc[metodo] += parseFloat(pago.monto || 0);
-    return acc;
-  }, {});
-
-  const metodosPagoData = Object.entries(metodosPago).map(([name, value]) => ({
+  const metodosPagoData = Object.entries(stats?.pagos.montoPorMetodo || {}).map(([name, value]) => ({
     name,
-    monto: value,
+    monto: Number(value),
   }));
 
   const statCards = [
@@ -26,7 +26,7 @@ import {
   Visibility,
 } from '@mui/icons-material';
 import { useAuth } from '../../contexts/AuthContext';
-import { reservaService, pagoService } from '../../services/apiService';
+import { meService } from '../../services/apiService';
 
 const ClienteDashboard = () => {
   const { user } = useAuth();
@@ -34,19 +34,24 @@ const ClienteDashboard = () => {
   const [stats, setStats] = useState({
     reservas: [],
     pagos: [],
+    totalesReservas: {},
+    totalesPagos: {},
   });
 
   useEffect(() => {
     const fetchData = async () => {
       try {
+        // Solo los datos del usuario; los totales vienen calculados del servidor
         const [reservasData, pagosData] = await Promise.all([
-          reservaService.getAll(),
-          pagoService.getAll(),
+          meService.getReservas(),
+          meService.getPagos(),
         ]);
         
         setStats({
-          reservas: reservasData.results || reservasData || [],
-          pagos: pagosData.results || pagosData || [],
+          reservas: reservasData.results || [],
+          pagos: pagosData.results || [],
+          totalesReservas: reservasData.totales || {},
+          totalesPagos: pagosData.totales || {},
         });
       } catch (error) {
         console.error('Error al cargar datos:', error);
@@ -66,18 +71,16 @@ const ClienteDashboard = () => {
     );
   }
 
-  const reservasPendientes = stats.reservas.filter(r => r.estado === 'PENDIENTE').length;
-  const reservasConfirmadas = stats.reservas.filter(r => r.estado === 'CONFIRMADA').length;
-  const pagosPendientes = stats.pagos.filter(p => p.estado_pago === 'PENDIENTE').length;
-  const pagosCompletados = stats.pagos.filter(p => p.estado_pago === 'PAGADO').length;
-  const totalPagado = stats.pagos
-    .filter(p => p.estado_pago === 'PAGADO')
-    .reduce((sum, p) => sum + parseFloat(p.monto || 0), 0);
+  const reservasPendientes = stats.totalesReservas.pendientes || 0;
+  const reservasConfirmadas = stats.totalesReservas.confirmadas || 0;
+  const pagosPendientes = stats.totalesPagos.pendientes || 0;
+  const pagosCompletados = stats.totalesPagos.pagados || 0;
+  const totalPagado = parseFloat(stats.totalesPagos.monto_pagado || 0);
 
   const statCards = [
     {
       title: 'Total Reservas',
-      value: stats.reservas.length,
+      value: stats.totalesReservas.total || 0,
       subtitle: `${reservasConfirmadas} confirmadas`,
       icon: <EventIcon />,
       gradient: 'linear-gradient(135deg, #0d9488 0%, #14b8a6 100%)',
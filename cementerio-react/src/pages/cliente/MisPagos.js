@@ -29,7 +29,7 @@ import {
   TrendingUp,
   Receipt,
 } from '@mui/icons-material';
-import { pagoService } from '../../services/apiService';
+import { meService } from '../../services/apiService';
 
 const MisPagos = () => {
   const [pagos, setPagos] = useState([]);
@@ -41,7 +41,7 @@ const MisPagos = () => {
     const fetchPagos = async () => {
       try {
         setLoading(true);
-        const data = await pagoService.getAll();
+        const data = await meService.getPagos();
         setPagos(Array.isArray(data) ? data : data.results || []);
         setError(null);
       } catch (err) {
@@ -28,7 +28,7 @@ import {
   Visibility,
   FilterList,
 } from '@mui/icons-material';
-import { reservaService } from '../../services/apiService';
+import { meService } from '../../services/apiService';
 
 const MisReservas = () => {
   const [reservas, setReservas] = useState([]);
@@ -40,7 +40,7 @@ const MisReservas = () => {
     const fetchReservas = async () => {
       try {
         setLoading(true);
-        const data = await reservaService.getAll();
+        const data = await meService.getReservas();
         setReservas(Array.isArray(data) ? data : data.results || []);
         setError(null);
       } catch (err) {
@@ -71,6 +71,23 @@ export const meService = {
     const response = await axios.patch(API_ENDPOINTS.ME, data);
     return response.data;
   },
+  // Solo las reservas (con sus pagos) y los pagos del usuario, con totales por estado
+  getReservas: async (params = {}) => {
+    const response = await axios.get(API_ENDPOINTS.ME_RESERVAS, { params });
+    return response.data;
+  },
+  getPagos: async (params = {}) => {
+    const response = await axios.get(API_ENDPOINTS.ME_PAGOS, { params });
+    return response.data;
+  },
+};
+
+// Estadísticas agregadas del dashboard de administración
+export const statsService = {
+  get: async () => {
+    const response = await axios.get(API_ENDPOINTS.STATS);
+    return response.data;
+  },
 };
 
 const apiServices = {
@@ -81,6 +98,7 @@ const apiServices = {
   difuntos: difuntoService,
   authUsers: authUserService,
   me: meService,
+  stats: statsService,
 };
 
 export default apiServices;
@@ -0,0 +1,196 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist, ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.permissions import BasePermission, IsAdminUser
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .authentication import aauthenticate
+from .db_router import leer_de, replica_para
+from .exceptions import custom_exception_handler
+from .renderers import FastJSONRenderer
+
+
+class AsyncViewSetView(View):
+    """
+    Base de las vistas de lectura async.
+
+    Reutiliza el viewset síncrono (queryset, filtros, ?fields=/?expand=,
+    permisos y RowSerializer) pero ejecuta las consultas con el ORM async
+    (aiterator, acount, aget), así que bajo un worker ASGI una petición que
+    espera a la base de datos no ocupa un worker entero. Las respuestas
+    tienen el mismo formato que las del viewset.
+    """
+    viewset_class = None
+    action = None
+    # Clases de permiso propias de la vista; None = las del viewset
+    permission_classes = None
+    # Alcance de ExpensiveRateThrottle, como el throttle_scope de la acción
+    throttle_scope = None
+    # Algunos filtros consultan la base de datos al construir el queryset
+    # (la búsqueda de difuntos en SQLite): se ejecutan en un hilo
+    sync_filters = False
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            user = await aauthenticate(request)
+            request.user = user
+            viewset = self.get_viewset(request, kwargs, user)
+            self.check_permissions(viewset)
+            self.check_throttles(viewset)
+            # La ContextVar llega a los hilos de sync_to_async del ORM async
+            with leer_de(replica_para(request)):
+                return await self.handle(viewset)
+        except Http404 as exc:
+            return self.handle_exception(exceptions.NotFound(str(exc) or None))
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    def get_viewset(self, request, kwargs, user):
+        if self.viewset_class is None:
+            raise ImproperlyConfigured(f"{type(self).__name__} necesita viewset_class")
+        drf_request = Request(request, authenticators=())
+        drf_request.user = user
+        viewset = self.viewset_class(
+            request=drf_request,
+            args=(),
+            kwargs=kwargs,
+            format_kwarg=None,
+            action=self.action,
+            basename=self.viewset_class.queryset.model._meta.model_name,
+        )
+        viewset.headers = {}
+        if self.throttle_scope:
+            viewset.throttle_scope = self.throttle_scope
+        return viewset
+
+    def check_permissions(self, viewset):
+        permisos = (
+            [permiso() for permiso in self.permission_classes]
+            if self.permission_classes is not None else viewset.get_permissions()
+        )
+        for permiso in permisos:
+            if not permiso.has_permission(viewset.request, viewset):
+                if not viewset.request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permiso, "message", None))
+
+    @staticmethod
+    def check_throttles(viewset):
+        """
+        Los mismos límites que APIView.check_throttles. Los cubos son un
+        UPSERT en un SQLite local de microsegundos: no merece un hilo.
+        """
+        esperas = [
+            throttle.wait() for throttle in viewset.get_throttles()
+            if not throttle.allow_request(viewset.request, viewset)
+        ]
+        if esperas:
+            esperas = [espera for espera in esperas if espera is not None]
+            raise exceptions.Throttled(max(esperas, default=None))
+
+    async def build_queryset(self, viewset, rows):
+        if self.sync_filters:
+            return await sync_to_async(viewset.get_row_values)(rows, viewset.get_queryset())
+        return viewset.get_row_values(rows, viewset.get_queryset())
+
+    def get_row_serializer(self, viewset):
+        rows = viewset.get_row_serializer()
+        if rows is None:
+            raise ImproperlyConfigured(f"{viewset.get_serializer_class().__name__} no es compatible con RowSerializer")
+        return rows
+
+    @staticmethod
+    def render(data, status=200):
+        return HttpResponse(FastJSONRenderer().render(data), status=status, content_type="application/json")
+
+    def handle_exception(self, exc):
+        response = custom_exception_handler(exc, {"view": self})
+        http_response = self.render(response.data, status=response.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            http_response["WWW-Authenticate"] = "Token"
+        if "Retry-After" in response:
+            http_response["Retry-After"] = response["Retry-After"]
+        return http_response
+
+
+class AsyncListView(AsyncViewSetView):
+    """GET api/async/{prefijo}/: listado paginado (por número o por cursor)."""
+    action = "list"
+
+    async def handle(self, viewset):
+        rows = self.get_row_serializer(viewset)
+        queryset = await self.build_queryset(viewset, rows)
+        paginator = viewset.paginator
+        if hasattr(paginator, "apaginate_queryset"):
+            filas = await paginator.apaginate_queryset(queryset, viewset.request, view=viewset)
+            return self.render(paginator.get_paginated_response(await rows.aserialize(filas)).data)
+        if paginator is None:
+            return self.render(await rows.aserialize([fila async for fila in queryset]))
+        return self.render(await self.paginate_by_number(paginator, rows, queryset, viewset.request))
+
+    @staticmethod
+    async def paginate_by_number(paginator, rows, queryset, request):
+        """Lo mismo que PageNumberPagination, con acount() y aiterator()."""
+        page_size = paginator.get_page_size(request)
+        if not page_size:
+            return await rows.aserialize([fila async for fila in queryset])
+
+        count = await queryset.acount()
+        paginas = max(1, math.ceil(count / page_size))
+        valor = request.query_params.get(paginator.page_query_param) or 1
+        try:
+            numero = paginas if valor in paginator.last_page_strings else int(valor)
+        except ValueError:
+            numero = 0
+        if not 1 <= numero <= paginas:
+            raise exceptions.NotFound(paginator.invalid_page_message.format(page_number=valor, message=""))
+
+        inicio = (numero - 1) * page_size
+        filas = [fila async for fila in queryset[inicio:inicio + page_size]]
+        url = request.build_absolute_uri()
+        siguiente = replace_query_param(url, paginator.page_query_param, numero + 1) if numero < paginas else None
+        if numero == 1:
+            anterior = None
+        elif numero == 2:
+            anterior = remove_query_param(url, paginator.page_query_param)
+        else:
+            anterior = replace_query_param(url, paginator.page_query_param, numero - 1)
+        return {
+            "count": count,
+            "next": siguiente,
+            "previous": anterior,
+            "results": await rows.aserialize(filas),
+        }
+
+
+class AsyncDetailView(AsyncViewSetView):
+    """GET api/async/{prefijo}/{pk}/"""
+    action = "retrieve"
+
+    async def handle(self, viewset):
+        rows = self.get_row_serializer(viewset)
+        queryset = await self.build_queryset(viewset, rows)
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        try:
+            fila = await queryset.aget(**{viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]})
+        except (ObjectDoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise exceptions.NotFound()
+        if any(type(p).has_object_permission is not BasePermission.has_object_permission
+               for p in viewset.get_permissions()):
+            await sync_to_async(viewset.check_object_permissions)(viewset.request, await sync_to_async(viewset.get_object)())
+        return self.render((await rows.aserialize([fila]))[0])
+
+
+class AsyncExportView(AsyncViewSetView):
+    """GET api/async/{prefijo}/export/: la exportación CSV/NDJSON leída con aiterator()."""
+    action = "export"
+    permission_classes = [IsAdminUser]
+    throttle_scope = "exportacion"
+
+    async def handle(self, viewset):
+        return viewset.aexport(viewset.request)
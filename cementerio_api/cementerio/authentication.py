@@ -0,0 +1,158 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from . import metrics
+
+
+USER_VERSION_KEY = "cementerio:auth:user:{}"
+
+
+class TokenCache:
+    """
+    Cache LRU con TTL de token -> (usuario, token) dentro del proceso.
+
+    Cada entrada guarda la versión del usuario en la caché compartida; al
+    modificar o borrar el usuario (o su token) la versión cambia y la
+    entrada deja de valer también en los demás workers de gunicorn.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                user, token, version, expires = entry
+                if expires < time.monotonic() or version != get_user_version(user.pk):
+                    del self._entries[key]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.inc("cementerio_cache_requests_total", cache="token", result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.inc("cementerio_cache_requests_total", cache="token", result="hit")
+            return user, token
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._entries[key] = (user, token, get_user_version(user.pk), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        bump_user_version(user_id)
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[0].pk == user_id]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def get_user_version(user_id):
+    return cache.get(USER_VERSION_KEY.format(user_id), 0)
+
+
+def bump_user_version(user_id):
+    cache.set(USER_VERSION_KEY.format(user_id), time.time_ns(), None)
+
+
+token_cache = TokenCache(
+    max_size=getattr(settings, "TOKEN_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "TOKEN_CACHE_TTL", 300),
+)
+
+
+def token_expirado(token):
+    expiration = getattr(settings, "TOKEN_EXPIRATION_SECONDS", None)
+    return bool(expiration) and (timezone.now() - token.created).total_seconds() > expiration
+
+
+def comprobar_expiracion(token):
+    if token_expirado(token):
+        raise exceptions.AuthenticationFailed("Token expirado.")
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication sin consulta a la base de datos cuando el token ya
+    está en la cache. Si TOKEN_EXPIRATION_SECONDS está definido, los tokens
+    más antiguos se rechazan.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+        else:
+            user, token = cached
+
+        comprobar_expiracion(token)
+
+        # Copia para que los cambios de la vista no alteren la entrada cacheada
+        return copy.copy(user), token
+
+
+async def aauthenticate(request):
+    """
+    Autenticación de las vistas async (cementerio.async_views): el mismo
+    token con la misma cache que CachedTokenAuthentication, consultando la
+    base de datos con el ORM async solo en un fallo de cache; sin token,
+    la sesión de Django. Devuelve el usuario (o AnonymousUser).
+    """
+    auth = request.headers.get("Authorization", "").split()
+    if not auth or auth[0].lower() != TokenAuthentication.keyword.lower():
+        return await request.auser()
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed("Cabecera de token inválida.")
+
+    key = auth[1]
+    cached = token_cache.get(key)
+    if cached is None:
+        model = CachedTokenAuthentication().get_model()
+        try:
+            token = await model.objects.select_related("user").aget(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed("Token inválido.")
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed("Usuario inactivo o eliminado.")
+        token_cache.set(key, token.user, token)
+        user = token.user
+    else:
+        user, token = cached
+
+    comprobar_expiracion(token)
+    return copy.copy(user)
@@ -0,0 +1,213 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.db import OperationalError
+
+from .. import metrics
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones DB-API de un alias en un proceso.
+
+    Las conexiones libres se reutilizan en orden LIFO (la última devuelta es
+    la que más probablemente sigue viva). Una conexión que lleva más de
+    `check_after` segundos libre se comprueba antes de entregarla, y una
+    con más de `max_lifetime` segundos se cierra y se sustituye. Si las
+    `max_size` conexiones están en uso se espera hasta `timeout` segundos.
+
+    Los eventos (created, reused, acquired, released, discarded,
+    health_check_failed, timeout) van a /metrics; stats() da la foto del
+    proceso.
+    """
+
+    def __init__(self, alias, max_size=10, timeout=30, check_after=30, max_lifetime=3600):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+        self._libres = deque()  # (conexión, creada_en, devuelta_en)
+        self._creadas_en = {}
+        self._abiertas = 0
+        self._cond = threading.Condition()
+        self._contadores = dict.fromkeys(
+            ("created", "reused", "acquired", "released", "discarded", "health_check_failed", "timeout"), 0,
+        )
+
+    def _evento(self, evento, n=1):
+        self._contadores[evento] += n
+        metrics.inc("cementerio_db_pool_connections_total", n, alias=self.alias, event=evento)
+
+    def acquire(self, crear, comprobar=None):
+        """Una conexión libre (comprobada si hace falta) o una nueva con crear()."""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        while True:
+            with self._cond:
+                while not self._libres and self._abiertas >= self.max_size:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._evento("timeout")
+                        raise PoolTimeout(
+                            f"Sin conexiones libres en el pool de '{self.alias}' tras {self.timeout}s "
+                            f"({self.max_size} en uso)"
+                        )
+                    self._cond.wait(restante)
+                if self._libres:
+                    conexion, creada_en, devuelta_en = self._libres.pop()
+                else:
+                    conexion = None
+                    self._abiertas += 1
+
+            ahora = time.monotonic()
+            if conexion is None:
+                try:
+                    conexion = crear()
+                except BaseException:
+                    self._liberar_hueco()
+                    raise
+                with self._cond:
+                    self._creadas_en[id(conexion)] = ahora
+                    self._evento("created")
+                break
+            if self.max_lifetime is not None and ahora - creada_en > self.max_lifetime:
+                self._descartar(conexion)
+                continue
+            if comprobar is not None and ahora - devuelta_en > self.check_after and not comprobar(conexion):
+                with self._cond:
+                    self._evento("health_check_failed")
+                self._descartar(conexion)
+                continue
+            with self._cond:
+                self._evento("reused")
+            break
+
+        with self._cond:
+            self._evento("acquired")
+        metrics.observe("cementerio_db_pool_wait_seconds", time.monotonic() - inicio, alias=self.alias)
+        return conexion
+
+    def release(self, conexion, reutilizable=True):
+        """Devuelve una conexión al pool; si no es reutilizable se cierra."""
+        with self._cond:
+            self._evento("released")
+            if reutilizable:
+                self._libres.append((conexion, self._creadas_en[id(conexion)], time.monotonic()))
+                self._cond.notify()
+                return
+        self._descartar(conexion)
+
+    def _descartar(self, conexion):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._creadas_en.pop(id(conexion), None)
+            self._evento("discarded")
+        self._liberar_hueco()
+
+    def _liberar_hueco(self):
+        with self._cond:
+            self._abiertas -= 1
+            self._cond.notify()
+
+    def close(self):
+        """Cierra las conexiones libres (las que están en uso se cierran al devolverlas)."""
+        with self._cond:
+            libres, self._libres = list(self._libres), deque()
+        for conexion, _, _ in libres:
+            self._descartar(conexion)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "alias": self.alias,
+                "max_size": self.max_size,
+                "open": self._abiertas,
+                "idle": len(self._libres),
+                "in_use": self._abiertas - len(self._libres),
+                **self._contadores,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, opciones):
+    """El pool de `alias` en este proceso (uno nuevo tras un fork de gunicorn)."""
+    clave = (os.getpid(), alias)
+    pool = _pools.get(clave)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(clave)
+            if pool is None:
+                pool = _pools[clave] = ConnectionPool(alias, **{k.lower(): v for k, v in opciones.items()})
+                atexit.register(pool.close)
+    return pool
+
+
+def pool_stats():
+    """stats() de los pools de este proceso."""
+    return [pool.stats() for (pid, _), pool in _pools.items() if pid == os.getpid()]
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mezcla para un DatabaseWrapper de Django: si el alias tiene "POOL" en
+    DATABASES, connect() toma una conexión del pool y close() la devuelve.
+    Con CONN_MAX_AGE = 0 Django cierra la conexión al acabar cada petición,
+    que es justo cuando vuelve al pool; funciona igual bajo ASGI, donde
+    las conexiones persistentes por hilo no se reutilizan.
+    """
+
+    @property
+    def pool(self):
+        opciones = self.settings_dict.get("POOL")
+        if not opciones:
+            return None
+        return get_pool(self.alias, opciones)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.acquire(partial(super().get_new_connection, conn_params), self.comprobar_conexion)
+
+    @staticmethod
+    def comprobar_conexion(conexion):
+        try:
+            cursor = conexion.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            conexion.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def limpiar_conexion(conexion):
+        """Deshace la transacción que quedara abierta; False si la conexión no sirve."""
+        try:
+            conexion.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        pool.release(self.connection, self.limpiar_conexion(self.connection))
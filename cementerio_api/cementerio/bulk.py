@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.serializers import PrimaryKeyRelatedField
+
+from .cache import invalidate_model_on_commit
+from .rollups import anteriores, registrar_lote
+from .sync import Sello
+
+
+class BulkMixin:
+    """
+    POST/PATCH/DELETE {prefijo}/bulk/ con listas de filas.
+
+    Valida por lotes (las claves foráneas se resuelven con una consulta por
+    lote), escribe con bulk_create/bulk_update en un único bloque atómico y
+    devuelve los errores por fila. Si alguna fila es inválida no se escribe
+    nada.
+    """
+    bulk_batch_size = 1000
+
+    def get_bulk_max_rows(self):
+        return getattr(settings, "BULK_MAX_ROWS", 10000)
+
+    def preparar_instancia_bulk(self, instance):
+        """Gancho para mantener campos derivados que save() calcularía."""
+
+    @staticmethod
+    def _to_pk(model, valor):
+        try:
+            return model._meta.pk.to_python(valor)
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def _lotes(self, filas):
+        for inicio in range(0, len(filas), self.bulk_batch_size):
+            yield inicio, filas[inicio:inicio + self.bulk_batch_size]
+
+    def _related_cache(self, serializer_class, filas):
+        """Carga en una consulta por modelo las instancias referenciadas en el lote."""
+        related = {}
+        for name, field in serializer_class().fields.items():
+            if not isinstance(field, PrimaryKeyRelatedField) or field.read_only:
+                continue
+            queryset = field.get_queryset()
+            model = queryset.model
+            pks = {self._to_pk(model, fila.get(name)) for fila in filas if isinstance(fila, dict)}
+            pks.discard(None)
+            related.setdefault(model, {}).update(queryset.in_bulk(pks))
+        return related
+
+    def _validar_filas(self, request):
+        filas = request.data
+        if not isinstance(filas, list):
+            return None, Response(
+                {"detail": "Se esperaba una lista de objetos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(filas) > self.get_bulk_max_rows():
+            return None, Response(
+                {"detail": f"Máximo {self.get_bulk_max_rows()} filas por petición."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return filas, None
+
+    def _errores(self, errores):
+        return Response({"errores": errores}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=["post", "patch", "delete"], url_path="bulk")
+    def bulk(self, request):
+        if request.method == "POST":
+            return self.bulk_create(request)
+        if request.method == "PATCH":
+            return self.bulk_update(request)
+        return self.bulk_destroy(request)
+
+    def bulk_create(self, request):
+        filas, error = self._validar_filas(request)
+        if error:
+            return error
+        serializer_class = self.get_serializer_class()
+        model = serializer_class.Meta.model
+        instancias, errores = [], []
+
+        for inicio, lote in self._lotes(filas):
+            context = {**self.get_serializer_context(), "related_cache": self._related_cache(serializer_class, lote)}
+            serializer = serializer_class(data=lote, many=True, context=context)
+            if not serializer.is_valid():
+                errores.extend(
+                    {"fila": inicio + i, "errores": e}
+                    for i, e in enumerate(serializer.errors) if e
+                )
+                continue
+            for datos in serializer.validated_data:
+                instancia = model(**datos)
+                self.preparar_instancia_bulk(instancia)
+                instancias.append(instancia)
+
+        if errores:
+            return self._errores(errores)
+
+        with transaction.atomic():
+            sello = Sello()
+            creadas = model.objects.bulk_create(instancias, batch_size=self.bulk_batch_size)
+            registrar_lote(model, {}, creadas)
+            invalidate_model_on_commit(model)
+            sello.comprobar()
+        return Response(
+            {"creados": len(creadas), "ids": [obj.pk for obj in creadas]},
+            status=status.HTTP_201_CREATED,
+        )
+
+    def bulk_update(self, request):
+        filas, error = self._validar_filas(request)
+        if error:
+            return error
+        serializer_class = self.get_serializer_class()
+        model = serializer_class.Meta.model
+        pk_name = model._meta.pk.name
+        instancias, campos, errores = [], set(), []
+
+        for inicio, lote in self._lotes(filas):
+            pks = [self._to_pk(model, fila.get(pk_name)) if isinstance(fila, dict) else None for fila in lote]
+            existentes = model.objects.in_bulk([pk for pk in pks if pk is not None])
+            context = {**self.get_serializer_context(), "related_cache": self._related_cache(serializer_class, lote)}
+            for i, (fila, pk) in enumerate(zip(lote, pks)):
+                instancia = existentes.get(pk)
+                if instancia is None:
+                    errores.append({"fila": inicio + i, "errores": {pk_name: ["No existe."]}})
+                    continue
+                serializer = serializer_class(instancia, data=fila, partial=True, context=context)
+                if not serializer.is_valid():
+                    errores.append({"fila": inicio + i, "errores": serializer.errors})
+                    continue
+                for campo, valor in serializer.validated_data.items():
+                    setattr(instancia, campo, valor)
+                    campos.add(campo)
+                self.preparar_instancia_bulk(instancia)
+                instancias.append(instancia)
+
+        if errores:
+            return self._errores(errores)
+
+        campos |= self.campos_derivados_bulk(campos)
+        if campos:
+            campos.add("updated_at")
+            with transaction.atomic():
+                previos = anteriores(model, [instancia.pk for instancia in instancias])
+                # bulk_update no aplica auto_now
+                sello = Sello()
+                for instancia in instancias:
+                    instancia.updated_at = sello.instante
+                model.objects.bulk_update(instancias, sorted(campos), batch_size=self.bulk_batch_size)
+                registrar_lote(model, previos, instancias)
+                invalidate_model_on_commit(model)
+                sello.comprobar()
+        return Response({"actualizados": len(instancias)})
+
+    def campos_derivados_bulk(self, campos):
+        """Campos extra a escribir en bulk_update cuando cambian `campos`."""
+        return set()
+
+    def bulk_destroy(self, request):
+        ids = request.data.get("ids") if isinstance(request.data, dict) else None
+        if not isinstance(ids, list):
+            return Response(
+                {"detail": 'Se esperaba {"ids": [...]}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        model = self.get_serializer_class().Meta.model
+        pks = [pk for pk in (self._to_pk(model, valor) for valor in ids) if pk is not None]
+        with transaction.atomic():
+            sello = Sello()
+            borrados, _ = model.objects.filter(pk__in=pks).delete()
+            invalidate_model_on_commit(model)
+            sello.comprobar()
+        return Response({"borrados": borrados})
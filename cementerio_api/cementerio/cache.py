@@ -0,0 +1,161 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+from .db_router import primaria_si_reciente
+
+
+STATS_CACHE_KEY = "cementerio:stats"
+VERSION_KEY = "cementerio:version:{}"
+# v2: (datos, cabeceras del instante en que se leyeron)
+RESPONSE_KEY = "cementerio:response:v2:{}"
+
+
+def get_stats_timeout():
+    return getattr(settings, "STATS_CACHE_TIMEOUT", 300)
+
+
+def get_response_timeout():
+    return getattr(settings, "RESPONSE_CACHE_TIMEOUT", 600)
+
+
+def invalidate_stats():
+    """Descarta las estadísticas cacheadas tras cualquier escritura."""
+    cache.delete(STATS_CACHE_KEY)
+
+
+def bump_version(model):
+    """
+    Marca un modelo como modificado. La versión es el instante del cambio en
+    nanosegundos, así sirve también para Last-Modified.
+    """
+    cache.set(VERSION_KEY.format(model._meta.label_lower), time.time_ns(), None)
+
+
+def get_versions(models):
+    keys = [VERSION_KEY.format(model._meta.label_lower) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_model(model):
+    """Invalida todo lo cacheado que depende de `model`.
+
+    Las señales lo llaman en cada save()/delete(); las escrituras masivas
+    (bulk_create, update()) no emiten señales y deben llamarlo a mano.
+    """
+    bump_version(model)
+    invalidate_stats()
+
+
+def invalidate_model_on_commit(model, using="default"):
+    """
+    Invalida ya y, si hay una transacción abierta, otra vez al confirmarla:
+    una lectura concurrente podría haber cacheado los datos anteriores con la
+    nueva versión.
+    """
+    invalidate_model(model)
+    if connections[using].in_atomic_block:
+        transaction.on_commit(lambda: invalidate_model(model), using=using)
+
+
+def auth_scope(request):
+    user = request.user
+    if user and user.is_authenticated:
+        return "staff" if user.is_staff else "auth"
+    return "anon"
+
+
+class CachedResponseMixin:
+    """
+    Cache de lectura para list/retrieve con ETag y Last-Modified.
+
+    La clave combina ruta, query string, alcance de autenticación y la versión
+    de cada modelo en `cache_dependencies`; si cualquiera de ellos cambia, la
+    clave cambia. Un If-None-Match que coincide devuelve 304 sin consultar la
+    base de datos.
+    """
+    cache_dependencies = None
+
+    def get_cache_dependencies(self):
+        model = self.get_queryset().model
+        modelos = list(self.cache_dependencies or [model])
+        # Las relaciones de ?expand= (sparse.py) salen en la respuesta: sus
+        # tablas también forman parte de la clave
+        opciones = self.get_serializer_options() if hasattr(self, "get_serializer_options") else {}
+        for nombre in opciones.get("expand", ()):
+            relacionado = model._meta.get_field(nombre).related_model
+            if relacionado not in modelos:
+                modelos.append(relacionado)
+        return modelos
+
+    def snapshot_headers(self):
+        """
+        Cabeceras que describen el instante de la lectura (X-Sync-Watermark):
+        se guardan con los datos y una respuesta de la cache lleva las suyas.
+        """
+        return {}
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        versions = get_versions(self.get_cache_dependencies())
+        fingerprint = "|".join([
+            request.get_full_path(),
+            auth_scope(request),
+            request.accepted_renderer.format,
+            ",".join(str(v) for v in versions),
+        ])
+        digest = hashlib.sha1(fingerprint.encode()).hexdigest()
+        etag = f'W/"{digest}"'
+        last_modified = max(versions) // 1_000_000_000
+
+        if self.not_modified(request, etag, last_modified):
+            metrics.inc("cementerio_cache_requests_total", cache="response", result="not_modified")
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = RESPONSE_KEY.format(digest)
+            entrada = cache.get(key)
+            if entrada is None:
+                metrics.inc("cementerio_cache_requests_total", cache="response", result="miss")
+                headers = self.snapshot_headers()
+                # Una réplica con retraso guardaría datos viejos con la versión nueva
+                with primaria_si_reciente(versions):
+                    response = handler(request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    cache.set(key, (response.data, headers), get_response_timeout())
+            else:
+                metrics.inc("cementerio_cache_requests_total", cache="response", result="hit")
+                data, headers = entrada
+                response = Response(data)
+            for nombre, valor in headers.items():
+                response[nombre] = valor
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ["Authorization", "Cookie"])
+        return response
+
+    @staticmethod
+    def not_modified(request, etag, last_modified):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
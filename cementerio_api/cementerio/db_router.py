@@ -0,0 +1,124 @@
+import hashlib
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+STICKY_KEY = "cementerio:sticky:{}"
+
+# Alias de la réplica de la que lee la petición en curso; None = primaria
+_alias_lectura = ContextVar("cementerio_alias_lectura", default=None)
+
+
+def get_read_replicas():
+    return getattr(settings, "READ_REPLICAS", [])
+
+
+def get_sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+
+def en_transaccion(connection):
+    """
+    True dentro de un transaction.atomic() del código. Como hace Django con
+    atomic(durable=True), no cuenta la transacción que abre TestCase.
+    """
+    return any(not bloque._from_testcase for bloque in connection.atomic_blocks)
+
+
+class PrimaryReplicaRouter:
+    """
+    Escrituras en "default"; lecturas de los modelos de cementerio en la
+    réplica elegida para la petición (ver ReplicaReadMixin). Fuera de esas
+    peticiones, y dentro de una transacción de la primaria, todo va a
+    "default". Usuarios y tokens se leen siempre de la primaria: un token
+    recién creado podría no haber llegado aún a la réplica.
+    """
+    app_labels = {"cementerio"}
+
+    def db_for_read(self, model, **hints):
+        alias = _alias_lectura.get()
+        if alias is None or model._meta.app_label not in self.app_labels:
+            return None
+        if en_transaccion(connections["default"]):
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria
+        return True
+
+
+class leer_de:
+    """Dirige las lecturas del bloque a `alias` (None = primaria)."""
+    __slots__ = ("alias", "token")
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __enter__(self):
+        self.token = _alias_lectura.set(self.alias)
+        return self.alias
+
+    def __exit__(self, *exc):
+        _alias_lectura.reset(self.token)
+
+
+def _clave_cliente(request):
+    """Identifica al cliente por su cabecera Authorization o, sin ella, por IP."""
+    credencial = request.headers.get("Authorization") or request.META.get("REMOTE_ADDR", "")
+    return STICKY_KEY.format(hashlib.sha256(credencial.encode()).hexdigest()[:32])
+
+
+def marcar_escritura(request):
+    """El cliente acaba de escribir: sus lecturas van a la primaria durante un rato."""
+    segundos = get_sticky_seconds()
+    if segundos > 0:
+        cache.set(_clave_cliente(request), True, segundos)
+
+
+def replica_para(request):
+    """Réplica para las lecturas de `request`, o None si debe leer de la primaria."""
+    replicas = get_read_replicas()
+    if not replicas or request.method not in SAFE_METHODS:
+        return None
+    if get_sticky_seconds() > 0 and cache.get(_clave_cliente(request)):
+        return None
+    return random.choice(replicas)
+
+
+def es_reciente(versiones):
+    """
+    True si alguno de los modelos (versiones de cache.get_versions) cambió
+    hace menos de REPLICA_STICKY_SECONDS: la réplica podría no tenerlo aún.
+    """
+    return bool(versiones) and time.time_ns() - max(versiones) < get_sticky_seconds() * 1_000_000_000
+
+
+def primaria_si_reciente(versiones):
+    """Lee de la primaria si los datos cambiaron hace poco; si no, de donde tocaba."""
+    return leer_de(None if es_reciente(versiones) else _alias_lectura.get())
+
+
+class ReplicaReadMixin:
+    """
+    Las peticiones GET/HEAD/OPTIONS leen de una réplica de READ_REPLICAS,
+    salvo que el mismo cliente haya escrito hace menos de
+    REPLICA_STICKY_SECONDS (lee sus propias escrituras). Las escrituras
+    marcan al cliente.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with leer_de(replica_para(request)):
+            response = super().dispatch(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS:
+            marcar_escritura(request)
+        return response
@@ -1,9 +1,15 @@
 from rest_framework.views import exception_handler
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, PermissionDenied
+
+from . import metrics
 
 
 def custom_exception_handler(exc, context):
+    if isinstance(exc, (AuthenticationFailed, NotAuthenticated, PermissionDenied)):
+        metrics.inc("cementerio_auth_failures_total", reason=exc.default_code)
+
     response = exception_handler(exc, context)
 
     if response is not None:
@@ -13,6 +19,8 @@ def custom_exception_handler(exc, context):
                 "status_code": response.status_code,
             },
             status=response.status_code,
+            # Retry-After de los 429 y WWW-Authenticate de los 401
+            headers={nombre: valor for nombre, valor in response.items() if nombre != "Content-Type"},
         )
 
     return Response(
@@ -22,3 +30,15 @@ def custom_exception_handler(exc, context):
         },
         status=status.HTTP_500_INTERNAL_SERVER_ERROR,
     )
+
+
+class ParcelaNoDisponible(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "La parcela no está disponible."
+    default_code = "parcela_no_disponible"
+
+
+class ResultadoNoDisponible(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "El trabajo aún no ha terminado correctamente."
+    default_code = "resultado_no_disponible"
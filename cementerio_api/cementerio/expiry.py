@@ -0,0 +1,147 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.utils import timezone
+
+from . import metrics
+from .cache import invalidate_model_on_commit
+from .models import Parcela, Reserva, Pago
+from .rollups import Deltas
+from .sync import Sello
+
+
+def get_expiry_days():
+    """Días que una reserva puede seguir PENDIENTE sin pagos PAGADO; None = no caducan."""
+    return getattr(settings, "RESERVA_EXPIRY_DAYS", 30)
+
+
+def get_expiry_batch():
+    return getattr(settings, "RESERVA_EXPIRY_BATCH", 1000)
+
+
+def caducadas(hoy=None, dias=None):
+    """
+    Reservas que cumplen la política: PENDIENTE, con fecha_reserva de hace
+    más de `dias` días y ningún pago PAGADO. Recorre el índice
+    (estado, fecha_reserva, id_reserva).
+    """
+    dias = get_expiry_days() if dias is None else dias
+    corte = (hoy or timezone.localdate()) - timedelta(days=dias)
+    pagadas = Pago.objects.filter(reserva=OuterRef("pk"), estado_pago="PAGADO")
+    return Reserva.objects.filter(estado="PENDIENTE", fecha_reserva__lt=corte).filter(~Exists(pagadas))
+
+
+def expirar_lote(queryset, limite, desde=None, using="default"):
+    """
+    Cancela como mucho `limite` reservas de `queryset` posteriores a
+    `desde` ((fecha_reserva, id_reserva) de la última vista), anula sus
+    pagos PENDIENTE y devuelve sus parcelas a DISPONIBLE, todo con UPDATE
+    sobre listas de ids en una transacción. Los rollups se ajustan con
+    deltas agrupados, sin leer las filas una a una.
+
+    Devuelve (contadores, última clave vista o None si no quedan).
+    """
+    contadores = {"reservas": 0, "pagos": 0, "parcelas": 0}
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        lote = queryset.using(using).order_by("fecha_reserva", "pk")
+        if desde is not None:
+            # El __gte redundante acota el rango del índice: sin él cada lote
+            # recorrería desde el principio las PENDIENTE que no caducan
+            lote = lote.filter(fecha_reserva__gte=desde[0]).filter(
+                Q(fecha_reserva__gt=desde[0]) | Q(fecha_reserva=desde[0], pk__gt=desde[1])
+            )
+        if connection.features.has_select_for_update_skip_locked:
+            # Las que alguien está editando quedan para la próxima pasada
+            lote = lote.select_for_update(skip_locked=True, of=("self",))
+        filas = list(lote.values_list("fecha_reserva", "pk", "parcela_id")[:limite])
+        if not filas:
+            return contadores, None
+        ultima = filas[-1][:2]
+
+        # Con las reservas bloqueadas nadie puede añadirles pagos: se vuelve
+        # a mirar por si alguno se confirmó entre la selección y el bloqueo
+        ids = {pk for _, pk, _ in filas}
+        ids -= set(
+            Pago.objects.using(using).filter(reserva_id__in=ids, estado_pago="PAGADO").values_list("reserva_id", flat=True)
+        )
+        if not ids:
+            return contadores, ultima
+        sello = Sello()
+        ahora = sello.instante
+        deltas = Deltas()
+        # En orden: dos barridos concurrentes bloquean las filas en el mismo orden
+        ordenados = sorted(ids)
+
+        reservas = Reserva.objects.using(using).filter(pk__in=ordenados)
+        # Agrupadas por columnas sin funciones (TruncMonth en SQLite es una
+        # función Python por fila); Deltas suma los días del mismo mes
+        deltas.mover_estado(Reserva, [
+            {"fecha_reserva": fila["fecha_reserva"], "sector": fila["parcela__sector"] or "", "n": fila["n"]}
+            for fila in reservas.order_by().values("fecha_reserva", "parcela__sector").annotate(n=Count("pk"))
+        ], "estado", "PENDIENTE", "CANCELADA")
+        contadores["reservas"] = reservas.update(estado="CANCELADA", updated_at=ahora)
+
+        pagos = Pago.objects.using(using).filter(reserva_id__in=ordenados, estado_pago="PENDIENTE")
+        deltas.mover_estado(Pago, [
+            {"fecha_pago": fila["fecha_pago"], "metodo_pago": fila["metodo_pago"], "monto": fila["total"], "n": fila["n"]}
+            for fila in pagos.order_by().values("fecha_pago", "metodo_pago").annotate(total=Sum("monto"), n=Count("pk"))
+        ], "estado_pago", "PENDIENTE", "ANULADO")
+        contadores["pagos"] = pagos.update(estado_pago="ANULADO", updated_at=ahora)
+
+        # Solo las parcelas que ya no tienen ninguna otra reserva activa
+        activas = Reserva.objects.filter(parcela=OuterRef("pk"), estado__in=["PENDIENTE", "CONFIRMADA"])
+        parcelas = list(
+            Parcela.objects.using(using)
+            .filter(pk__in=sorted({parcela_id for _, pk, parcela_id in filas if pk in ids}), estado="RESERVADA")
+            .filter(~Exists(activas)).select_for_update().order_by("pk").values_list("pk", "sector")
+        )
+        sectores = {}
+        for _, sector in parcelas:
+            sectores[sector] = sectores.get(sector, 0) + 1
+        deltas.mover_estado(Parcela, [{"sector": sector, "n": n} for sector, n in sectores.items()], "estado", "RESERVADA", "DISPONIBLE")
+        contadores["parcelas"] = Parcela.objects.using(using).filter(pk__in=[pk for pk, _ in parcelas]).update(
+            estado="DISPONIBLE", updated_at=ahora,
+        )
+
+        deltas.aplicar(using)
+        for model in (Reserva, Pago, Parcela):
+            invalidate_model_on_commit(model, using)
+        sello.comprobar()
+    return contadores, ultima
+
+
+def expirar_reservas(hoy=None, dias=None, lote=None, maximo=None, using="default"):
+    """
+    Barre todas las reservas caducadas en lotes de `lote` (RESERVA_EXPIRY_BATCH),
+    cada uno en su transacción: la memoria y el tiempo de bloqueo dependen
+    del lote y no del total pendiente. `maximo` limita las reservas vistas
+    en esta pasada. Devuelve los contadores de la pasada.
+    """
+    dias = get_expiry_days() if dias is None else dias
+    total = {"reservas": 0, "pagos": 0, "parcelas": 0, "lotes": 0}
+    if dias is None:
+        return total
+    lote = lote or get_expiry_batch()
+    queryset = caducadas(hoy, dias)
+    inicio = time.monotonic()
+    desde = None
+    vistas = 0
+    while maximo is None or vistas < maximo:
+        limite = lote if maximo is None else min(lote, maximo - vistas)
+        contadores, desde = expirar_lote(queryset, limite, desde, using)
+        if desde is None:
+            break
+        total["lotes"] += 1
+        vistas += limite
+        for clave, n in contadores.items():
+            total[clave] += n
+
+    for clave in ("reservas", "pagos", "parcelas"):
+        metrics.inc("cementerio_expiry_swept_total", total[clave], modelo=clave)
+    metrics.inc("cementerio_expiry_runs_total")
+    metrics.observe("cementerio_expiry_duration_seconds", time.monotonic() - inicio)
+    return total
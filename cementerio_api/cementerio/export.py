@@ -0,0 +1,113 @@
+import csv
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+
+
+class Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def filas_csv(encabezados, filas):
+    writer = csv.writer(Echo())
+    yield writer.writerow(encabezados)
+    for fila in filas:
+        yield writer.writerow(fila.values())
+
+
+def filas_ndjson(filas):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for fila in filas:
+        yield encoder.encode(fila) + "\n"
+
+
+async def afilas_csv(encabezados, filas):
+    writer = csv.writer(Echo())
+    yield writer.writerow(encabezados)
+    async for fila in filas:
+        yield writer.writerow(fila.values())
+
+
+async def afilas_ndjson(filas):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    async for fila in filas:
+        yield encoder.encode(fila) + "\n"
+
+
+class ExportMixin:
+    """
+    GET {prefijo}/export/?formato=csv|ndjson
+
+    Respeta los mismos parámetros de búsqueda, orden y filtro que el listado.
+    Las filas se leen con values() e iterator(), así que la memoria no crece
+    con el número de filas y los primeros bytes salen de inmediato. Bajo
+    ASGI se sirve aexport(): Django lee un iterador síncrono entero con
+    sync_to_async(list) antes de enviar el primer byte.
+    """
+    # (nombre de columna, lookup del ORM)
+    export_fields = []
+    export_chunk_size = 2000
+    export_formats = {
+        "csv": "text/csv; charset=utf-8",
+        "ndjson": "application/x-ndjson",
+    }
+    # La acción export lo cambia a "exportacion" (ExpensiveRateThrottle)
+    throttle_scope = None
+
+    def get_export_queryset(self):
+        lookups = [lookup for _, lookup in self.export_fields]
+        queryset = self.filter_queryset(self.get_queryset())
+        return queryset.values(*lookups)
+
+    def export_row(self, fila):
+        return {columna: fila[lookup] for columna, lookup in self.export_fields}
+
+    def iter_export_rows(self):
+        for fila in self.get_export_queryset().iterator(chunk_size=self.export_chunk_size):
+            yield self.export_row(fila)
+
+    async def aiter_export_rows(self):
+        async for fila in self.get_export_queryset().aiterator(chunk_size=self.export_chunk_size):
+            yield self.export_row(fila)
+
+    def get_export_format(self, request):
+        formato = request.query_params.get("formato", "csv")
+        if formato not in self.export_formats:
+            raise ValidationError({"formato": [f"Use uno de: {', '.join(self.export_formats)}."]})
+        return formato
+
+    def export_response(self, contenido, formato):
+        response = StreamingHttpResponse(contenido, content_type=self.export_formats[formato])
+        nombre = self.basename or "export"
+        response["Content-Disposition"] = f'attachment; filename="{nombre}s.{formato}"'
+        return response
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser], throttle_scope="exportacion")
+    def export(self, request):
+        if isinstance(request._request, ASGIRequest):
+            return self.aexport(request)
+        formato = self.get_export_format(request)
+        filas = self.iter_export_rows()
+        if formato == "csv":
+            contenido = filas_csv([nombre for nombre, _ in self.export_fields], filas)
+        else:
+            contenido = filas_ndjson(filas)
+        return self.export_response(contenido, formato)
+
+    def aexport(self, request):
+        """Igual que export() con el ORM async, para servirlo bajo ASGI (ver async_views)."""
+        formato = self.get_export_format(request)
+        filas = self.aiter_export_rows()
+        if formato == "csv":
+            contenido = afilas_csv([nombre for nombre, _ in self.export_fields], filas)
+        else:
+            contenido = afilas_ndjson(filas)
+        return self.export_response(contenido, formato)
@@ -0,0 +1,74 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+# Conjuntos de lookups habituales para filter_fields
+EXACTO = ("exact", "in")
+RANGO = ("exact", "in", "gte", "lte", "range")
+
+# Valores como máximo en ?campo__in= y ?campo__range=
+MAX_VALORES = 100
+
+
+class FieldFilterBackend(BaseFilterBackend):
+    """
+    Filtros declarativos sobre columnas de la tabla:
+
+        filter_fields = {"estado": EXACTO, "precio": RANGO}
+
+        ?estado=DISPONIBLE
+        ?estado__in=DISPONIBLE,RESERVADA
+        ?precio__gte=100&precio__lte=500
+        ?fecha_pago__range=2024-01-01,2024-01-31
+
+    Los valores se convierten con el campo del modelo (fechas, decimales,
+    ids de claves foráneas) y se comparan con la columna tal cual, sin
+    funciones ni LIKE, así que las condiciones pueden usar los índices.
+    Un valor inválido, una opción que no existe o un lookup no permitido
+    devuelven 400.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        campos = getattr(view, "filter_fields", None)
+        if not campos:
+            return queryset
+        filtros = {}
+        for parametro, valor in request.query_params.items():
+            nombre, _, lookup = parametro.partition("__")
+            if nombre not in campos or valor == "":
+                continue
+            lookup = lookup or "exact"
+            if lookup not in campos[nombre]:
+                raise ValidationError({
+                    parametro: f"Filtro no permitido. Use: {', '.join(self.nombres(nombre, campos[nombre]))}."
+                })
+            campo = queryset.model._meta.get_field(nombre)
+            filtros[f"{campo.attname}__{lookup}"] = self.convertir(campo, parametro, lookup, valor)
+        return queryset.filter(**filtros) if filtros else queryset
+
+    @staticmethod
+    def nombres(nombre, lookups):
+        return [nombre if lookup == "exact" else f"{nombre}__{lookup}" for lookup in lookups]
+
+    def convertir(self, campo, parametro, lookup, valor):
+        if lookup not in ("in", "range"):
+            return self.convertir_valor(campo, parametro, valor)
+        valores = [v.strip() for v in valor.split(",")]
+        if lookup == "range" and len(valores) != 2:
+            raise ValidationError({parametro: "Indique dos valores separados por coma: desde,hasta."})
+        if len(valores) > MAX_VALORES:
+            raise ValidationError({parametro: f"Como máximo {MAX_VALORES} valores."})
+        return [self.convertir_valor(campo, parametro, v) for v in valores]
+
+    @staticmethod
+    def convertir_valor(campo, parametro, valor):
+        destino = campo.target_field if campo.is_relation else campo
+        try:
+            valor = destino.to_python(valor)
+        except DjangoValidationError as exc:
+            raise ValidationError({parametro: exc.messages})
+        if campo.choices and valor not in dict(campo.flatchoices):
+            opciones = ", ".join(str(opcion) for opcion, _ in campo.flatchoices)
+            raise ValidationError({parametro: f"Valor no válido. Opciones: {opciones}."})
+        return valor
@@ -0,0 +1,181 @@
+import logging
+import re
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger("cementerio.sql")
+
+# Métricas de la petición en curso; None cuando la instrumentación está apagada
+_metricas = ContextVar("cementerio_metricas", default=None)
+
+# "IN (%s, %s, %s)" -> "IN (...)": la misma consulta con listas de distinto largo
+_LISTA_PARAMETROS = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+
+
+def forma_sql(sql):
+    """SQL sin la longitud de las listas de parámetros, para agrupar consultas repetidas."""
+    return _LISTA_PARAMETROS.sub("(...)", sql)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.serializer = 0.0
+        self.formas = {}
+        self.mas_lenta = (0.0, "")
+        self._serializando = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Envoltorio para connection.execute_wrapper()."""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.sql += duracion
+            forma = forma_sql(sql)
+            self.formas[forma] = self.formas.get(forma, 0) + 1
+            if duracion > self.mas_lenta[0]:
+                self.mas_lenta = (duracion, sql)
+
+    def repetidas(self, umbral):
+        return sorted(
+            ((n, forma) for forma, n in self.formas.items() if n >= umbral),
+            reverse=True,
+        )
+
+
+class medir_serializacion:
+    """
+    Suma el tiempo del bloque a "serializer". Los bloques anidados (un
+    serializador dentro de otro) no se cuentan dos veces. Es una clase y no
+    un @contextmanager para que, apagado, cueste solo una lectura de la
+    ContextVar por fila.
+    """
+    __slots__ = ("metricas", "inicio")
+
+    def __enter__(self):
+        metricas = _metricas.get()
+        if metricas is None or metricas._serializando:
+            self.metricas = None
+            return
+        metricas._serializando = True
+        self.metricas = metricas
+        self.inicio = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.metricas is not None:
+            self.metricas.serializer += time.perf_counter() - self.inicio
+            self.metricas._serializando = False
+
+
+class envolver_consultas:
+    """
+    Instala `wrapper` con execute_wrapper() en todas las conexiones.
+
+    Las conexiones son por hilo: en una petición ASGI las consultas corren
+    en el hilo de sync_to_async de esa petición, así que la versión async
+    (`async with`) instala y retira el envoltorio en ese mismo hilo.
+    """
+
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self.wrapper))
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+
+    async def __aenter__(self):
+        await sync_to_async(self.__enter__)()
+        return self
+
+    async def __aexit__(self, *exc):
+        await sync_to_async(self._stack.close)()
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Cuenta y cronometra las consultas SQL de cada petición.
+
+    Añade la cabecera Server-Timing (db, serializer, view) y registra en el
+    logger "cementerio.sql" las peticiones que superan SLOW_REQUEST_MS o
+    SLOW_REQUEST_QUERIES con su consulta más lenta, y las consultas que se
+    repiten N_PLUS_ONE_THRESHOLD veces o más (patrón N+1).
+
+    Con SQL_INSTRUMENTATION = False el middleware se descarta al arrancar
+    (MiddlewareNotUsed) y no añade ningún coste.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SQL_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.slow_ms = getattr(settings, "SLOW_REQUEST_MS", 500)
+        self.slow_queries = getattr(settings, "SLOW_REQUEST_QUERIES", 50)
+        self.n_plus_one = getattr(settings, "N_PLUS_ONE_THRESHOLD", 10)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metricas = RequestMetrics()
+        token = _metricas.set(metricas)
+        inicio = time.perf_counter()
+        try:
+            with envolver_consultas(metricas):
+                response = self.get_response(request)
+        finally:
+            _metricas.reset(token)
+        return self.terminar(request, response, metricas, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        metricas = RequestMetrics()
+        token = _metricas.set(metricas)
+        inicio = time.perf_counter()
+        try:
+            async with envolver_consultas(metricas):
+                response = await self.get_response(request)
+        finally:
+            _metricas.reset(token)
+        return self.terminar(request, response, metricas, time.perf_counter() - inicio)
+
+    def terminar(self, request, response, metricas, total):
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={metricas.sql * 1000:.1f};desc="{metricas.consultas} consultas"',
+            f"serializer;dur={metricas.serializer * 1000:.1f}",
+            f"view;dur={total * 1000:.1f}",
+        ])
+        self.registrar(request, response, metricas, total)
+        return response
+
+    def registrar(self, request, response, metricas, total):
+        ruta = f"{request.method} {request.get_full_path()}"
+        if total * 1000 > self.slow_ms or metricas.consultas > self.slow_queries:
+            duracion, sql = metricas.mas_lenta
+            logger.warning(
+                "Petición lenta %s -> %s: %.0f ms, %d consultas (%.0f ms SQL, %.0f ms serializer). "
+                "Consulta más lenta (%.1f ms): %s",
+                ruta, response.status_code, total * 1000, metricas.consultas,
+                metricas.sql * 1000, metricas.serializer * 1000, duracion * 1000, sql[:1000],
+            )
+        for veces, forma in metricas.repetidas(self.n_plus_one):
+            logger.warning("Posible N+1 en %s: %d veces %s", ruta, veces, forma[:1000])
@@ -0,0 +1,362 @@
+import logging
+import os
+import random
+import re
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.db.models import F
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from . import metrics
+from .expiry import expirar_reservas
+from .export import filas_csv, filas_ndjson
+from .models import Job
+from .rollups import reconstruir
+
+
+logger = logging.getLogger("cementerio.jobs")
+
+# {tipo: (función, validar)}; ver @tarea
+TAREAS = {}
+
+
+def get_workers():
+    return getattr(settings, "JOBS_WORKERS", 2)
+
+
+def get_poll_interval():
+    return getattr(settings, "JOBS_POLL_INTERVAL", 1.0)
+
+
+def get_max_attempts():
+    return getattr(settings, "JOBS_MAX_ATTEMPTS", 3)
+
+
+def get_backoff_base():
+    return getattr(settings, "JOBS_BACKOFF_BASE", 30)
+
+
+def get_backoff_max():
+    return getattr(settings, "JOBS_BACKOFF_MAX", 3600)
+
+
+def get_stale_seconds():
+    return getattr(settings, "JOBS_STALE_SECONDS", 300)
+
+
+class ErrorDefinitivo(Exception):
+    """El trabajo no puede salir bien reintentándolo (parámetros o fichero inválidos)."""
+
+
+def tarea(tipo, validar=None):
+    """
+    Registra `funcion(job, **parametros)` como el tipo de trabajo `tipo`.
+    Lo que devuelve queda en job.resultado (JSON); si genera un fichero lo
+    guarda con job_guardar_archivo(). `validar(parametros, entrada)` se
+    llama al encolar y lanza ValidationError si no son válidos.
+    """
+    def registrar(funcion):
+        TAREAS[tipo] = (funcion, validar)
+        return funcion
+    return registrar
+
+
+def nombre_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def encolar(tipo, parametros=None, entrada=None, usuario=None):
+    """Crea el trabajo PENDIENTE; lo recoge el primer worker libre."""
+    if tipo not in TAREAS:
+        raise ValidationError({"tipo": f"Use uno de: {', '.join(sorted(TAREAS))}."})
+    parametros = parametros or {}
+    _, validar = TAREAS[tipo]
+    if validar is not None:
+        validar(parametros, entrada)
+    job = Job(tipo=tipo, parametros=parametros, max_intentos=get_max_attempts(), creado_por=usuario)
+    if entrada is not None:
+        job.entrada.save(os.path.basename(entrada.name), entrada, save=False)
+    job.save()
+    metrics.inc("cementerio_jobs_total", tipo=tipo, estado="encolado")
+    return job
+
+
+# Cola ----------------------------------------------------------------------
+
+def reclamar(worker, using="default"):
+    """
+    El siguiente trabajo listo para este worker, ya marcado EN_CURSO, o
+    None. El UPDATE condicional (como en services.py) hace que solo un
+    worker se lo quede aunque varios lean el mismo candidato, en PostgreSQL
+    y en SQLite. Cada reclamo cuenta como intento, aunque el worker muera.
+    """
+    manager = Job.objects.db_manager(using)
+    ahora = timezone.now()
+    candidatos = (
+        manager.filter(estado="PENDIENTE", ejecutar_desde__lte=ahora)
+        .order_by("ejecutar_desde", "pk").values_list("pk", flat=True)[:10]
+    )
+    for pk in candidatos:
+        reclamado = manager.filter(pk=pk, estado="PENDIENTE").update(
+            estado="EN_CURSO", worker=worker, heartbeat=ahora, iniciado_en=ahora, intentos=F("intentos") + 1,
+        )
+        if reclamado:
+            return manager.get(pk=pk)
+    return None
+
+
+def latido(pks, using="default"):
+    """Los trabajos `pks` siguen en marcha (ver recuperar_abandonados)."""
+    if pks:
+        Job.objects.db_manager(using).filter(pk__in=pks, estado="EN_CURSO").update(heartbeat=timezone.now())
+
+
+def recuperar_abandonados(using="default"):
+    """
+    Trabajos EN_CURSO sin latido en JOBS_STALE_SECONDS: su worker murió.
+    Vuelven a la cola si les quedan intentos; si no, FALLIDO.
+    """
+    manager = Job.objects.db_manager(using)
+    ahora = timezone.now()
+    abandonados = manager.filter(estado="EN_CURSO", heartbeat__lt=ahora - timedelta(seconds=get_stale_seconds()))
+    mensaje = "El worker dejó de responder."
+    devueltos = abandonados.filter(intentos__lt=F("max_intentos")).update(
+        estado="PENDIENTE", worker="", ejecutar_desde=ahora, error=mensaje,
+    )
+    fallidos = abandonados.update(estado="FALLIDO", error=mensaje, terminado_en=ahora)
+    return devueltos + fallidos
+
+
+def espera_reintento(intentos):
+    """Backoff exponencial con jitter: base * 2^(intento-1), hasta JOBS_BACKOFF_MAX."""
+    espera = min(get_backoff_base() * 2 ** max(intentos - 1, 0), get_backoff_max())
+    # La mitad fija y la otra al azar: los que fallaron juntos no vuelven juntos
+    return espera / 2 + random.uniform(0, espera / 2)
+
+
+# Ejecución -----------------------------------------------------------------
+
+def ejecutar(pk):
+    """Ejecuta el trabajo `pk` (ya reclamado) y guarda el resultado o el error."""
+    job = Job.objects.get(pk=pk)
+    inicio = time.monotonic()
+    try:
+        if job.tipo not in TAREAS:
+            raise ErrorDefinitivo(f"Tipo de trabajo desconocido: {job.tipo}")
+        funcion, _ = TAREAS[job.tipo]
+        resultado = funcion(job, **job.parametros)
+    except Exception as exc:
+        logger.warning("Job %s (%s) falló en el intento %s", job.pk, job.tipo, job.intentos, exc_info=True)
+        fallar(job, exc)
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            estado="COMPLETADO", progreso=100, resultado=resultado, archivo=job.archivo.name or "",
+            content_type=job.content_type, error="", terminado_en=timezone.now(),
+        )
+        metrics.inc("cementerio_jobs_total", tipo=job.tipo, estado="completado")
+    metrics.observe("cementerio_job_duration_seconds", time.monotonic() - inicio, tipo=job.tipo)
+
+
+def ejecutar_aislado(pk):
+    """ejecutar() en un hilo o proceso del pool, que cierra su conexión al terminar."""
+    try:
+        ejecutar(pk)
+    finally:
+        connections.close_all()
+
+
+def ejecutar_con_latido(pk):
+    """
+    ejecutar() en este hilo mientras otro late cada tercio de
+    JOBS_STALE_SECONDS. Sin pool (run_workers --hilos 0) el bucle, que es
+    quien late, no vuelve hasta que el trabajo termina: un trabajo largo que
+    no informa de su avance parecería abandonado y se ejecutaría dos veces.
+    """
+    parar = threading.Event()
+
+    def latir():
+        try:
+            while not parar.wait(get_stale_seconds() / 3):
+                latido([pk])
+        finally:
+            connections.close_all()
+
+    hilo = threading.Thread(target=latir, name=f"latido-job-{pk}", daemon=True)
+    hilo.start()
+    try:
+        ejecutar(pk)
+    finally:
+        parar.set()
+        hilo.join()
+
+
+def fallar(job, exc):
+    error = "".join(traceback.format_exception(exc))
+    if isinstance(exc, ErrorDefinitivo) or job.intentos >= job.max_intentos:
+        Job.objects.filter(pk=job.pk).update(estado="FALLIDO", error=error, terminado_en=timezone.now())
+        metrics.inc("cementerio_jobs_total", tipo=job.tipo, estado="fallido")
+        return
+    Job.objects.filter(pk=job.pk).update(
+        estado="PENDIENTE", worker="", error=error,
+        ejecutar_desde=timezone.now() + timedelta(seconds=espera_reintento(job.intentos)),
+    )
+    metrics.inc("cementerio_jobs_total", tipo=job.tipo, estado="reintento")
+
+
+class Avance:
+    """
+    job.progreso a partir de (hechas, total), escrito como mucho una vez por
+    segundo para no convertir el trabajo en una ráfaga de UPDATE. Cada
+    escritura es también un latido.
+    """
+
+    def __init__(self, job, total):
+        self.job = job
+        self.total = max(total, 1)
+        self.ultimo = 0.0
+
+    def __call__(self, hechas, mensaje=""):
+        ahora = time.monotonic()
+        if ahora - self.ultimo < 1 and hechas < self.total:
+            return
+        self.ultimo = ahora
+        self.job.progreso = min(int(100 * hechas / self.total), 99)
+        Job.objects.filter(pk=self.job.pk).update(progreso=self.job.progreso, mensaje=mensaje[:255], heartbeat=timezone.now())
+
+
+def job_guardar_archivo(job, nombre, trozos, content_type):
+    """Escribe los trozos (str o bytes) en un temporal y lo sube al storage como job.archivo."""
+    with tempfile.TemporaryFile() as temporal:
+        for trozo in trozos:
+            temporal.write(trozo.encode() if isinstance(trozo, str) else trozo)
+        temporal.seek(0)
+        job.archivo.save(nombre, File(temporal), save=False)
+    job.content_type = content_type
+
+
+# Tareas --------------------------------------------------------------------
+
+def _vistas_exportables():
+    # Importación diferida: views importa este módulo
+    from .views import PagoViewSet, ReservaViewSet
+    return {"reservas": ReservaViewSet, "pagos": PagoViewSet}
+
+
+def _vista_export(recurso, filtros):
+    """El viewset de `recurso` con una petición GET sintética con `filtros` como query string."""
+    http = HttpRequest()
+    http.method = "GET"
+    http.GET = QueryDict(mutable=True)
+    for clave, valor in (filtros or {}).items():
+        http.GET[clave] = str(valor)
+    return _vistas_exportables()[recurso](request=Request(http), args=(), kwargs={}, format_kwarg=None, action="export")
+
+
+def validar_exportacion(parametros, entrada):
+    recurso = parametros.get("recurso")
+    vistas = _vistas_exportables()
+    if recurso not in vistas:
+        raise ValidationError({"parametros": f"recurso: use uno de {', '.join(vistas)}."})
+    formatos = vistas[recurso].export_formats
+    if parametros.get("formato", "csv") not in formatos:
+        raise ValidationError({"parametros": f"formato: use uno de {', '.join(formatos)}."})
+    if not isinstance(parametros.get("filtros", {}), dict):
+        raise ValidationError({"parametros": "filtros: un objeto con los parámetros del listado."})
+    # Filtros inválidos: 400 ahora y no un trabajo fallido después
+    _vista_export(recurso, parametros.get("filtros")).get_export_queryset()
+
+
+@tarea("exportar", validar_exportacion)
+def exportar(job, recurso, formato="csv", filtros=None):
+    """La exportación de /api/{recurso}/export/ como fichero descargable."""
+    vista = _vista_export(recurso, filtros)
+    total = vista.get_export_queryset().count()
+    avance = Avance(job, total)
+
+    def filas():
+        for numero, fila in enumerate(vista.iter_export_rows(), 1):
+            if numero % vista.export_chunk_size == 0:
+                avance(numero, f"{numero} de {total} filas")
+            yield fila
+
+    if formato == "csv":
+        contenido = filas_csv([nombre for nombre, _ in vista.export_fields], filas())
+    else:
+        contenido = filas_ndjson(filas())
+    job_guardar_archivo(job, f"{recurso}_{job.pk}.{formato}", contenido, vista.export_formats[formato])
+    return {"filas": total}
+
+
+@tarea("reconstruir_rollups")
+def reconstruir_rollups(job):
+    return reconstruir()
+
+
+@tarea("expirar_reservas")
+def expirar(job, dias=None):
+    return expirar_reservas(dias=dias)
+
+
+def validar_importacion(parametros, entrada):
+    from .management.commands.import_cementerio import TABLAS
+    tablas = [nombre for nombre, _ in TABLAS]
+    if parametros.get("tabla") not in tablas:
+        raise ValidationError({"parametros": f"tabla: use una de {', '.join(tablas)}."})
+    if entrada is None:
+        raise ValidationError({"entrada": "Adjunte el CSV a importar."})
+
+
+class SalidaImportacion:
+    """stdout de import_cementerio: guarda las líneas y convierte "N filas leídas" en progreso."""
+    LEIDAS = re.compile(r"(\d+) filas leídas")
+
+    def __init__(self, avance):
+        self.avance = avance
+        self.lineas = []
+
+    def write(self, texto):
+        texto = texto.strip()
+        if not texto:
+            return
+        self.lineas.append(texto)
+        leidas = self.LEIDAS.search(texto)
+        if leidas:
+            self.avance(int(leidas.group(1)), texto)
+
+    def flush(self):
+        pass
+
+
+@tarea("importar", validar_importacion)
+def importar(job, tabla):
+    """
+    import_cementerio con el CSV subido. El avance se guarda por trabajo,
+    así un reintento continúa tras el último lote confirmado.
+    """
+    estado = os.path.join(tempfile.gettempdir(), f"cementerio_job_{job.pk}_import.json")
+    with tempfile.NamedTemporaryFile(suffix=".csv") as copia:
+        # Copia local: el storage puede no estar en el disco del worker
+        lineas = 0
+        with job.entrada.open("rb") as original:
+            for trozo in original.chunks():
+                copia.write(trozo)
+                lineas += trozo.count(b"\n")
+        copia.flush()
+        salida = SalidaImportacion(Avance(job, max(lineas - 1, 1)))
+        try:
+            call_command("import_cementerio", **{tabla: copia.name}, estado=estado, reanudar=True, stdout=salida)
+        except CommandError as exc:
+            raise ErrorDefinitivo(str(exc)) from exc
+    return {"salida": salida.lineas}
@@ -0,0 +1,278 @@
+import json
+import math
+import os
+import secrets
+import tempfile
+import time
+import warnings
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from cementerio.models import Parcela
+from cementerio.sync import formatear
+from cementerio.synthetic import sembrar
+
+
+BASELINE = os.path.join(settings.BASE_DIR, "benchmarks", "endpoints.json")
+
+# Variantes de consulta que recorren otros caminos de las mismas rutas.
+# {desde}: el instante tras sembrar (un delta sin cambios)
+VARIANTES = [
+    ("parcela-list", "?estado=DISPONIBLE&precio__gte=1500"),
+    ("parcela-list", "?fields=id_parcela,estado&page=2"),
+    ("reserva-list", "?pagination=cursor"),
+    ("reserva-list", "?expand=usuario,parcela"),
+    ("pago-list", "?estado_pago=PAGADO&fecha_pago__gte=2020-01-01"),
+    ("difunto-list", "?search=lopez"),
+    ("parcela-list", "?updated_since={desde}"),
+    ("reserva-export", "?formato=ndjson"),
+    ("reports", "?granularidad=dia&desde=2020-01-01&hasta=2020-12-31"),
+]
+
+# Rutas que no son GET: (método, cuerpo)
+ESCRITURAS = {
+    "api_login": ("post", lambda datos: {"username": "benchmark", "password": datos["password"]}),
+    "parcela-bulk": ("post", lambda datos: [
+        {"ubicacion": f"Sector Bench - Fila 1 - Número {i}", "tamanio": "2x2", "precio": "1500.00"} for i in range(50)
+    ]),
+    "difunto-bulk": ("post", lambda datos: [
+        {"nombre": "Nombre", "apellido": f"Apellido{i}", "parcela": datos["parcela"], "fecha_fallecimiento": "2020-01-01"}
+        for i in range(50)
+    ]),
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p * len(ordenados)) - 1, 0)]
+
+
+def rutas_con_nombre(patrones=None, namespace=None):
+    """(nombre, patrón) de cada ruta con nombre, sin el admin ni las variantes .json."""
+    for patron in get_resolver().url_patterns if patrones is None else patrones:
+        if isinstance(patron, URLResolver):
+            if patron.app_name == "admin":
+                continue
+            yield from rutas_con_nombre(patron.url_patterns, patron.namespace or namespace)
+        elif patron.name and "format" not in patron.pattern.regex.groupindex:
+            yield (f"{namespace}:{patron.name}" if namespace else patron.name), patron
+
+
+def modelo_de(patron):
+    callback = patron.callback
+    vista = (getattr(callback, "view_initkwargs", None) or {}).get("viewset_class") or getattr(callback, "cls", None)
+    queryset = getattr(vista, "queryset", None)
+    return None if queryset is None else queryset.model
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide todas las rutas de cementerio_api/urls.py con el cliente de pruebas "
+        "sobre un cementerio sintético (seed_synthetic): latencia p50/p95, "
+        "consultas SQL y bytes de respuesta. Con --guardar escribe el baseline "
+        "JSON; si no, compara con él y termina con error si alguna ruta cambia de "
+        "status, hace más consultas o crece en bytes más que --umbral. La latencia "
+        "depende de la máquina: se informa, y solo falla si se pide --umbral-ms. "
+        "Los datos se crean en una "
+        "transacción que se deshace al terminar y la cache es local y se vacía "
+        "antes de cada petición, así se mide el camino a la base de datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--parcelas", type=int, default=2000, help="Escala de los datos sintéticos")
+        parser.add_argument("--repeticiones", type=int, default=20)
+        parser.add_argument("--baseline", default=BASELINE)
+        parser.add_argument("--guardar", action="store_true", help="Escribe el baseline en lugar de comparar")
+        parser.add_argument("--umbral", type=float, default=0.25, help="Empeoramiento relativo tolerado (0.25 = 25%%)")
+        parser.add_argument(
+            "--umbral-ms", type=float, default=None,
+            help="Falla también si p50/p95 empeoran más que --umbral y que estos ms. Solo tiene "
+                 "sentido con un baseline medido en la misma máquina",
+        )
+        parser.add_argument("--rutas", default="", help="Solo las rutas que contengan alguno de estos textos (coma)")
+
+    def handle(self, *args, **options):
+        if options["repeticiones"] < 1:
+            raise CommandError("--repeticiones debe ser positivo")
+        base = None
+        if not options["guardar"]:
+            if not os.path.exists(options["baseline"]):
+                raise CommandError(f"No existe {options['baseline']}; genérelo con --guardar")
+            with open(options["baseline"]) as f:
+                base = json.load(f)
+            if base["parcelas"] != options["parcelas"]:
+                raise CommandError(f"El baseline se midió con --parcelas {base['parcelas']}")
+
+        filtros = [texto for texto in options["rutas"].split(",") if texto]
+        with tempfile.TemporaryDirectory() as metricas, override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "benchmark"}},
+            READ_REPLICAS=[],
+            THROTTLE_ENABLED=False,
+            METRICS_DIR=metricas,
+        ):
+            resultados = {}
+            try:
+                with transaction.atomic():
+                    sembrar(options["parcelas"])
+                    cliente, datos = self.preparar()
+                    for nombre, metodo, url, cuerpo in self.casos(datos):
+                        if filtros and not any(texto in f"{nombre} {url}" for texto in filtros):
+                            continue
+                        resultados[nombre] = self.medir(cliente, metodo, url, cuerpo, options["repeticiones"])
+                        self.stdout.write(self.linea(nombre, resultados[nombre]))
+                    raise Rollback
+            except Rollback:
+                pass
+
+        if options["guardar"]:
+            os.makedirs(os.path.dirname(os.path.abspath(options["baseline"])), exist_ok=True)
+            with open(options["baseline"], "w") as f:
+                json.dump(
+                    {"parcelas": options["parcelas"], "repeticiones": options["repeticiones"], "rutas": resultados},
+                    f, indent=2, sort_keys=True,
+                )
+                f.write("\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline de {len(resultados)} rutas en {options['baseline']}"))
+            return
+
+        for linea in self.comparar_latencia(base["rutas"], resultados, options["umbral"]):
+            self.stdout.write(linea)
+        regresiones = self.comparar(base["rutas"], resultados, options["umbral"], options["umbral_ms"])
+        for linea in regresiones:
+            self.stderr.write(linea)
+        if regresiones:
+            raise CommandError(f"{len(regresiones)} regresiones frente a {options['baseline']}")
+        self.stdout.write(self.style.SUCCESS(f"{len(resultados)} rutas sin regresiones"))
+
+    def preparar(self):
+        password = secrets.token_urlsafe()
+        admin = User.objects.create_user(username="benchmark", password=password, is_staff=True, is_superuser=True)
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=admin).key}")
+        return cliente, {
+            "password": password,
+            "admin": admin.pk,
+            "parcela": Parcela.objects.order_by("pk").values_list("pk", flat=True).first(),
+            "desde": formatear(timezone.now()),
+        }
+
+    def casos(self, datos):
+        """(nombre, método, url, cuerpo) de cada ruta y de las VARIANTES."""
+        urls = {}
+        casos = []
+        for nombre, patron in rutas_con_nombre():
+            if nombre in urls:
+                continue
+            kwargs = {}
+            if "pk" in patron.pattern.regex.groupindex:
+                model = modelo_de(patron)
+                if model is None:
+                    continue
+                kwargs["pk"] = datos["admin"] if model is User else self.pk_intermedia(model)
+                if kwargs["pk"] is None:
+                    # Sin filas que pedir (Job: los datos sintéticos no encolan trabajos)
+                    continue
+            urls[nombre] = reverse(nombre, kwargs=kwargs)
+            metodo, cuerpo = ESCRITURAS.get(nombre, ("get", None))
+            casos.append((f"{metodo.upper()} {nombre}", metodo, urls[nombre], cuerpo and cuerpo(datos)))
+        for nombre, query in VARIANTES:
+            if nombre in urls:
+                casos.append((f"GET {nombre}{query}", "get", urls[nombre] + query.format(**datos), None))
+        return casos
+
+    @staticmethod
+    def pk_intermedia(model):
+        manager = model._default_manager
+        total = manager.count()
+        return manager.order_by("pk").values_list("pk", flat=True)[total // 2] if total else None
+
+    @staticmethod
+    def medir(cliente, metodo, url, cuerpo, repeticiones):
+        tiempos, consultas, tamanio, estado = [], 0, 0, None
+        # Una petición de calentamiento (imports, RowSerializer compilado)
+        for i in range(repeticiones + 1):
+            cache.clear()
+            punto = transaction.savepoint()
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                if metodo == "get":
+                    response = cliente.get(url)
+                else:
+                    response = getattr(cliente, metodo)(url, cuerpo, format="json")
+                with warnings.catch_warnings():
+                    # Las exportaciones async se consumen aquí de forma síncrona
+                    warnings.simplefilter("ignore")
+                    contenido = b"".join(response) if response.streaming else response.content
+                duracion = time.perf_counter() - inicio
+            # Las escrituras se deshacen para que cada repetición vea los mismos datos
+            transaction.savepoint_rollback(punto)
+            if i:
+                tiempos.append(duracion * 1000)
+                consultas, tamanio, estado = len(capturadas), len(contenido), response.status_code
+        return {
+            "p50_ms": round(percentil(tiempos, 0.5), 3),
+            "p95_ms": round(percentil(tiempos, 0.95), 3),
+            "consultas": consultas,
+            "bytes": tamanio,
+            "status": estado,
+        }
+
+    @staticmethod
+    def linea(nombre, medida):
+        return (
+            f"{nombre:<70} {medida['status']:>3}  p50 {medida['p50_ms']:>8.2f} ms  p95 {medida['p95_ms']:>8.2f} ms  "
+            f"{medida['consultas']:>3} consultas  {medida['bytes']:>9} bytes"
+        )
+
+    @staticmethod
+    def latencias_peores(anterior, medida, umbral, umbral_ms=0):
+        return [
+            f"{clave} {anterior[clave]:.2f} -> {medida[clave]:.2f}"
+            for clave in ("p50_ms", "p95_ms")
+            if medida[clave] > anterior[clave] * (1 + umbral) and medida[clave] - anterior[clave] > umbral_ms
+        ]
+
+    @classmethod
+    def comparar_latencia(cls, base, actual, umbral):
+        """Avisos de latencia: con un baseline de otra máquina son orientativos."""
+        return [
+            f"aviso {nombre}: {cambio}"
+            for nombre, medida in actual.items()
+            if nombre in base
+            for cambio in cls.latencias_peores(base[nombre], medida, umbral)
+        ]
+
+    @classmethod
+    def comparar(cls, base, actual, umbral, umbral_ms=None):
+        """
+        Regresiones de `actual` frente a `base`. Solo cuentan status, consultas
+        (sin margen) y bytes, que no dependen de la máquina; la latencia solo
+        si se da `umbral_ms`.
+        """
+        regresiones = []
+        for nombre, medida in actual.items():
+            anterior = base.get(nombre)
+            if anterior is None:
+                continue
+            if medida["status"] != anterior["status"]:
+                regresiones.append(f"{nombre}: status {anterior['status']} -> {medida['status']}")
+            if umbral_ms is not None:
+                regresiones.extend(f"{nombre}: {cambio}" for cambio in cls.latencias_peores(anterior, medida, umbral, umbral_ms))
+            if medida["consultas"] > anterior["consultas"]:
+                regresiones.append(f"{nombre}: consultas {anterior['consultas']} -> {medida['consultas']}")
+            if medida["bytes"] > anterior["bytes"] * (1 + umbral):
+                regresiones.append(f"{nombre}: bytes {anterior['bytes']} -> {medida['bytes']}")
+        return regresiones
@@ -0,0 +1,83 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from cementerio.middleware import Brotli, Gzip, brotli
+from cementerio.renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+from cementerio.rows import get_row_serializer
+from cementerio.serializers import DifuntoSerializer, PagoSerializer
+from cementerio.synthetic import sembrar
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Tiempo de codificación y bytes por 1000 filas de los listados de pagos "
+        "y difuntos en cada formato (JSON de DRF, JSON con orjson, MessagePack) "
+        "sin comprimir, con gzip y con brotli; los que no estén instalados se "
+        "omiten. Los datos sintéticos se crean en una transacción que se "
+        "deshace al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=1000, help="Filas por listado")
+        parser.add_argument("--repeticiones", type=int, default=5, help="Se toma la mejor de N")
+
+    def handle(self, *args, **options):
+        if options["filas"] < 1 or options["repeticiones"] < 1:
+            raise CommandError("--filas y --repeticiones deben ser positivos")
+        self.repeticiones = options["repeticiones"]
+        formatos = [("json DRF", JSONRenderer()), ("json orjson", FastJSONRenderer())]
+        if msgpack is not None:
+            formatos.append(("msgpack", MessagePackRenderer()))
+        compresiones = [("-", None), ("gzip", Gzip)] + ([("br", Brotli)] if brotli is not None else [])
+
+        try:
+            with transaction.atomic():
+                # ~0,47 difuntos y ~1,2 pagos por parcela
+                sembrar(options["filas"] * 3)
+                for serializer_class in [PagoSerializer, DifuntoSerializer]:
+                    self.medir(serializer_class, options["filas"], formatos, compresiones)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def mejor_tiempo(self, funcion):
+        mejor, resultado = float("inf"), None
+        for _ in range(self.repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            mejor = min(mejor, time.perf_counter() - inicio)
+        return mejor, resultado
+
+    def medir(self, serializer_class, n, formatos, compresiones):
+        model = serializer_class.Meta.model
+        rows = get_row_serializer(serializer_class)
+        datos = rows.serialize(rows.values(model.objects.order_by("pk")[:n]))
+        por_mil = 1000 / max(len(datos), 1)
+
+        esperado = None
+        for nombre, renderer in formatos:
+            t_render, contenido = self.mejor_tiempo(lambda: renderer.render(datos))
+            decodificado = msgpack.unpackb(contenido) if renderer.format == "msgpack" else json.loads(contenido)
+            if esperado is None:
+                esperado = decodificado
+            elif decodificado != esperado:
+                raise CommandError(f"{model.__name__} {nombre}: la salida no coincide con la de DRF")
+
+            for compresion, compresor in compresiones:
+                if compresor is None:
+                    tiempo, tamanio = t_render, len(contenido)
+                else:
+                    t_comprimir, comprimido = self.mejor_tiempo(lambda: compresor().todo(contenido))
+                    tiempo, tamanio = t_render + t_comprimir, len(comprimido)
+                self.stdout.write(
+                    f"{model.__name__:<8} {nombre:<12} {compresion:<5} {tiempo * 1000 * por_mil:>8.3f} ms  "
+                    f"{tamanio * por_mil:>9.0f} bytes  por 1000 filas ({len(datos)} filas)"
+                )
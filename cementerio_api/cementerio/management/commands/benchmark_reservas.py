@@ -0,0 +1,87 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.db.models import Count
+
+from cementerio.cache import invalidate_model
+from cementerio.exceptions import ParcelaNoDisponible
+from cementerio.models import Usuario, Parcela, Reserva
+from cementerio.services import reservar_parcela
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide reservas concurrentes: todos los hilos contra la misma parcela "
+        "(contención máxima) y cada hilo contra parcelas distintas. Comprueba "
+        "que ninguna parcela queda con dos reservas activas y borra los datos "
+        "creados al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=16)
+        parser.add_argument("--intentos", type=int, default=2000, help="Reservas intentadas por escenario")
+        parser.add_argument("--reintentos", type=int, default=20, help="Reintentos ante bloqueos de SQLite")
+
+    def handle(self, *args, **options):
+        self.reintentos = options["reintentos"]
+        hilos, intentos = options["hilos"], options["intentos"]
+        self.usuario = Usuario.objects.create(
+            nombre="Benchmark", apellido="Reservas", email=f"benchmark-{time.time_ns()}@example.com"
+        )
+        parcelas = Parcela.objects.bulk_create(
+            Parcela(ubicacion="Benchmark", tamanio="2x2", precio=0) for _ in range(intentos)
+        )
+        ids = [p.pk for p in parcelas]
+        try:
+            self.escenario("misma parcela", hilos, [ids[0]] * intentos)
+            self.escenario("parcelas distintas", hilos, ids[1:])
+            self.verificar(ids)
+        finally:
+            Parcela.objects.filter(pk__in=ids).delete()
+            self.usuario.delete()
+            invalidate_model(Parcela)
+            invalidate_model(Reserva)
+
+    def reservar(self, parcela_id):
+        try:
+            for intento in range(self.reintentos):
+                try:
+                    reservar_parcela(self.usuario, parcela_id, date.today())
+                    return "ok"
+                except ParcelaNoDisponible:
+                    return "conflicto"
+                except OperationalError:
+                    # "database is locked" en SQLite: esperar y repetir
+                    time.sleep(0.001 * 2 ** min(intento, 6))
+            return "error"
+        finally:
+            connections.close_all()
+
+    def escenario(self, nombre, hilos, objetivos):
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            resultados = list(pool.map(self.reservar, objetivos))
+        transcurrido = max(time.perf_counter() - inicio, 1e-6)
+        self.stdout.write(
+            f"{nombre}: {len(objetivos)} intentos en {transcurrido:.2f}s "
+            f"({len(objetivos) / transcurrido:.0f}/s) — {resultados.count('ok')} reservas, "
+            f"{resultados.count('conflicto')} conflictos (409), {resultados.count('error')} errores"
+        )
+
+    def verificar(self, ids):
+        dobles = (
+            Reserva.objects.filter(parcela_id__in=ids).exclude(estado="CANCELADA")
+            .values("parcela").annotate(n=Count("pk")).filter(n__gt=1).count()
+        )
+        reservadas = Parcela.objects.filter(pk__in=ids, estado="RESERVADA").count()
+        activas = Reserva.objects.filter(parcela_id__in=ids).exclude(estado="CANCELADA").count()
+        if dobles or reservadas != activas:
+            self.stderr.write(self.style.ERROR(
+                f"Inconsistencia: {dobles} parcelas con varias reservas, "
+                f"{reservadas} parcelas reservadas para {activas} reservas ({connection.vendor})"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Sin reservas dobles"))
@@ -0,0 +1,88 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from cementerio.models import Usuario, Parcela, Reserva, Pago, Difunto
+from cementerio.rows import get_row_serializer
+from cementerio.serializers import ReservaSerializer, PagoSerializer, DifuntoSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara filas/segundo del ModelSerializer frente a values() + "
+        "RowSerializer en reservas, pagos y difuntos. Los datos se crean en "
+        "una transacción que se deshace al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tamanios", default="10,1000,100000", help="Filas por medición, separadas por comas")
+        parser.add_argument("--repeticiones", type=int, default=3, help="Se toma la mejor de N")
+
+    def handle(self, *args, **options):
+        try:
+            tamanios = sorted(int(t) for t in options["tamanios"].split(","))
+        except ValueError:
+            raise CommandError("--tamanios debe ser una lista de enteros")
+        self.repeticiones = options["repeticiones"]
+        try:
+            with transaction.atomic():
+                self.sembrar(tamanios[-1])
+                for serializer_class in [ReservaSerializer, PagoSerializer, DifuntoSerializer]:
+                    for n in tamanios:
+                        self.medir(serializer_class, n)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def sembrar(self, n):
+        usuarios = Usuario.objects.bulk_create(
+            Usuario(nombre=f"Nombre{i}", apellido=f"Apellido{i}", email=f"bench{i}@example.com")
+            for i in range(max(n // 10, 1))
+        )
+        parcelas = Parcela.objects.bulk_create(
+            Parcela(ubicacion=f"Sector {i % 50}", tamanio="2x2", precio="1500.00") for i in range(n)
+        )
+        inicio = date(2020, 1, 1)
+        reservas = Reserva.objects.bulk_create(
+            Reserva(usuario=usuarios[i % len(usuarios)], parcela=parcelas[i], fecha_reserva=inicio + timedelta(days=i % 1500))
+            for i in range(n)
+        )
+        Pago.objects.bulk_create(
+            Pago(reserva=r, monto="750.50", fecha_pago=r.fecha_reserva, metodo_pago="EFECTIVO")
+            for r in reservas
+        )
+        Difunto.objects.bulk_create(
+            Difunto(nombre=f"Nombre{i}", apellido=f"Apellido{i}", parcela=parcelas[i], fecha_fallecimiento=inicio)
+            for i in range(n)
+        )
+
+    def mejor_tiempo(self, funcion):
+        mejor, resultado = float("inf"), None
+        for _ in range(self.repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            mejor = min(mejor, time.perf_counter() - inicio)
+        return max(mejor, 1e-9), resultado
+
+    def medir(self, serializer_class, n):
+        model = serializer_class.Meta.model
+        queryset = model.objects.select_related(
+            *[f.name for f in model._meta.concrete_fields if f.is_relation]
+        ).order_by("pk")[:n]
+        rows = get_row_serializer(serializer_class)
+
+        t_orm, esperado = self.mejor_tiempo(lambda: serializer_class(queryset, many=True).data)
+        t_rows, obtenido = self.mejor_tiempo(lambda: rows.serialize(rows.values(queryset)))
+        if [dict(f) for f in esperado] != obtenido:
+            raise CommandError(f"{serializer_class.__name__}: la salida no coincide")
+
+        self.stdout.write(
+            f"{model.__name__:<8} {n:>7} filas  ModelSerializer {n / t_orm:>10.0f} filas/s  "
+            f"RowSerializer {n / t_rows:>10.0f} filas/s  x{t_orm / t_rows:.1f}"
+        )
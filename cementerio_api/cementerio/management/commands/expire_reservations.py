@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cementerio.expiry import expirar_reservas, get_expiry_batch, get_expiry_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancela las reservas PENDIENTE sin ningún pago PAGADO con más de "
+        "RESERVA_EXPIRY_DAYS días, anula sus pagos pendientes y devuelve sus "
+        "parcelas a DISPONIBLE. Trabaja con UPDATE por lotes de "
+        "RESERVA_EXPIRY_BATCH filas, cada uno en su transacción, y mantiene "
+        "los rollups. Con --cada repite la pasada cada N segundos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=None, help="Antigüedad mínima (por defecto RESERVA_EXPIRY_DAYS)")
+        parser.add_argument("--lote", type=int, default=None, help="Filas por transacción (por defecto RESERVA_EXPIRY_BATCH)")
+        parser.add_argument("--maximo", type=int, default=None, help="Reservas como máximo por pasada")
+        parser.add_argument("--cada", type=int, default=None, metavar="SEGUNDOS", help="Repetir hasta recibir SIGTERM")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        dias = options["dias"] if options["dias"] is not None else get_expiry_days()
+        if dias is None:
+            self.stdout.write("RESERVA_EXPIRY_DAYS es None: las reservas pendientes no caducan")
+            return
+        if dias < 0 or (options["lote"] is not None and options["lote"] < 1):
+            raise CommandError("--dias y --lote deben ser positivos")
+        lote = options["lote"] or get_expiry_batch()
+
+        self.parar = False
+        if options["cada"]:
+            signal.signal(signal.SIGTERM, self.pedir_parada)
+        while True:
+            inicio = time.monotonic()
+            total = expirar_reservas(dias=dias, lote=lote, maximo=options["maximo"], using=options["database"])
+            self.stdout.write(self.style.SUCCESS(
+                f"{total['reservas']} reservas caducadas, {total['pagos']} pagos anulados y "
+                f"{total['parcelas']} parcelas liberadas en {total['lotes']} lotes "
+                f"({time.monotonic() - inicio:.2f}s)"
+            ))
+            if not options["cada"] or self.parar:
+                break
+            time.sleep(options["cada"])
+            if self.parar:
+                break
+
+    def pedir_parada(self, *args):
+        self.parar = True
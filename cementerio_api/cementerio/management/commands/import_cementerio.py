@@ -0,0 +1,323 @@
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.validators import MinValueValidator
+from django.db import connection, models, transaction
+
+from cementerio.cache import invalidate_model
+from cementerio.models import Usuario, Parcela, Reserva, Pago, Difunto, sector_de
+from cementerio.rollups import reconstruir
+from cementerio.search import normalizar_texto
+from cementerio.sync import EscrituraDemasiadoLarga, Sello
+
+
+# Orden de carga: cada tabla solo referencia a las anteriores
+TABLAS = [
+    ("usuarios", Usuario),
+    ("parcelas", Parcela),
+    ("reservas", Reserva),
+    ("pagos", Pago),
+    ("difuntos", Difunto),
+]
+
+STAGE_TABLE = "import_cementerio_stage"
+
+
+# Columnas que save() calcula y no vienen en el CSV (ver campos_derivados)
+CAMPOS_DERIVADOS = ("texto_busqueda", "sector")
+
+
+# Mayor valor de cada tipo entero de PostgreSQL
+ENTEROS = {"smallint": 32767, "integer": 2147483647, "bigint": 9223372036854775807}
+
+
+# created_at/updated_at: el momento en que se escribe cada lote (ver Sello)
+MARCAS_DE_TIEMPO = ("created_at", "updated_at")
+
+
+def campos_importables(model):
+    return [f for f in model._meta.concrete_fields if f.name not in CAMPOS_DERIVADOS + MARCAS_DE_TIEMPO]
+
+
+def campos_derivados(model, fila):
+    """Columnas que no vienen en el CSV y save() calcularía."""
+    if model is Difunto:
+        return {"texto_busqueda": normalizar_texto(f"{fila.get('nombre', '')} {fila.get('apellido', '')}")}
+    if model is Parcela:
+        return {"sector": sector_de(fila.get("ubicacion", ""))}
+    return {}
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa CSV grandes de usuarios, parcelas, reservas, pagos y difuntos. "
+        "En PostgreSQL usa COPY a una tabla de staging y valida en SQL; en SQLite "
+        "usa bulk_create por lotes. Los encabezados son los nombres de campo del "
+        "modelo (las claves foráneas por id: usuario, parcela, reserva)."
+    )
+
+    def add_arguments(self, parser):
+        for nombre, _ in TABLAS:
+            parser.add_argument(f"--{nombre}", metavar="CSV", help=f"CSV de {nombre}")
+        parser.add_argument("--chunk-size", type=int, default=50000, help="Filas por transacción")
+        parser.add_argument(
+            "--estado",
+            default=".import_cementerio.json",
+            help="Fichero donde se guarda el avance para poder reanudar",
+        )
+        parser.add_argument("--reanudar", action="store_true", help="Continuar desde el último lote confirmado")
+
+    def handle(self, *args, **options):
+        archivos = [(nombre, model, options[nombre]) for nombre, model in TABLAS if options[nombre]]
+        if not archivos:
+            raise CommandError("Indique al menos un CSV (--usuarios, --parcelas, ...).")
+
+        self.chunk_size = options["chunk_size"]
+        self.ruta_estado = options["estado"]
+        self.estado = self.cargar_estado() if options["reanudar"] else {}
+
+        for nombre, model, ruta in archivos:
+            self.importar_archivo(nombre, model, ruta)
+
+        if connection.vendor == "postgresql":
+            # Los ids vienen del CSV: hay que mover las secuencias
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [m for _, m, _ in archivos]):
+                    cursor.execute(sql)
+        for _, model, _ in archivos:
+            invalidate_model(model)
+        # bulk_create y COPY no pasan por las señales que mantienen los rollups
+        if any(model in (Parcela, Reserva, Pago) for _, model, _ in archivos):
+            reconstruir()
+        if os.path.exists(self.ruta_estado):
+            os.remove(self.ruta_estado)
+
+    # Avance ----------------------------------------------------------------
+
+    def cargar_estado(self):
+        if not os.path.exists(self.ruta_estado):
+            return {}
+        with open(self.ruta_estado) as f:
+            return json.load(f)
+
+    def guardar_estado(self):
+        temporal = f"{self.ruta_estado}.tmp"
+        with open(temporal, "w") as f:
+            json.dump(self.estado, f)
+        os.replace(temporal, self.ruta_estado)
+
+    # Lectura ---------------------------------------------------------------
+
+    def lotes(self, ruta, model, saltar):
+        with open(ruta, newline="", encoding="utf-8") as f:
+            lector = csv.DictReader(f)
+            disponibles = set(lector.fieldnames or [])
+            faltantes = [
+                campo.name for campo in campos_importables(model)
+                if campo.name not in disponibles and not self.tiene_valor_por_defecto(campo)
+            ]
+            if faltantes:
+                raise CommandError(f"{ruta}: faltan columnas {', '.join(faltantes)}")
+            lote = []
+            for numero, fila in enumerate(lector):
+                if numero < saltar:
+                    continue
+                lote.append(fila)
+                if len(lote) >= self.chunk_size:
+                    yield lote
+                    lote = []
+            if lote:
+                yield lote
+
+    @staticmethod
+    def tiene_valor_por_defecto(campo):
+        return campo.has_default() or campo.null or getattr(campo, "auto_now_add", False)
+
+    def importar_archivo(self, nombre, model, ruta):
+        procesadas = self.estado.get(nombre, 0)
+        if procesadas:
+            self.stdout.write(f"{nombre}: reanudando tras {procesadas} filas")
+        insertadas_total = 0
+        inicio = time.monotonic()
+
+        for lote in self.lotes(ruta, model, procesadas):
+            try:
+                with transaction.atomic():
+                    if connection.vendor == "postgresql":
+                        insertadas = self.cargar_lote_postgresql(model, lote)
+                    else:
+                        insertadas = self.cargar_lote_orm(model, lote)
+            except EscrituraDemasiadoLarga as exc:
+                raise CommandError(
+                    f"{nombre}: lote deshecho tras {procesadas} filas. {exc.detail} "
+                    "Continúe con --reanudar y un --chunk-size menor."
+                )
+            procesadas += len(lote)
+            insertadas_total += insertadas
+            self.estado[nombre] = procesadas
+            self.guardar_estado()
+
+            transcurrido = max(time.monotonic() - inicio, 1e-6)
+            self.stdout.write(
+                f"{nombre}: {procesadas} filas leídas, {insertadas_total} insertadas, "
+                f"{len(lote) - insertadas} omitidas en el último lote "
+                f"({int(insertadas_total / transcurrido * 60)} filas/min)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{nombre}: {insertadas_total} filas importadas"))
+
+    # PostgreSQL: COPY + validación en SQL -----------------------------------
+
+    @staticmethod
+    def literal(valor):
+        return "'%s'" % str(valor).replace("'", "''")
+
+    def expresion_sql(self, campo):
+        """
+        Conversión de la columna de texto del staging al tipo real, o NULL si
+        no es válida. Un CAST que falla aborta el lote entero: antes de hacerlo
+        se comprueba que el valor cabe en el tipo (rango del entero, dígitos
+        del decimal, que la fecha exista), con CASE anidados porque PostgreSQL
+        no garantiza el orden de evaluación de un AND.
+        """
+        columna = f's."{campo.column}"'
+        tipo = campo.db_type(connection)
+        interno = campo.get_internal_type()
+        if isinstance(campo, models.ForeignKey) or interno in ("AutoField", "BigAutoField", "IntegerField"):
+            expresion = (
+                f"(CASE WHEN {columna} ~ '^\\d+$' THEN CASE WHEN CAST({columna} AS numeric) <= {ENTEROS[tipo]} "
+                f"THEN CAST({columna} AS {tipo}) END END)"
+            )
+        elif interno == "DecimalField":
+            # Como DecimalValidator: sin redondear decimales de más
+            enteros = campo.max_digits - campo.decimal_places
+            decimales = f"(\\.\\d{{1,{campo.decimal_places}}})?" if campo.decimal_places else ""
+            expresion = f"(CASE WHEN {columna} ~ '^-?0*\\d{{1,{enteros}}}{decimales}$' THEN CAST({columna} AS {tipo}) END)"
+        elif interno == "DateField":
+            anio, mes, dia = (f"CAST(split_part({columna}, '-', {i}) AS integer)" for i in (1, 2, 3))
+            expresion = (
+                f"(CASE WHEN {columna} ~ '^\\d{{4}}-\\d{{1,2}}-\\d{{1,2}}$' THEN "
+                f"CASE WHEN {anio} >= 1 AND {mes} BETWEEN 1 AND 12 AND {dia} >= 1 THEN "
+                # El día 31 de un mes de 30 cae ya en el mes siguiente
+                f"CASE WHEN extract(month FROM make_date({anio}, {mes}, 1) + ({dia} - 1)) = {mes} "
+                f"THEN CAST({columna} AS date) END END END)"
+            )
+        else:
+            expresion = f"NULLIF({columna}, '')"
+
+        if campo.has_default() and not callable(campo.default):
+            return f"COALESCE({expresion}, {self.literal(campo.default)})"
+        if getattr(campo, "auto_now_add", False):
+            return f"COALESCE({expresion}, CURRENT_DATE)"
+        return expresion
+
+    def condiciones_sql(self, campo, expresion):
+        condiciones = []
+        if not campo.null:
+            condiciones.append(f"{expresion} IS NOT NULL")
+        if campo.choices:
+            valores = ", ".join(self.literal(valor) for valor, _ in campo.choices)
+            condiciones.append(f"({expresion} IS NULL OR {expresion} IN ({valores}))")
+        if getattr(campo, "max_length", None) and not isinstance(campo, models.ForeignKey):
+            condiciones.append(f"({expresion} IS NULL OR length({expresion}) <= {campo.max_length})")
+        for validador in campo.validators:
+            if isinstance(validador, MinValueValidator):
+                condiciones.append(f"({expresion} IS NULL OR {expresion} >= {Decimal(str(validador.limit_value))})")
+        if isinstance(campo, models.ForeignKey):
+            destino = campo.related_model._meta
+            existe = f'EXISTS (SELECT 1 FROM "{destino.db_table}" r WHERE r."{destino.pk.column}" = {expresion})'
+            condiciones.append(f"({expresion} IS NULL OR {existe})" if campo.null else existe)
+        return condiciones
+
+    def cargar_lote_postgresql(self, model, lote):
+        campos = campos_importables(model)
+        derivados = list(campos_derivados(model, {}))
+        columnas = [c.column for c in campos] + derivados
+        lista_columnas = ", ".join(f'"{c}"' for c in columnas)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGE_TABLE}")
+            cursor.execute(
+                f"CREATE TEMP TABLE {STAGE_TABLE} ("
+                + ", ".join(f'"{c}" text' for c in columnas)
+                + ") ON COMMIT DROP"
+            )
+            with cursor.copy(f"COPY {STAGE_TABLE} ({lista_columnas}) FROM STDIN") as copy:
+                for fila in lote:
+                    valores = [fila.get(c.name) or "" for c in campos]
+                    valores += list(campos_derivados(model, fila).values())
+                    copy.write_row(valores)
+
+            # Validación y resolución de claves foráneas en una sola sentencia
+            selects, condiciones = [], []
+            for campo in campos:
+                expresion = self.expresion_sql(campo)
+                selects.append(expresion)
+                condiciones += self.condiciones_sql(campo, expresion)
+            selects += [f's."{c}"' for c in derivados]
+            marcas = [model._meta.get_field(nombre).column for nombre in MARCAS_DE_TIEMPO]
+            # No CURRENT_TIMESTAMP: es el inicio de la transacción, antes del
+            # COPY, y el reloj de la base de datos y no el de marca_de_agua()
+            sello = Sello()
+            selects += [f"CAST({self.literal(sello.instante.isoformat())} AS timestamptz)"] * len(marcas)
+            destino = ", ".join(f'"{c}"' for c in columnas + marcas)
+
+            cursor.execute(
+                f'INSERT INTO "{model._meta.db_table}" ({destino}) '
+                f"SELECT {', '.join(selects)} FROM {STAGE_TABLE} s "
+                f"WHERE {' AND '.join(condiciones) or 'TRUE'} "
+                f"ON CONFLICT DO NOTHING"
+            )
+            sello.comprobar()
+            return cursor.rowcount
+
+    # SQLite y otros: bulk_create por lotes ----------------------------------
+
+    def cargar_lote_orm(self, model, lote):
+        campos = campos_importables(model)
+        foraneas = [c for c in campos if isinstance(c, models.ForeignKey)]
+        instancias = []
+        for fila in lote:
+            try:
+                valores = {}
+                for campo in campos:
+                    crudo = fila.get(campo.name)
+                    if crudo in (None, "") and self.tiene_valor_por_defecto(campo):
+                        continue
+                    if isinstance(campo, models.ForeignKey):
+                        valores[campo.attname] = campo.related_model._meta.pk.to_python(crudo)
+                    else:
+                        valores[campo.attname] = campo.clean(crudo, None)
+            except (ValidationError, InvalidOperation, TypeError, ValueError):
+                continue
+            instancia = model(**valores)
+            for campo, valor in campos_derivados(model, fila).items():
+                setattr(instancia, campo, valor)
+            instancias.append(instancia)
+
+        # Claves foráneas validadas en una consulta por tabla referenciada
+        for campo in foraneas:
+            ids = {getattr(i, campo.attname) for i in instancias}
+            existentes = set(
+                campo.related_model.objects.filter(pk__in=ids).values_list("pk", flat=True)
+            )
+            if campo.null:
+                existentes.add(None)
+            instancias = [i for i in instancias if getattr(i, campo.attname) in existentes]
+
+        pk = model._meta.pk.attname
+        repetidos = set(
+            model.objects.filter(pk__in=[getattr(i, pk) for i in instancias]).values_list("pk", flat=True)
+        )
+        instancias = [i for i in instancias if getattr(i, pk) not in repetidos]
+        # ignore_conflicts cubre otras restricciones únicas (p. ej. email);
+        # auto_now pone updated_at al insertar, después del Sello
+        sello = Sello()
+        model.objects.bulk_create(instancias, batch_size=1000, ignore_conflicts=True)
+        sello.comprobar()
+        return len(instancias)
@@ -0,0 +1,96 @@
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+RUTAS_POR_DEFECTO = [
+    "/api/async/parcelas/",
+    "/api/async/difuntos/?search=garcia",
+    "/api/async/reservas/?pagination=cursor",
+    "/api/async/pagos/?pagination=cursor",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga contra un servidor en marcha: N clientes simultáneos "
+        "con conexiones keep-alive. Informa peticiones/s, latencias p50/p95/p99 "
+        "y el máximo de peticiones en curso a la vez, para comparar un worker "
+        "WSGI síncrono con uno ASGI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Servidor a probar")
+        parser.add_argument("--rutas", default=",".join(RUTAS_POR_DEFECTO), help="Rutas separadas por comas")
+        parser.add_argument("--concurrencia", type=int, default=64)
+        parser.add_argument("--peticiones", type=int, default=2000)
+        parser.add_argument("--token", help="Token de API para la cabecera Authorization")
+
+    def handle(self, *args, **options):
+        destino = urlsplit(options["url"])
+        if destino.scheme not in ("http", "https"):
+            raise CommandError("--url debe ser http:// o https://")
+        rutas = [ruta for ruta in options["rutas"].split(",") if ruta]
+        cabeceras = {"Authorization": f"Token {options['token']}"} if options["token"] else {}
+        total, concurrencia = options["peticiones"], options["concurrencia"]
+
+        self.lock = threading.Lock()
+        self.en_curso = 0
+        self.max_en_curso = 0
+        self.siguiente = 0
+        self.total = total
+        resultados = []
+
+        def cliente(_):
+            clase = http.client.HTTPSConnection if destino.scheme == "https" else http.client.HTTPConnection
+            conexion = clase(destino.hostname, destino.port, timeout=60)
+            propios = []
+            while True:
+                with self.lock:
+                    if self.siguiente >= self.total:
+                        break
+                    ruta = rutas[self.siguiente % len(rutas)]
+                    self.siguiente += 1
+                propios.append(self.pedir(conexion, ruta, cabeceras))
+            conexion.close()
+            return propios
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            for propios in pool.map(cliente, range(concurrencia)):
+                resultados.extend(propios)
+        transcurrido = time.perf_counter() - inicio
+
+        latencias = sorted(latencia for latencia, _ in resultados)
+        errores = sum(1 for _, estado in resultados if estado is None or estado >= 400)
+        cuantiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+        self.stdout.write(
+            f"{len(resultados)} peticiones en {transcurrido:.2f}s ({len(resultados) / transcurrido:.0f}/s), "
+            f"{errores} errores\n"
+            f"latencia p50 {cuantiles[49] * 1000:.1f} ms, p95 {cuantiles[94] * 1000:.1f} ms, "
+            f"p99 {cuantiles[98] * 1000:.1f} ms\n"
+            f"máximo en curso a la vez: {self.max_en_curso} de {concurrencia} clientes"
+        )
+
+    def pedir(self, conexion, ruta, cabeceras):
+        with self.lock:
+            self.en_curso += 1
+            self.max_en_curso = max(self.max_en_curso, self.en_curso)
+        inicio = time.perf_counter()
+        try:
+            conexion.request("GET", ruta, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            estado = respuesta.status
+        except (OSError, http.client.HTTPException):
+            conexion.close()
+            estado = None
+        finally:
+            with self.lock:
+                self.en_curso -= 1
+        return time.perf_counter() - inicio, estado
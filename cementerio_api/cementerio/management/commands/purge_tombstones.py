@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cementerio.models import Borrado
+from cementerio.sync import get_tombstone_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las lápidas de filas eliminadas con más de SYNC_TOMBSTONE_DAYS "
+        "días. Los clientes que pidan ?updated_since= anterior a ese plazo "
+        "reciben 410 y descargan el listado completo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=None, help="Antigüedad mínima (por defecto SYNC_TOMBSTONE_DAYS)")
+
+    def handle(self, *args, **options):
+        dias = options["dias"] if options["dias"] is not None else get_tombstone_days()
+        borradas, _ = Borrado.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=dias)).delete()
+        self.stdout.write(self.style.SUCCESS(f"{borradas} lápidas de más de {dias} días eliminadas"))
@@ -0,0 +1,97 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from cementerio.jobs import (
+    ejecutar_aislado, ejecutar_con_latido, get_poll_interval, get_workers, latido, nombre_worker, reclamar,
+    recuperar_abandonados,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta los trabajos en segundo plano de la tabla Job (exportaciones, "
+        "importaciones, rollups) con un pool de --hilos o --procesos. Varios "
+        "run_workers pueden compartir la cola: cada trabajo lo reclama uno "
+        "solo con un UPDATE condicional. Los fallos se reintentan con backoff "
+        "exponencial hasta JOBS_MAX_ATTEMPTS y los trabajos de un worker que "
+        "dejó de latir vuelven a la cola. SIGTERM termina los trabajos en "
+        "curso y sale."
+    )
+
+    def add_arguments(self, parser):
+        pool = parser.add_mutually_exclusive_group()
+        pool.add_argument("--hilos", type=int, default=None, help="Hilos del pool (por defecto JOBS_WORKERS); 0 = en este hilo")
+        pool.add_argument("--procesos", type=int, default=None, help="Procesos del pool, para trabajos de CPU")
+        parser.add_argument("--una-vez", action="store_true", help="Salir cuando la cola esté vacía")
+
+    def handle(self, *args, **options):
+        if options["procesos"] is not None:
+            if options["procesos"] < 1:
+                raise CommandError("--procesos debe ser positivo")
+            # spawn: los procesos no heredan las conexiones abiertas del padre.
+            # El inicializador es django.setup y no una función de este
+            # módulo, que importa los modelos antes de que Django esté listo.
+            pool = ProcessPoolExecutor(
+                options["procesos"], mp_context=multiprocessing.get_context("spawn"), initializer=django.setup,
+            )
+            capacidad, descripcion = options["procesos"], f"{options['procesos']} procesos"
+        else:
+            hilos = get_workers() if options["hilos"] is None else options["hilos"]
+            if hilos < 0:
+                raise CommandError("--hilos no puede ser negativo")
+            pool = ThreadPoolExecutor(hilos, thread_name_prefix="job") if hilos else None
+            capacidad, descripcion = max(hilos, 1), f"{hilos} hilos" if hilos else "en primer plano"
+
+        self.worker = nombre_worker()
+        self.parar = False
+        anteriores = {senal: signal.signal(senal, self.pedir_parada) for senal in (signal.SIGTERM, signal.SIGINT)}
+        self.stdout.write(f"Worker {self.worker} ({descripcion})")
+        try:
+            completados = self.bucle(pool, capacidad, options["una_vez"])
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+            for senal, manejador in anteriores.items():
+                signal.signal(senal, manejador)
+        self.stdout.write(self.style.SUCCESS(f"{completados} trabajos ejecutados"))
+
+    def pedir_parada(self, *args):
+        self.parar = True
+
+    def bucle(self, pool, capacidad, una_vez):
+        en_curso = {}  # futuro -> id del trabajo
+        completados = 0
+        intervalo = get_poll_interval()
+        while not self.parar:
+            for futuro in [futuro for futuro in en_curso if futuro.done()]:
+                en_curso.pop(futuro)
+                completados += 1
+            latido(list(en_curso.values()))
+            recuperar_abandonados()
+
+            reclamados = 0
+            while len(en_curso) < capacidad and not self.parar:
+                job = reclamar(self.worker)
+                if job is None:
+                    break
+                reclamados += 1
+                self.stdout.write(f"Job {job.pk} {job.tipo} (intento {job.intentos})", self.style.HTTP_INFO)
+                if pool is None:
+                    ejecutar_con_latido(job.pk)
+                    completados += 1
+                else:
+                    en_curso[pool.submit(ejecutar_aislado, job.pk)] = job.pk
+
+            if una_vez and not reclamados and not en_curso:
+                break
+            if en_curso:
+                wait(en_curso, timeout=intervalo, return_when=FIRST_COMPLETED)
+            elif not reclamados:
+                time.sleep(intervalo)
+        wait(en_curso)
+        return completados + len(en_curso)
@@ -0,0 +1,288 @@
+import glob
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import envolver_consultas
+
+
+# Familias de métricas: nombre -> (tipo, ayuda)
+FAMILIAS = {
+    "cementerio_http_requests_total": (
+        "counter", "Peticiones atendidas por vista, acción, método y código de estado.",
+    ),
+    "cementerio_http_request_duration_seconds": (
+        "histogram", "Duración de las peticiones por vista y acción.",
+    ),
+    "cementerio_db_queries_total": (
+        "counter", "Consultas SQL ejecutadas por vista y acción.",
+    ),
+    "cementerio_cache_requests_total": (
+        "counter", "Lecturas de cache por cache y resultado (hit, miss, not_modified).",
+    ),
+    "cementerio_auth_failures_total": (
+        "counter", "Fallos de autenticación y permisos por motivo.",
+    ),
+    "cementerio_db_pool_connections_total": (
+        "counter",
+        "Eventos del pool de conexiones por alias. Abiertas = created - discarded; "
+        "en uso = acquired - released.",
+    ),
+    "cementerio_db_pool_wait_seconds": (
+        "histogram", "Espera para obtener una conexión del pool por alias.",
+    ),
+    "cementerio_throttled_total": (
+        "counter", "Peticiones rechazadas con 429 por alcance del límite.",
+    ),
+    "cementerio_jobs_total": (
+        "counter", "Trabajos en segundo plano por tipo y estado (encolado, completado, reintento, fallido).",
+    ),
+    "cementerio_job_duration_seconds": (
+        "histogram", "Duración de cada intento de un trabajo por tipo.",
+    ),
+    "cementerio_expiry_swept_total": (
+        "counter", "Filas cambiadas por el barrido de reservas caducadas por modelo.",
+    ),
+    "cementerio_expiry_runs_total": (
+        "counter", "Pasadas del barrido de reservas caducadas.",
+    ),
+    "cementerio_expiry_duration_seconds": (
+        "histogram", "Duración de cada pasada del barrido de reservas caducadas.",
+    ),
+}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_CABECERA = 8
+_TAMANIO_INICIAL = 64 * 1024
+
+
+def _leer_entradas(datos, usado):
+    """(clave, valor, posición del valor) de cada entrada de un fichero de métricas."""
+    posicion = _CABECERA
+    while posicion < usado:
+        longitud = struct.unpack_from("<i", datos, posicion)[0]
+        posicion += 4
+        clave = bytes(datos[posicion:posicion + longitud]).decode()
+        posicion += longitud + (-(4 + longitud) % 8)
+        yield clave, struct.unpack_from("<d", datos, posicion)[0], posicion
+        posicion += 8
+
+
+class MmapValues:
+    """
+    Valores float de un proceso en un fichero mapeado en memoria.
+
+    Cada worker de gunicorn escribe solo en su fichero ({pid}.db), así que
+    no hace falta bloquear entre procesos; /metrics lee y suma los ficheros
+    de todos. Formato: cabecera con los bytes usados y entradas
+    [longitud][clave utf-8, alineada a 8][double]. El contador de bytes
+    usados se escribe después de la entrada, así un lector nunca ve una
+    entrada a medias.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._archivo = open(ruta, "a+b")
+        if os.fstat(self._archivo.fileno()).st_size < _TAMANIO_INICIAL:
+            self._archivo.truncate(_TAMANIO_INICIAL)
+        self._abrir_mapa()
+        self._usado = struct.unpack_from("<i", self._mapa, 0)[0] or _CABECERA
+        self._posiciones = {clave: posicion for clave, _, posicion in _leer_entradas(self._mapa, self._usado)}
+
+    def _abrir_mapa(self):
+        self._capacidad = os.fstat(self._archivo.fileno()).st_size
+        self._mapa = mmap.mmap(self._archivo.fileno(), self._capacidad)
+
+    def _agregar(self, clave):
+        codificada = clave.encode()
+        relleno = -(4 + len(codificada)) % 8
+        entrada = struct.pack(f"<i{len(codificada)}s{relleno}xd", len(codificada), codificada, 0.0)
+        while self._usado + len(entrada) > self._capacidad:
+            self._mapa.close()
+            self._archivo.truncate(self._capacidad * 2)
+            self._abrir_mapa()
+        self._mapa[self._usado:self._usado + len(entrada)] = entrada
+        posicion = self._usado + len(entrada) - 8
+        self._usado += len(entrada)
+        struct.pack_into("<i", self._mapa, 0, self._usado)
+        self._posiciones[clave] = posicion
+        return posicion
+
+    def inc(self, clave, valor):
+        with self._lock:
+            posicion = self._posiciones.get(clave)
+            if posicion is None:
+                posicion = self._agregar(clave)
+            actual = struct.unpack_from("<d", self._mapa, posicion)[0]
+            struct.pack_into("<d", self._mapa, posicion, actual + valor)
+
+
+_valores = None
+_valores_clave = None
+_valores_lock = threading.Lock()
+_LE = re.compile(r'le="([^"]+)"')
+
+
+def metrics_enabled():
+    return getattr(settings, "METRICS_ENABLED", True)
+
+
+def get_metrics_dir():
+    return getattr(settings, "METRICS_DIR", "/tmp/cementerio_api_metrics")
+
+
+def _valores_del_proceso():
+    """El fichero de este proceso; se reabre si gunicorn hizo fork tras importarlo."""
+    global _valores, _valores_clave
+    clave = (os.getpid(), get_metrics_dir())
+    if _valores_clave != clave:
+        with _valores_lock:
+            if _valores_clave != clave:
+                pid, directorio = clave
+                os.makedirs(directorio, exist_ok=True)
+                _valores = MmapValues(os.path.join(directorio, f"{pid}.db"))
+                _valores_clave = clave
+    return _valores
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _clave(familia, muestra, etiquetas):
+    texto = ",".join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in sorted(etiquetas.items()))
+    return f"{familia}\x00{muestra}{{{texto}}}"
+
+
+def inc(familia, valor=1, **etiquetas):
+    if metrics_enabled():
+        _valores_del_proceso().inc(_clave(familia, familia, etiquetas), valor)
+
+
+def observe(familia, valor, **etiquetas):
+    """Registra una observación en un histograma (buckets acumulados, _sum y _count)."""
+    if not metrics_enabled():
+        return
+    valores = _valores_del_proceso()
+    for limite in DURATION_BUCKETS:
+        if valor <= limite:
+            valores.inc(_clave(familia, f"{familia}_bucket", {**etiquetas, "le": limite}), 1)
+    valores.inc(_clave(familia, f"{familia}_bucket", {**etiquetas, "le": "+Inf"}), 1)
+    valores.inc(_clave(familia, f"{familia}_sum", etiquetas), valor)
+    valores.inc(_clave(familia, f"{familia}_count", etiquetas), 1)
+
+
+def _orden_muestra(item):
+    """Orden estable con los buckets de menor a mayor y +Inf al final."""
+    muestra = item[0]
+    le = _LE.search(muestra)
+    if le is None:
+        return muestra, 0.0
+    return _LE.sub("", muestra), float(le.group(1).replace("+Inf", "inf"))
+
+
+def collect():
+    """Suma los ficheros de todos los workers y devuelve el formato de texto de Prometheus."""
+    totales = {}
+    for ruta in glob.glob(os.path.join(get_metrics_dir(), "*.db")):
+        with open(ruta, "rb") as archivo:
+            datos = archivo.read()
+        if len(datos) < _CABECERA:
+            continue
+        usado = struct.unpack_from("<i", datos, 0)[0]
+        for clave, valor, _ in _leer_entradas(datos, usado):
+            totales[clave] = totales.get(clave, 0.0) + valor
+
+    por_familia = {}
+    for clave, valor in totales.items():
+        familia, muestra = clave.split("\x00", 1)
+        por_familia.setdefault(familia, []).append((muestra, valor))
+
+    lineas = []
+    for familia, (tipo, ayuda) in FAMILIAS.items():
+        lineas.append(f"# HELP {familia} {ayuda}")
+        lineas.append(f"# TYPE {familia} {tipo}")
+        for muestra, valor in sorted(por_familia.get(familia, []), key=_orden_muestra):
+            lineas.append(f"{muestra} {valor!r}")
+    return "\n".join(lineas) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Peticiones, latencia y consultas SQL por vista (clase) y acción del
+    viewset. Las etiquetas salen de la vista resuelta, no de la URL, para
+    que el número de series no crezca con los ids.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics_enabled():
+            return self.get_response(request)
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        with envolver_consultas(contador):
+            response = self.get_response(request)
+        self.registrar(request, response, time.perf_counter() - inicio, contador.total)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics_enabled():
+            return await self.get_response(request)
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        async with envolver_consultas(contador):
+            response = await self.get_response(request)
+        self.registrar(request, response, time.perf_counter() - inicio, contador.total)
+        return response
+
+    @staticmethod
+    def etiquetas_vista(request):
+        metodo = request.method.lower()
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return "sin_ruta", metodo
+        funcion = match.func
+        # DRF guarda la clase en .cls y las acciones del viewset en .actions;
+        # las vistas de Django en .view_class
+        clase = getattr(funcion, "cls", None) or getattr(funcion, "view_class", None)
+        if clase is None:
+            return getattr(funcion, "__name__", "desconocida"), metodo
+        # Vistas async de cementerio.async_views: el viewset que sirven y "async_<acción>"
+        viewset = (getattr(funcion, "view_initkwargs", None) or {}).get("viewset_class")
+        if viewset is not None:
+            return viewset.__name__, f"async_{clase.action}"
+        return clase.__name__, (getattr(funcion, "actions", None) or {}).get(metodo, metodo)
+
+    def registrar(self, request, response, duracion, consultas):
+        vista, accion = self.etiquetas_vista(request)
+        inc("cementerio_http_requests_total", view=vista, action=accion,
+            method=request.method, status=response.status_code)
+        observe("cementerio_http_request_duration_seconds", duracion, view=vista, action=accion)
+        if consultas:
+            inc("cementerio_db_queries_total", consultas, view=vista, action=accion)
+
+
+class ContadorConsultas:
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,187 @@
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Tipos que merece la pena comprimir (las imágenes y zips ya lo están)
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "application/x-ndjson", "text/")
+
+
+def get_compression_min_bytes():
+    return getattr(settings, "COMPRESSION_MIN_BYTES", 1024)
+
+
+def get_gzip_level():
+    return getattr(settings, "COMPRESSION_GZIP_LEVEL", 6)
+
+
+def get_brotli_quality():
+    return getattr(settings, "COMPRESSION_BROTLI_QUALITY", 4)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise utilizable en modo async. El original solo es síncrono y,
+    bajo ASGI, obliga a Django a ejecutar toda la cadena de middleware en
+    un hilo por petición. Buscar el fichero es una consulta a un dict (o
+    al disco con autorefresh), así que puede hacerse en el bucle de eventos.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class Gzip:
+    encoding = "gzip"
+
+    def __init__(self):
+        # wbits 31: cabecera gzip en lugar de zlib
+        self._compresor = zlib.compressobj(get_gzip_level(), zlib.DEFLATED, 31)
+
+    def trozo(self, datos):
+        # Z_SYNC_FLUSH: cada trozo de un streaming sale ya comprimido
+        return self._compresor.compress(datos) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def fin(self):
+        return self._compresor.flush()
+
+    def todo(self, datos):
+        return self._compresor.compress(datos) + self._compresor.flush()
+
+
+class Brotli:
+    encoding = "br"
+
+    def __init__(self):
+        self._compresor = brotli.Compressor(quality=get_brotli_quality())
+
+    def trozo(self, datos):
+        return self._compresor.process(datos) + self._compresor.flush()
+
+    def fin(self):
+        return self._compresor.finish()
+
+    def todo(self, datos):
+        return self._compresor.process(datos) + self._compresor.finish()
+
+
+def compresor_para(accept_encoding):
+    """br si el cliente lo acepta y está instalado, si no gzip; None si ninguno."""
+    aceptadas = set()
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.partition(";")
+        clave, _, valor = parametros.partition("=")
+        try:
+            q = float(valor) if clave.strip() == "q" else 1.0
+        except ValueError:
+            q = 0.0
+        if q > 0:
+            aceptadas.add(nombre.strip().lower())
+    if brotli is not None and "br" in aceptadas:
+        return Brotli
+    if "gzip" in aceptadas or "*" in aceptadas:
+        return Gzip
+    return None
+
+
+class CompressionMiddleware:
+    """
+    gzip o brotli (Accept-Encoding) para las respuestas de texto, JSON,
+    NDJSON y MessagePack de al menos COMPRESSION_MIN_BYTES, y para todas las
+    exportaciones en streaming, trozo a trozo. Va en el mismo hilo también
+    bajo ASGI: comprimir una página son milisegundos de CPU sin E/S.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.comprimir(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.comprimir(request, await self.get_response(request))
+
+    @staticmethod
+    def comprimir(request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < get_compression_min_bytes():
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compresor = compresor_para(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if compresor is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = (
+                comprimir_async(compresor(), response.streaming_content) if response.is_async
+                else comprimir_trozos(compresor(), response.streaming_content)
+            )
+            # El tamaño comprimido no se sabe hasta el final
+            del response.headers["Content-Length"]
+        else:
+            contenido = compresor().todo(response.content)
+            if len(contenido) >= len(response.content):
+                return response
+            response.content = contenido
+            response.headers["Content-Length"] = str(len(contenido))
+
+        # Un ETag fuerte identifica los bytes exactos (RFC 9110 8.8.1)
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = compresor.encoding
+        return response
+
+
+def comprimir_trozos(compresor, trozos):
+    for trozo in trozos:
+        datos = compresor.trozo(trozo)
+        if datos:
+            yield datos
+    yield compresor.fin()
+
+
+async def comprimir_async(compresor, trozos):
+    async for trozo in trozos:
+        datos = compresor.trozo(trozo)
+        if datos:
+            yield datos
+    yield compresor.fin()
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cementerio', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['fecha_pago', 'id_pago'], name='pago_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['fecha_reserva', 'id_reserva'], name='reserva_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cementerio', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='difunto',
+            index=models.Index(fields=['apellido', 'nombre'], name='difunto_apellido_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['estado_pago', 'fecha_pago', 'id_pago'], name='pago_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcela',
+            index=models.Index(fields=['estado'], name='parcela_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcela',
+            index=models.Index(condition=models.Q(('estado', 'DISPONIBLE')), fields=['id_parcela'], name='parcela_disponible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['estado', 'fecha_reserva', 'id_reserva'], name='reserva_estado_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:06
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar_texto(texto):
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", texto.lower()))
+
+
+def poblar_texto_busqueda(apps, schema_editor):
+    Difunto = apps.get_model("cementerio", "Difunto")
+    pendientes = []
+    for difunto in Difunto.objects.only("nombre", "apellido").iterator(chunk_size=2000):
+        difunto.texto_busqueda = normalizar_texto(f"{difunto.nombre} {difunto.apellido}")
+        pendientes.append(difunto)
+        if len(pendientes) >= 2000:
+            Difunto.objects.bulk_update(pendientes, ["texto_busqueda"])
+            pendientes = []
+    if pendientes:
+        Difunto.objects.bulk_update(pendientes, ["texto_busqueda"])
+
+
+def crear_indice_trigram(apps, schema_editor):
+    # En SQLite el índice equivalente es la tabla FTS5 creada tras migrate
+    # (ver cementerio.search.instalar_fts_sqlite).
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS difunto_busqueda_trgm_idx "
+        "ON cementerio_difunto USING gin (texto_busqueda gin_trgm_ops)"
+    )
+
+
+def borrar_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for trigger in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS cementerio_difunto_fts_{trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS cementerio_difunto_fts")
+    elif schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS difunto_busqueda_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cementerio', '0003_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='difunto',
+            name='texto_busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=201),
+        ),
+        migrations.RunPython(poblar_texto_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_trigram, borrar_indice_trigram),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cementerio', '0004_difunto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['metodo_pago', 'fecha_pago', 'id_pago'], name='pago_metodo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcela',
+            index=models.Index(fields=['precio'], name='parcela_precio_idx'),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+from cementerio.rollups import reconstruir
+
+
+def sector_de(ubicacion):
+    return (ubicacion or "").split("-", 1)[0].strip()[:100]
+
+
+def poblar_sector(apps, schema_editor):
+    Parcela = apps.get_model("cementerio", "Parcela")
+    pendientes = []
+    for parcela in Parcela.objects.only("ubicacion").iterator(chunk_size=2000):
+        parcela.sector = sector_de(parcela.ubicacion)
+        pendientes.append(parcela)
+        if len(pendientes) >= 2000:
+            Parcela.objects.bulk_update(pendientes, ["sector"])
+            pendientes = []
+    if pendientes:
+        Parcela.objects.bulk_update(pendientes, ["sector"])
+
+
+def poblar_rollups(apps, schema_editor):
+    reconstruir(using=schema_editor.connection.alias, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cementerio', '0005_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngresoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=50)),
+                ('estado_pago', models.CharField(max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pagos', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngresoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=50)),
+                ('estado_pago', models.CharField(max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pagos', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OcupacionSector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sector', models.CharField(max_length=100)),
+                ('estado', models.CharField(max_length=20)),
+                ('parcelas', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReservaMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('sector', models.CharField(max_length=100)),
+                ('estado', models.CharField(max_length=20)),
+                ('reservas', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='parcela',
+            name='sector',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='ingresodiario',
+            constraint=models.UniqueConstraint(fields=('fecha', 'metodo_pago', 'estado_pago'), name='ingreso_diario_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingresomensual',
+            constraint=models.UniqueConstraint(fields=('mes', 'metodo_pago', 'estado_pago'), name='ingreso_mensual_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='ocupacionsector',
+            constraint=models.UniqueConstraint(fields=('sector', 'estado'), name='ocupacion_sector_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservamensual',
+            constraint=models.UniqueConstraint(fields=('mes', 'sector', 'estado'), name='reserva_mensual_unica'),
+        ),
+        migrations.RunPython(poblar_sector, migrations.RunPython.noop),
+        migrations.RunPython(poblar_rollups, migrations.RunPython.noop),
+    ]
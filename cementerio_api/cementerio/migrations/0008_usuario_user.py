@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def vincular_por_email(apps, schema_editor):
+    """Enlaza cada Usuario con la cuenta de su mismo email, si es la única con ese email."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Usuario = apps.get_model("cementerio", "Usuario")
+    por_email = {}
+    for user_id, email in User.objects.exclude(email="").values_list("pk", "email"):
+        por_email.setdefault(email.lower(), []).append(user_id)
+    pendientes = []
+    for usuario in Usuario.objects.filter(user__isnull=True).only("email").iterator(chunk_size=2000):
+        cuentas = por_email.get(usuario.email.lower(), [])
+        if len(cuentas) == 1:
+            usuario.user_id = cuentas[0]
+            pendientes.append(usuario)
+    Usuario.objects.bulk_update(pendientes, ["user"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cementerio', '0007_sync_timestamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usuario', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(vincular_por_email, migrations.RunPython.noop),
+    ]
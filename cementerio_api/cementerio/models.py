@@ -1,8 +1,42 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, router, transaction
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
+from .search import normalizar_texto
 
-class Usuario(models.Model):
+
+def sector_de(ubicacion):
+    """"Sector A - Fila 3 - Número 15" -> "Sector A": lo que va antes del primer guion."""
+    return (ubicacion or "").split("-", 1)[0].strip()[:100]
+
+
+class AtomicSaveModel(models.Model):
+    """
+    save() dentro de una transacción, para que los receptores de pre_save y
+    post_save que mantienen los rollups (signals.py) escriban en la misma.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class TimestampedModel(models.Model):
+    """created_at/updated_at indexados, para la sincronización por deltas (sync.py)."""
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Las escrituras masivas (update(), bulk_update) lo ponen a mano
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        abstract = True
+
+
+class Usuario(TimestampedModel):
     TIPO_CHOICES = [
         ("ADMIN", "Administrador"),
         ("CLIENTE", "Cliente"),
@@ -15,12 +49,21 @@ class Usuario(models.Model):
     telefono = models.CharField(max_length=20, blank=True, null=True)
     tipo_usuario = models.CharField(max_length=20, choices=TIPO_CHOICES, default="CLIENTE")
     fecha_registro = models.DateField(auto_now_add=True)
+    # Cuenta con la que inicia sesión (/api/me/reservas/, /api/me/pagos/).
+    # Se vincula sola por email al crear cualquiera de los dos (signals.py).
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="usuario",
+    )
 
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
 
 
-class Parcela(models.Model):
+class Parcela(TimestampedModel, AtomicSaveModel):
     ESTADO_CHOICES = [
         ("DISPONIBLE", "Disponible"),
         ("RESERVADA", "Reservada"),
@@ -36,12 +79,37 @@ class Parcela(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(0)]
     )
+    # Sector de la ubicación, para los rollups de ocupación (ver sector_de)
+    sector = models.CharField(max_length=100, blank=True, default="", editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["estado"], name="parcela_estado_idx"),
+            # Índice parcial: solo las parcelas libres, que son las que se buscan
+            models.Index(
+                fields=["id_parcela"],
+                name="parcela_disponible_idx",
+                condition=models.Q(estado="DISPONIBLE"),
+            ),
+            # ?precio__gte=/?precio__lte= (filters.FieldFilterBackend)
+            models.Index(fields=["precio"], name="parcela_precio_idx"),
+        ]
+
+    def actualizar_sector(self):
+        self.sector = sector_de(self.ubicacion)
+
+    def save(self, *args, **kwargs):
+        self.actualizar_sector()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "ubicacion" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"sector"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Parcela {self.id_parcela} - {self.ubicacion}"
 
 
-class Reserva(models.Model):
+class Reserva(TimestampedModel, AtomicSaveModel):
     ESTADO_CHOICES = [
         ("PENDIENTE", "Pendiente"),
         ("CONFIRMADA", "Confirmada"),
@@ -62,11 +130,18 @@ class Reserva(models.Model):
         related_name="reservas"
     )
 
+    class Meta:
+        indexes = [
+            # Respalda el orden (-fecha_reserva, -id_reserva) de la paginación por cursor
+            models.Index(fields=["fecha_reserva", "id_reserva"], name="reserva_fecha_id_idx"),
+            models.Index(fields=["estado", "fecha_reserva", "id_reserva"], name="reserva_estado_fecha_idx"),
+        ]
+
     def __str__(self):
         return f"Reserva {self.id_reserva} - Usuario {self.usuario_id}"
 
 
-class Pago(models.Model):
+class Pago(TimestampedModel, AtomicSaveModel):
     METODO_CHOICES = [
         ("EFECTIVO", "Efectivo"),
         ("TARJETA", "Tarjeta"),
@@ -94,11 +169,19 @@ class Pago(models.Model):
     metodo_pago = models.CharField(max_length=50, choices=METODO_CHOICES)
     estado_pago = models.CharField(max_length=20, choices=ESTADO_PAGO_CHOICES, default="PENDIENTE")
 
+    class Meta:
+        indexes = [
+            # Respalda el orden (-fecha_pago, -id_pago) de la paginación por cursor
+            models.Index(fields=["fecha_pago", "id_pago"], name="pago_fecha_id_idx"),
+            models.Index(fields=["estado_pago", "fecha_pago", "id_pago"], name="pago_estado_fecha_idx"),
+            models.Index(fields=["metodo_pago", "fecha_pago", "id_pago"], name="pago_metodo_fecha_idx"),
+        ]
+
     def __str__(self):
         return f"Pago {self.id_pago} - Reserva {self.reserva_id}"
 
 
-class Difunto(models.Model):
+class Difunto(TimestampedModel):
     id_difunto = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=100)
     apellido = models.CharField(max_length=100)
@@ -110,6 +193,146 @@ class Difunto(models.Model):
     )
     fecha_fallecimiento = models.DateField()
     notas = models.TextField(blank=True, null=True)
+    # Nombre completo normalizado (sin tildes, minúsculas) para la búsqueda.
+    # Índice GIN trigram en PostgreSQL y tabla FTS5 en SQLite (ver search.py).
+    texto_busqueda = models.CharField(max_length=201, blank=True, default="", editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["apellido", "nombre"], name="difunto_apellido_nombre_idx"),
+        ]
+
+    def actualizar_texto_busqueda(self):
+        self.texto_busqueda = normalizar_texto(f"{self.nombre} {self.apellido}")
+
+    def save(self, *args, **kwargs):
+        self.actualizar_texto_busqueda()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and ({"nombre", "apellido"} & set(update_fields)):
+            kwargs["update_fields"] = set(update_fields) | {"texto_busqueda"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
+
+
+class Borrado(models.Model):
+    """
+    Lápida de una fila borrada de un modelo sincronizable, para que
+    ?updated_since= devuelva también los borrados. purge_tombstones elimina
+    las de más de SYNC_TOMBSTONE_DAYS días.
+    """
+    # label_lower del modelo: "cementerio.parcela"
+    modelo = models.CharField(max_length=100)
+    objeto_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["modelo", "deleted_at"], name="borrado_modelo_fecha_idx"),
+        ]
+
+
+class Job(models.Model):
+    """
+    Trabajo en segundo plano (exportaciones, importaciones, rollups) que
+    ejecuta `manage.py run_workers`. La cola es esta tabla: ver jobs.py.
+    """
+    ESTADO_CHOICES = [
+        ("PENDIENTE", "Pendiente"),
+        ("EN_CURSO", "En curso"),
+        ("COMPLETADO", "Completado"),
+        ("FALLIDO", "Fallido"),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default="PENDIENTE")
+    # 0-100
+    progreso = models.PositiveSmallIntegerField(default=0)
+    mensaje = models.CharField(max_length=255, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    # Fichero de entrada (CSV a importar) y de salida (exportación)
+    entrada = models.FileField(upload_to="jobs/entradas/", blank=True)
+    archivo = models.FileField(upload_to="jobs/resultados/", blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    # Los reintentos esperan hasta aquí (backoff)
+    ejecutar_desde = models.DateTimeField(default=timezone.now)
+    # Quién lo ejecuta y cuándo dio señales de vida por última vez
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    creado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # La consulta de la cola: PENDIENTE y ejecutar_desde <= ahora
+            models.Index(fields=["estado", "ejecutar_desde"], name="job_cola_idx"),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} {self.tipo} ({self.estado})"
+
+
+# Rollups para /api/reports/ ---------------------------------------------------
+# Se mantienen en la misma transacción que cada escritura en Pago, Reserva y
+# Parcela (rollups.py, signals.py) y se reconstruyen con rebuild_rollups.
+
+
+class IngresoDiario(models.Model):
+    fecha = models.DateField()
+    metodo_pago = models.CharField(max_length=50)
+    estado_pago = models.CharField(max_length=20)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pagos = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["fecha", "metodo_pago", "estado_pago"], name="ingreso_diario_unico"),
+        ]
+
+
+class IngresoMensual(models.Model):
+    # Primer día del mes
+    mes = models.DateField()
+    metodo_pago = models.CharField(max_length=50)
+    estado_pago = models.CharField(max_length=20)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pagos = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["mes", "metodo_pago", "estado_pago"], name="ingreso_mensual_unico"),
+        ]
+
+
+class ReservaMensual(models.Model):
+    """Reservas por mes de fecha_reserva, sector de la parcela y estado."""
+    mes = models.DateField()
+    sector = models.CharField(max_length=100)
+    estado = models.CharField(max_length=20)
+    reservas = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["mes", "sector", "estado"], name="reserva_mensual_unica"),
+        ]
+
+
+class OcupacionSector(models.Model):
+    """Parcelas por sector y estado en este momento."""
+    sector = models.CharField(max_length=100)
+    estado = models.CharField(max_length=20)
+    parcelas = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["sector", "estado"], name="ocupacion_sector_unica"),
+        ]
@@ -0,0 +1,130 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por clave (keyset) sobre un orden descendente (campo, pk).
+
+    En lugar de OFFSET + COUNT(*), cada página filtra a partir de la última
+    fila vista, así la página N cuesta lo mismo que la primera si existe un
+    índice compuesto (campo, pk). Los cursores son opacos (base64) y no se
+    devuelve el total de filas.
+    """
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    invalid_cursor_message = "Cursor inválido"
+
+    def __init__(self, field, page_size):
+        self.field = field
+        self.page_size = page_size
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def row_value(self, row, name):
+        # Filas de values() (dict) o instancias de modelo
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def encode_cursor(self, row, reverse):
+        position = {
+            "v": str(self.row_value(row, self.field)),
+            "pk": self.row_value(row, self.pk_name),
+            "r": int(reverse),
+        }
+        token = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, queryset):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(token.encode()))
+            model_field = queryset.model._meta.get_field(self.field)
+            value = model_field.to_python(position["v"])
+            pk = queryset.model._meta.pk.to_python(position["pk"])
+            return value, pk, bool(position["r"])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def prepare_queryset(self, queryset, request):
+        """Aplica orden y filtro del cursor; devuelve el queryset de la página (+1 fila)."""
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        pk_name = self.pk_name = queryset.model._meta.pk.name
+        self.cursor = cursor = self.decode_cursor(request, queryset)
+
+        if cursor is None:
+            value, pk, reverse = None, None, False
+        else:
+            value, pk, reverse = cursor
+        self.reverse = reverse
+
+        if reverse:
+            # Página anterior: filas más recientes que el cursor, en orden inverso
+            queryset = queryset.order_by(self.field, pk_name)
+            if cursor is not None:
+                queryset = queryset.filter(
+                    Q(**{f"{self.field}__gt": value}) | Q(**{self.field: value, f"{pk_name}__gt": pk})
+                )
+        else:
+            queryset = queryset.order_by(f"-{self.field}", f"-{pk_name}")
+            if cursor is not None:
+                queryset = queryset.filter(
+                    Q(**{f"{self.field}__lt": value}) | Q(**{self.field: value, f"{pk_name}__lt": pk})
+                )
+        return queryset[:self.page_size + 1]
+
+    def finish_page(self, rows):
+        """Recorta la fila de más y calcula los enlaces next/previous."""
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.next_url = None
+        self.previous_url = None
+        if rows:
+            if has_more or self.reverse:
+                self.next_url = self.encode_cursor(rows[-1], reverse=False)
+            if self.cursor is not None and (has_more or not self.reverse):
+                self.previous_url = self.encode_cursor(rows[0], reverse=True)
+        elif self.reverse:
+            self.next_url = remove_query_param(self.base_url, self.cursor_query_param)
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.prepare_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.finish_page([row async for row in self.prepare_queryset(queryset, request)])
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.next_url,
+            "previous": self.previous_url,
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
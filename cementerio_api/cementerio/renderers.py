@@ -0,0 +1,84 @@
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - sin orjson se usa el json de DRF
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Lo que ni orjson ni msgpack codifican igual que DRF (Decimal, fechas con
+# hora, textos traducibles, querysets...) se convierte con el JSONEncoder de
+# DRF, así la salida no cambia con el formato ni frente al renderer original
+_default = JSONEncoder().default
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer con orjson: dicts y listas de DRF, textos, números y UUID
+    se codifican en C; fechas (DRF recorta las horas a milisegundos) y
+    Decimal (número) pasan por el encoder de DRF. Los serializadores ya los
+    dan como texto, así que en los listados casi nunca ocurre. Con
+    "; indent=" en el Accept o un dato que orjson no admite (claves que no
+    son str) usa el renderer de DRF.
+
+    La salida es la misma byte a byte, con U+2028 y U+2029 escapados como
+    en DRF, salvo una diferencia: un float NaN o infinito sale como null,
+    mientras que DRF (STRICT_JSON) lanza ValueError. Comprobarlo obligaría a
+    recorrer los datos en Python y los modelos no tienen campos float.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Válidos en JSON pero no en JavaScript: DRF los escapa. Sin ninguno,
+        # replace() devuelve el mismo objeto sin copiarlo
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser con orjson; el cuerpo debe ser UTF-8 (RFC 8259)."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """application/msgpack, elegido con Accept o ?format=msgpack. Requiere msgpack."""
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except ValueError as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
@@ -0,0 +1,247 @@
+from collections import defaultdict
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+
+# Columnas de cada fila de origen que afectan a los rollups
+CAMPOS_PAGO = ("fecha_pago", "metodo_pago", "estado_pago", "monto")
+CAMPOS_RESERVA = ("fecha_reserva", "estado", "parcela_id")
+CAMPOS_PARCELA = ("id_parcela", "sector", "estado")
+
+ROLLUPS = ("IngresoDiario", "IngresoMensual", "ReservaMensual", "OcupacionSector")
+# Modelos de origen (model_name)
+ORIGENES = ("pago", "reserva", "parcela")
+
+
+def _model(nombre, apps=global_apps):
+    return apps.get_model("cementerio", nombre)
+
+
+def inicio_mes(fecha):
+    return fecha.replace(day=1)
+
+
+def datos(instancia, campos):
+    """Valores de la instancia ya convertidos (create(monto="10") guarda el str tal cual)."""
+    opts = instancia._meta
+    return {campo: opts.get_field(campo).to_python(getattr(instancia, campo)) for campo in campos}
+
+
+def datos_reserva(instancia, sector=None):
+    fila = datos(instancia, CAMPOS_RESERVA)
+    if sector is None and type(instancia).parcela.is_cached(instancia):
+        sector = instancia.parcela.sector
+    if sector is None:
+        sector = _model("Parcela")._default_manager.filter(pk=instancia.parcela_id).values_list("sector", flat=True).first()
+    fila["sector"] = sector or ""
+    return fila
+
+
+def anteriores(model, pks):
+    """Valores guardados de las filas `pks` de Pago, Reserva o Parcela, bloqueadas hasta el commit."""
+    if model._meta.model_name not in ORIGENES:
+        return {}
+    queryset = model._default_manager.filter(pk__in=pks).select_for_update(of=("self",))
+    if model._meta.model_name == "pago":
+        return {fila.pop("pk"): fila for fila in queryset.values("pk", *CAMPOS_PAGO)}
+    if model._meta.model_name == "reserva":
+        return {fila.pop("pk"): fila for fila in queryset.values("pk", *CAMPOS_RESERVA, sector=F("parcela__sector"))}
+    return {fila.pop("pk"): fila for fila in queryset.values("pk", *CAMPOS_PARCELA)}
+
+
+class Deltas:
+    """
+    Cambios pendientes en las tablas de rollup, acumulados por fila de
+    destino y aplicados con un UPDATE ... SET x = x + delta por fila.
+    """
+
+    def __init__(self):
+        self._cambios = defaultdict(lambda: defaultdict(int))
+
+    def sumar(self, model, clave, signo, **valores):
+        cambios = self._cambios[(model, tuple(sorted(clave.items())))]
+        for campo, valor in valores.items():
+            cambios[campo] += signo * valor
+        return self
+
+    # n > 1: la fila resume n filas de origen (monto es entonces su suma)
+    def pago(self, fila, signo=1, n=1):
+        for model, clave in (
+            ("IngresoDiario", {"fecha": fila["fecha_pago"]}),
+            ("IngresoMensual", {"mes": inicio_mes(fila["fecha_pago"])}),
+        ):
+            clave.update(metodo_pago=fila["metodo_pago"], estado_pago=fila["estado_pago"])
+            self.sumar(model, clave, signo, total=fila["monto"], pagos=n)
+        return self
+
+    def reserva(self, fila, signo=1, n=1):
+        clave = {"mes": inicio_mes(fila["fecha_reserva"]), "sector": fila["sector"], "estado": fila["estado"]}
+        return self.sumar("ReservaMensual", clave, signo, reservas=n)
+
+    def parcela(self, fila, signo=1, n=1):
+        return self.sumar("OcupacionSector", {"sector": fila["sector"], "estado": fila["estado"]}, signo, parcelas=n)
+
+    def mover_estado(self, model, filas, campo, anterior, nuevo):
+        """
+        Filas agrupadas de un UPDATE ... SET campo = nuevo WHERE campo =
+        anterior: cada una con los campos de la clave del rollup y su
+        cuenta en "n".
+        """
+        aplicar = getattr(self, model._meta.model_name)
+        for fila in filas:
+            fila = dict(fila)
+            n = fila.pop("n")
+            aplicar({**fila, campo: anterior}, -1, n)
+            aplicar({**fila, campo: nuevo}, 1, n)
+        return self
+
+    def mover_reservas(self, parcelas, apps=global_apps):
+        """Las reservas de parcelas que cambiaron de sector: {id_parcela: (sector_anterior, sector_nuevo)}."""
+        if not parcelas:
+            return self
+        filas = (
+            _model("Reserva", apps)._default_manager.filter(parcela_id__in=list(parcelas)).order_by()
+            .values("parcela_id", "estado", mes=TruncMonth("fecha_reserva")).annotate(n=Count("pk"))
+        )
+        for fila in filas:
+            for sector, signo in zip(parcelas[fila["parcela_id"]], (-1, 1)):
+                self.sumar("ReservaMensual", {"mes": fila["mes"], "sector": sector, "estado": fila["estado"]}, signo, reservas=fila["n"])
+        return self
+
+    def cambio(self, model, anterior, nuevo):
+        """Resta la fila `anterior` y suma `nuevo` (cualquiera puede ser None)."""
+        nombre = model._meta.model_name
+        aplicar = getattr(self, nombre)
+        if anterior is not None:
+            aplicar(anterior, -1)
+        if nuevo is not None:
+            aplicar(nuevo)
+        if nombre == "parcela" and anterior is not None and nuevo is not None and anterior["sector"] != nuevo["sector"]:
+            self.mover_reservas({nuevo["id_parcela"]: (anterior["sector"], nuevo["sector"])})
+        return self
+
+    def aplicar(self, using="default", apps=global_apps):
+        # Orden fijo de filas: dos transacciones concurrentes las bloquean en
+        # el mismo orden y no se producen interbloqueos
+        for (nombre, clave), cambios in sorted(self._cambios.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            cambios = {campo: valor for campo, valor in cambios.items() if valor}
+            if not cambios:
+                continue
+            manager = _model(nombre, apps)._default_manager.db_manager(using)
+            filtro = dict(clave)
+            incrementos = {campo: F(campo) + valor for campo, valor in cambios.items()}
+            if manager.filter(**filtro).update(**incrementos):
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    manager.create(**filtro, **cambios)
+            except IntegrityError:
+                # Otra transacción creó la fila entre el UPDATE y el INSERT
+                manager.filter(**filtro).update(**incrementos)
+        self._cambios.clear()
+
+
+def registrar_cambio(model, anterior, nuevo, using="default"):
+    Deltas().cambio(model, anterior, nuevo).aplicar(using)
+
+
+def registrar_lote(model, anteriores_por_pk, instancias, using="default"):
+    """
+    Rollups tras bulk_create/bulk_update de `instancias`; `anteriores_por_pk`
+    son los valores previos (anteriores()) de las que ya existían.
+    """
+    nombre = model._meta.model_name
+    if nombre not in ORIGENES:
+        return
+    deltas = Deltas()
+    if nombre == "pago":
+        nuevos = [datos(i, CAMPOS_PAGO) for i in instancias]
+    elif nombre == "parcela":
+        nuevos = [datos(i, CAMPOS_PARCELA) for i in instancias]
+    else:
+        sectores = dict(
+            _model("Parcela")._default_manager.filter(pk__in={i.parcela_id for i in instancias}).values_list("pk", "sector")
+        )
+        nuevos = [datos_reserva(i, sectores.get(i.parcela_id, "")) for i in instancias]
+    movidas = {}
+    for instancia, nuevo in zip(instancias, nuevos):
+        anterior = anteriores_por_pk.get(instancia.pk)
+        aplicar = getattr(deltas, nombre)
+        if anterior is not None:
+            aplicar(anterior, -1)
+            if nombre == "parcela" and anterior["sector"] != nuevo["sector"]:
+                movidas[instancia.pk] = (anterior["sector"], nuevo["sector"])
+        aplicar(nuevo)
+    deltas.mover_reservas(movidas).aplicar(using)
+
+
+def mover_parcela(parcela_id, estado_anterior, estado_nuevo, using="default"):
+    """Rollup de ocupación tras un UPDATE condicional de estado (services.py)."""
+    sector = _model("Parcela")._default_manager.db_manager(using).filter(pk=parcela_id).values_list("sector", flat=True).first()
+    if sector is None:
+        return
+    fila = {"sector": sector}
+    Deltas().parcela({**fila, "estado": estado_anterior}, -1).parcela({**fila, "estado": estado_nuevo}).aplicar(using)
+
+
+def _insertar_desde(model, queryset, columnas, using):
+    """
+    INSERT INTO rollup (...) SELECT ... en una sola sentencia. `columnas`
+    asocia cada nombre de values()/annotate() con su campo en el rollup; el
+    SELECT de Django pone primero los campos y después las anotaciones.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    query = queryset.query
+    orden = [*query.values_select, *query.annotation_select]
+    destino = ", ".join(qn(model._meta.get_field(columnas[nombre]).column) for nombre in orden)
+    sql, params = query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {qn(model._meta.db_table)} ({destino}) {sql}", params)
+        return cursor.rowcount
+
+
+def reconstruir(using="default", apps=global_apps):
+    """
+    Recalcula todos los rollups desde Pago, Reserva y Parcela con
+    INSERT ... SELECT agrupados, en una transacción. Devuelve las filas
+    escritas por tabla.
+    """
+    Pago, Reserva, Parcela = (_model(nombre, apps) for nombre in ("Pago", "Reserva", "Parcela"))
+    IngresoDiario, IngresoMensual, ReservaMensual, OcupacionSector = (_model(nombre, apps) for nombre in ROLLUPS)
+    filas = {}
+    with transaction.atomic(using=using):
+        for nombre in ROLLUPS:
+            _model(nombre, apps)._default_manager.using(using).all().delete()
+        filas["IngresoDiario"] = _insertar_desde(
+            IngresoDiario,
+            Pago._default_manager.using(using).order_by()
+            .values("fecha_pago", "metodo_pago", "estado_pago").annotate(t=Sum("monto"), n=Count("pk")),
+            {"fecha_pago": "fecha", "metodo_pago": "metodo_pago", "estado_pago": "estado_pago", "t": "total", "n": "pagos"},
+            using,
+        )
+        # Los meses salen de los días, que son muchas menos filas que los pagos
+        filas["IngresoMensual"] = _insertar_desde(
+            IngresoMensual,
+            IngresoDiario._default_manager.using(using).order_by()
+            .values("metodo_pago", "estado_pago", m=TruncMonth("fecha")).annotate(t=Sum("total"), n=Sum("pagos")),
+            {"m": "mes", "metodo_pago": "metodo_pago", "estado_pago": "estado_pago", "t": "total", "n": "pagos"},
+            using,
+        )
+        filas["ReservaMensual"] = _insertar_desde(
+            ReservaMensual,
+            Reserva._default_manager.using(using).order_by()
+            .values("parcela__sector", "estado", m=TruncMonth("fecha_reserva")).annotate(n=Count("pk")),
+            {"m": "mes", "parcela__sector": "sector", "estado": "estado", "n": "reservas"},
+            using,
+        )
+        filas["OcupacionSector"] = _insertar_desde(
+            OcupacionSector,
+            Parcela._default_manager.using(using).order_by().values("sector", "estado").annotate(n=Count("pk")),
+            {"sector": "sector", "estado": "estado", "n": "parcelas"},
+            using,
+        )
+    return filas
@@ -0,0 +1,268 @@
+import decimal
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.http import Http404
+from rest_framework import ISO_8601, serializers
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .instrumentation import medir_serializacion
+
+
+# Ids por consulta al cargar relaciones inversas (límite de parámetros de SQLite)
+PREFETCH_CHUNK = 900
+
+# Campos cuya representación es el valor tal cual sale de values()
+IDENTITY_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class RowSerializer:
+    """
+    Serializador de solo lectura sobre filas de values().
+
+    Se construye a partir de un ModelSerializer (clase o instancia ya
+    recortada con fields/expand) y genera una función que convierte cada
+    fila (dict) en la misma salida que serializer.data, sin instanciar
+    modelos ni recorrer objetos Field por fila. Los campos de relaciones
+    (source="usuario.nombre") y los serializadores anidados de claves
+    foráneas se leen con un JOIN en la misma consulta; los anidados
+    many=True (relaciones inversas) con una consulta más por página.
+    """
+
+    def __init__(self, serializer):
+        if isinstance(serializer, type):
+            serializer = serializer()
+        self.serializer_class = type(serializer)
+        self.model = serializer.Meta.model
+        self.lookups = []
+        # (lookup de la pk en la fila, RowSerializer hijo, campo FK en el hijo)
+        self.prefetches = []
+        self._namespace = {}
+        body = self._dict_source(serializer, self.model, prefix="")
+        source = f"def serialize_row(fila, _rel=()):\n    return {body}\n"
+        exec(compile(source, f"<RowSerializer {self.serializer_class.__name__}>", "exec"), self._namespace)
+        self.serialize_row = self._namespace["serialize_row"]
+
+    def _add_lookup(self, lookup):
+        if lookup not in self.lookups:
+            self.lookups.append(lookup)
+        return f"fila[{lookup!r}]"
+
+    def _dict_source(self, serializer, model, prefix):
+        items = []
+        for field in serializer.fields.values():
+            if not field.write_only:
+                items.append(f"{field.field_name!r}: {self._field_source(field, model, prefix)}")
+        return "{" + ", ".join(items) + "}"
+
+    def _field_source(self, field, model, prefix):
+        if isinstance(field, serializers.ListSerializer):
+            return self._many_source(field, model, prefix)
+        if isinstance(field, serializers.ModelSerializer):
+            return self._nested_source(field, model, prefix)
+        if field.source == "*" or isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+            raise TypeError(f"{field.field_name}: campo no soportado")
+
+        nullable = False
+        for attr in field.source_attrs:
+            if model is None:
+                raise TypeError(f"{field.field_name}: {attr} no es una relación")
+            model_field = self._get_field(model, attr, field)
+            if not model_field.concrete or model_field.many_to_many:
+                raise TypeError(f"{field.field_name}: {attr} no es una columna")
+            # Con una relación nula DRF omite la clave; values() devolvería None
+            if model_field.null and model_field.is_relation and attr != field.source_attrs[-1]:
+                raise TypeError(f"{field.field_name}: relación nullable")
+            nullable = nullable or model_field.null
+            model = model_field.related_model if model_field.is_relation else None
+
+        if isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField):
+            raise TypeError(f"{field.field_name}: relación no soportada")
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is not None:
+            raise TypeError(f"{field.field_name}: pk_field no soportado")
+
+        lookup = prefix + "__".join(field.source_attrs)
+        value = self._add_lookup(lookup)
+        converter = self._converter(field)
+        if converter is None:
+            return value
+        name = f"_c{len(self._namespace)}"
+        self._namespace[name] = converter
+        if nullable:
+            return f"(None if {value} is None else {name}({value}))"
+        return f"{name}({value})"
+
+    @staticmethod
+    def _get_field(model, attr, field):
+        try:
+            return model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            raise TypeError(f"{field.field_name}: {attr} no es un campo de {model.__name__}")
+
+    def _nested_source(self, field, model, prefix):
+        """Clave foránea expandida: las columnas del modelo relacionado vienen en el JOIN."""
+        model_field = self._get_field(model, field.source, field)
+        if not (model_field.concrete and (model_field.many_to_one or model_field.one_to_one)):
+            raise TypeError(f"{field.field_name}: solo claves foráneas")
+        related = model_field.related_model
+        sub_prefix = f"{prefix}{field.source}__"
+        body = self._dict_source(field, related, sub_prefix)
+        if model_field.null:
+            pk = self._add_lookup(sub_prefix + related._meta.pk.name)
+            return f"(None if {pk} is None else {body})"
+        return body
+
+    def _many_source(self, field, model, prefix):
+        """Relación inversa (many=True): se resuelve en serialize() con una consulta aparte."""
+        if prefix:
+            raise TypeError(f"{field.field_name}: many=True solo en el primer nivel")
+        relation = self._get_field(model, field.source, field)
+        if not relation.one_to_many:
+            raise TypeError(f"{field.field_name}: solo relaciones inversas de claves foráneas")
+        pk = self._add_lookup(model._meta.pk.name)
+        child = RowSerializer(field.child)
+        self.prefetches.append((model._meta.pk.name, child, relation.field.name))
+        return f"_rel[{len(self.prefetches) - 1}].get({pk}, [])"
+
+    @staticmethod
+    def _converter(field):
+        if isinstance(field, IDENTITY_FIELDS):
+            return None
+        if isinstance(field, serializers.ChoiceField) and all(isinstance(c, str) for c in field.choices):
+            return None
+        if isinstance(field, serializers.DateField) and not isinstance(field, serializers.DateTimeField):
+            formato = getattr(field, "format", api_settings.DATE_FORMAT)
+            if formato is not None and formato.lower() == ISO_8601:
+                return lambda value: value.isoformat() if value else None
+        if (
+            isinstance(field, serializers.DecimalField)
+            and field.decimal_places is not None
+            and getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+            and not field.localize
+        ):
+            # Lo mismo que DecimalField.to_representation con el contexto precalculado
+            exponente = decimal.Decimal(".1") ** field.decimal_places
+            contexto = decimal.getcontext().copy()
+            if field.max_digits is not None:
+                contexto.prec = field.max_digits
+            rounding = field.rounding
+
+            def to_decimal_string(value):
+                if not isinstance(value, decimal.Decimal):
+                    value = decimal.Decimal(str(value).strip())
+                return "{:f}".format(value.quantize(exponente, rounding=rounding, context=contexto))
+            return to_decimal_string
+        # Resto (fechas con formato, etc.): la conversión propia del campo
+        return field.to_representation
+
+    def values(self, queryset, *extra):
+        """values() con las columnas que necesita la salida, más la pk y `extra`."""
+        columnas = list(dict.fromkeys([*self.lookups, self.model._meta.pk.name, *extra]))
+        # values() no admite prefetch_related; las relaciones inversas van en serialize()
+        return queryset.prefetch_related(None).values(*columnas)
+
+    def _related_querysets(self, filas):
+        """(índice, campo FK, hijo, queryset) por lote de ids de cada relación inversa."""
+        for indice, (pk, child, fk) in enumerate(self.prefetches):
+            ids = list({fila[pk] for fila in filas})
+            for inicio in range(0, len(ids), PREFETCH_CHUNK):
+                queryset = child.model._default_manager.filter(**{f"{fk}__in": ids[inicio:inicio + PREFETCH_CHUNK]})
+                yield indice, fk, child, child.values(queryset.order_by(child.model._meta.pk.name), fk)
+
+    def related_rows(self, filas):
+        relacionados = [{} for _ in self.prefetches]
+        for indice, fk, child, queryset in self._related_querysets(filas):
+            hijas = list(queryset)
+            for hija, datos in zip(hijas, child.serialize(hijas)):
+                relacionados[indice].setdefault(hija[fk], []).append(datos)
+        return relacionados
+
+    async def arelated_rows(self, filas):
+        relacionados = [{} for _ in self.prefetches]
+        for indice, fk, child, queryset in self._related_querysets(filas):
+            hijas = [hija async for hija in queryset]
+            for hija, datos in zip(hijas, child.serialize(hijas)):
+                relacionados[indice].setdefault(hija[fk], []).append(datos)
+        return relacionados
+
+    def serialize(self, filas):
+        serialize_row = self.serialize_row
+        filas = list(filas)
+        relacionados = self.related_rows(filas) if self.prefetches else ()
+        with medir_serializacion():
+            return [serialize_row(fila, relacionados) for fila in filas]
+
+    async def aserialize(self, filas):
+        """serialize() para el ORM async: `filas` es una lista ya cargada."""
+        relacionados = await self.arelated_rows(filas) if self.prefetches else ()
+        with medir_serializacion():
+            return [self.serialize_row(fila, relacionados) for fila in filas]
+
+
+@lru_cache(maxsize=256)
+def get_row_serializer(serializer_class, fields=None, expand=()):
+    """RowSerializer compilado una vez por combinación, o None si no es compatible."""
+    try:
+        if fields is None and not expand:
+            return RowSerializer(serializer_class)
+        return RowSerializer(serializer_class(fields=fields, expand=expand))
+    except TypeError:
+        return None
+
+
+class FastReadMixin:
+    """
+    list/retrieve con values() y RowSerializer en lugar de instancias de
+    modelo y ModelSerializer. La salida es la misma; si el serializador
+    tiene campos que RowSerializer no sabe leer, se usa el camino normal.
+    """
+    fast_read = True
+
+    def get_serializer_options(self):
+        """Argumentos extra del serializador (fields/expand, ver sparse.py)."""
+        return {}
+
+    def get_row_serializer(self):
+        if not self.fast_read:
+            return None
+        return get_row_serializer(self.get_serializer_class(), **self.get_serializer_options())
+
+    def get_row_values(self, rows, queryset):
+        # La paginación por cursor necesita su campo aunque ?fields= lo omita
+        extra = [self.keyset_field] if getattr(self, "keyset_field", None) else []
+        return rows.values(self.filter_queryset(queryset), *extra)
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_row_serializer()
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.get_row_values(rows, self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.serialize(page))
+        return Response(rows.serialize(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        rows = self.get_row_serializer()
+        if rows is None:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_row_values(rows, self.get_queryset())
+        try:
+            fila = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).first()
+        except (TypeError, ValueError, ValidationError):
+            fila = None
+        if fila is None:
+            raise Http404
+        # Los permisos de objeto necesitan la instancia: solo se carga si hay alguno
+        if any(type(p).has_object_permission is not BasePermission.has_object_permission
+               for p in self.get_permissions()):
+            self.check_object_permissions(request, self.get_object())
+        return Response(rows.serialize([fila])[0])
@@ -0,0 +1,168 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, When, IntegerField
+from rest_framework.filters import BaseFilterBackend
+
+
+FTS_TABLE = "cementerio_difunto_fts"
+
+# Tabla FTS5 de contenido externo sobre cementerio_difunto, mantenida por
+# triggers. El tokenizador trigram permite coincidencias parciales.
+SQLITE_FTS_SQL = {
+    FTS_TABLE: f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            texto_busqueda,
+            content='cementerio_difunto',
+            content_rowid='id_difunto',
+            tokenize='trigram'
+        )
+    """,
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON cementerio_difunto BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, texto_busqueda) VALUES (new.id_difunto, new.texto_busqueda);
+        END
+    """,
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON cementerio_difunto BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, texto_busqueda)
+            VALUES ('delete', old.id_difunto, old.texto_busqueda);
+        END
+    """,
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF texto_busqueda ON cementerio_difunto BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, texto_busqueda)
+            VALUES ('delete', old.id_difunto, old.texto_busqueda);
+            INSERT INTO {FTS_TABLE}(rowid, texto_busqueda) VALUES (new.id_difunto, new.texto_busqueda);
+        END
+    """,
+}
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sin tildes ni signos: "Ramírez Núñez" -> "ramirez nunez"."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", texto.lower()))
+
+
+def trigramas(palabra):
+    """Trigramas de una palabra al estilo pg_trgm (dos espacios delante, uno detrás)."""
+    palabra = f"  {palabra} "
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+def similitud(termino, texto):
+    """
+    Similitud por trigramas entre 0 y 1: para cada palabra buscada se toma la
+    palabra más parecida del texto y se promedia. Tolera errores de tipeo.
+    """
+    palabras_texto = [trigramas(p) for p in texto.split()]
+    palabras_termino = termino.split()
+    if not palabras_termino or not palabras_texto:
+        return 0.0
+    total = 0.0
+    for palabra in palabras_termino:
+        t = trigramas(palabra)
+        total += max(len(t & p) / len(t | p) for p in palabras_texto)
+    return total / len(palabras_termino)
+
+
+def instalar_fts_sqlite(conexion):
+    """
+    Crea (si falta) el índice FTS5 y sus triggers. Las migraciones de SQLite
+    que reconstruyen cementerio_difunto borran los triggers, así que se vuelve
+    a ejecutar tras cada migrate y se reindexa si faltaba algo.
+    """
+    if conexion.vendor != "sqlite":
+        return
+    with conexion.cursor() as cursor:
+        tablas = set(conexion.introspection.table_names(cursor))
+        if "cementerio_difunto" not in tablas:
+            return
+        columnas = {c.name for c in conexion.introspection.get_table_description(cursor, "cementerio_difunto")}
+        if "texto_busqueda" not in columnas:
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s)" % ", ".join(["%s"] * len(SQLITE_FTS_SQL)),
+            list(SQLITE_FTS_SQL),
+        )
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        if existentes == set(SQLITE_FTS_SQL):
+            return
+        for sql in SQLITE_FTS_SQL.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _buscar_postgresql(queryset, termino):
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    from django.db.models import F
+
+    # %> usa el índice GIN gin_trgm_ops sobre texto_busqueda
+    return (
+        queryset.filter(TrigramWordSimilar(F("texto_busqueda"), termino))
+        .annotate(similitud=TrigramWordSimilarity(termino, "texto_busqueda"))
+        .order_by("-similitud", "apellido", "nombre")
+    )
+
+
+def _buscar_sqlite(queryset, termino):
+    limite = getattr(settings, "DIFUNTO_SEARCH_CANDIDATES", 500)
+    umbral = getattr(settings, "DIFUNTO_SEARCH_THRESHOLD", 0.3)
+    consulta = " OR ".join(
+        '"%s"' % t for palabra in termino.split() for t in trigramas(palabra) if t.strip() == t
+    )
+    if not consulta:
+        # Términos de menos de tres letras: no hay trigramas completos
+        return queryset.filter(texto_busqueda__contains=termino).order_by("apellido", "nombre")
+
+    # La misma base que el queryset (la réplica si el router la eligió): los
+    # ids del índice deben ser los de las filas que luego se filtran
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, texto_busqueda FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [consulta, limite],
+        )
+        candidatos = cursor.fetchall()
+
+    puntuados = sorted(
+        ((similitud(termino, texto), pk) for pk, texto in candidatos),
+        key=lambda par: -par[0],
+    )
+    ids = [pk for puntaje, pk in puntuados if puntaje >= umbral]
+    if not ids:
+        return queryset.none()
+    orden = Case(
+        *[When(pk=pk, then=posicion) for posicion, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(orden)
+
+
+def buscar_difuntos(queryset, termino):
+    """Búsqueda por nombre tolerante a tildes y errores, ordenada por relevancia."""
+    termino = normalizar_texto(termino)
+    if not termino:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _buscar_postgresql(queryset, termino)
+    if vendor == "sqlite":
+        return _buscar_sqlite(queryset, termino)
+    return queryset.filter(texto_busqueda__contains=termino)
+
+
+class DifuntoSearchFilter(BaseFilterBackend):
+    """?search= sobre el nombre completo del difunto usando el índice de búsqueda."""
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        termino = request.query_params.get(self.search_param, "")
+        if not termino.strip():
+            return queryset
+        return buscar_difuntos(queryset, termino)
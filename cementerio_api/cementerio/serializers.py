@@ -1,6 +1,11 @@
+import json
+
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from django.contrib.auth.models import User
-from .models import Usuario, Parcela, Reserva, Pago, Difunto
+from django.core.exceptions import ValidationError as DjangoValidationError
+from .instrumentation import medir_serializacion
+from .models import Usuario, Parcela, Reserva, Pago, Difunto, Job
 
 
 class AuthUserSerializer(serializers.ModelSerializer):
@@ -29,39 +34,132 @@ class AuthUserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class UsuarioSerializer(serializers.ModelSerializer):
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Igual que PrimaryKeyRelatedField, pero si el contexto trae
+    "related_cache" ({Modelo: {pk: instancia}}) resuelve la clave sin
+    consultar la base de datos. Lo usan los endpoints bulk.
+    """
+
+    def to_internal_value(self, data):
+        cache = self.context.get("related_cache", {}).get(self.get_queryset().model)
+        if cache is not None:
+            try:
+                return cache[self.get_queryset().model._meta.pk.to_python(data)]
+            except KeyError:
+                self.fail("does_not_exist", pk_value=data)
+            except (TypeError, ValueError, DjangoValidationError):
+                self.fail("incorrect_type", data_type=type(data).__name__)
+        return super().to_internal_value(data)
+
+
+class DomainSerializer(serializers.ModelSerializer):
+    """
+    Base de los serializadores del dominio.
+
+    Acepta `fields` (lista de campos a devolver) y `expand` (relaciones a
+    anidar como objeto completo en lugar de su clave). Las relaciones
+    expandibles se declaran en `expandable_fields` como
+    {nombre: (nombre del serializador, opciones)}; el nombre se resuelve al
+    usarlo porque los serializadores se referencian entre sí.
+    """
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            serializer_name, options = self.expandable_fields[name]
+            self.fields[name] = globals()[serializer_name](read_only=True, **options)
+        if fields is not None:
+            for name in set(self.fields) - set(fields) - set(expand):
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        with medir_serializacion():
+            return super().to_representation(instance)
+
+
+class UsuarioSerializer(DomainSerializer):
+    expandable_fields = {"reservas": ("ReservaSerializer", {"many": True})}
+
     class Meta:
         model = Usuario
-        fields = "__all__"
+        # La cuenta de acceso (user) solo la vincula el servidor (signals.py):
+        # ni se muestra ni se puede cambiar desde la API
+        exclude = ["user"]
 
 
-class ParcelaSerializer(serializers.ModelSerializer):
+class ParcelaSerializer(DomainSerializer):
+    expandable_fields = {"difuntos": ("DifuntoSerializer", {"many": True})}
+
     class Meta:
         model = Parcela
         fields = "__all__"
 
 
-class ReservaSerializer(serializers.ModelSerializer):
+class ReservaSerializer(DomainSerializer):
     usuario_nombre = serializers.ReadOnlyField(source="usuario.nombre")
     usuario_apellido = serializers.ReadOnlyField(source="usuario.apellido")
     parcela_ubicacion = serializers.ReadOnlyField(source="parcela.ubicacion")
+    expandable_fields = {
+        "usuario": ("UsuarioSerializer", {}),
+        "parcela": ("ParcelaSerializer", {}),
+        "pagos": ("PagoSerializer", {"many": True}),
+    }
 
     class Meta:
         model = Reserva
         fields = "__all__"
 
 
-class PagoSerializer(serializers.ModelSerializer):
+class PagoSerializer(DomainSerializer):
     reserva_id_reserva = serializers.ReadOnlyField(source="reserva.id_reserva")
+    expandable_fields = {"reserva": ("ReservaSerializer", {})}
 
     class Meta:
         model = Pago
         fields = "__all__"
 
 
-class DifuntoSerializer(serializers.ModelSerializer):
+class DifuntoSerializer(DomainSerializer):
     parcela_ubicacion = serializers.ReadOnlyField(source="parcela.ubicacion")
+    expandable_fields = {"parcela": ("ParcelaSerializer", {})}
 
     class Meta:
         model = Difunto
-        fields = "__all__"
+        exclude = ["texto_busqueda"]
+
+
+class JobSerializer(serializers.ModelSerializer):
+    resultado_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            "id", "tipo", "parametros", "estado", "progreso", "mensaje", "resultado", "resultado_url", "error",
+            "intentos", "max_intentos", "ejecutar_desde", "created_at", "iniciado_en", "terminado_en",
+        ]
+        read_only_fields = fields
+
+    def get_resultado_url(self, obj):
+        if obj.estado != "COMPLETADO" or not obj.archivo:
+            return None
+        return reverse("job-resultado", args=[obj.pk], request=self.context.get("request"))
+
+
+class JobCreateSerializer(serializers.Serializer):
+    tipo = serializers.CharField(max_length=50)
+    # En multipart (importaciones con fichero) llega como texto JSON
+    parametros = serializers.JSONField(required=False, default=dict)
+    entrada = serializers.FileField(required=False)
+
+    def validate_parametros(self, value):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise serializers.ValidationError("JSON no válido.")
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Debe ser un objeto.")
+        return value
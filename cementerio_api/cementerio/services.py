@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_model_on_commit
+from .exceptions import ParcelaNoDisponible
+from .models import Usuario, Parcela, Reserva
+from .rollups import mover_parcela
+
+
+def marcar_reservada(parcela_id):
+    """
+    DISPONIBLE -> RESERVADA con un UPDATE condicional de una sola sentencia.
+    Entre varias peticiones concurrentes sobre la misma parcela solo una
+    actualiza la fila; las demás ven 0 filas y reciben 409. No bloquea la
+    tabla ni las otras parcelas.
+    """
+    with transaction.atomic():
+        actualizadas = Parcela.objects.filter(pk=parcela_id, estado="DISPONIBLE").update(
+            estado="RESERVADA", updated_at=timezone.now()
+        )
+        if not actualizadas:
+            raise ParcelaNoDisponible()
+        mover_parcela(parcela_id, "DISPONIBLE", "RESERVADA")
+    invalidate_model_on_commit(Parcela)
+
+
+def liberar_parcela(parcela_id):
+    """RESERVADA -> DISPONIBLE cuando la reserva se cancela o se borra."""
+    with transaction.atomic():
+        actualizadas = Parcela.objects.filter(pk=parcela_id, estado="RESERVADA").update(
+            estado="DISPONIBLE", updated_at=timezone.now()
+        )
+        if actualizadas:
+            mover_parcela(parcela_id, "RESERVADA", "DISPONIBLE")
+    if actualizadas:
+        invalidate_model_on_commit(Parcela)
+    return actualizadas
+
+
+def reservar_parcela(usuario, parcela, fecha_reserva, estado="PENDIENTE"):
+    """Reserva la parcela y crea la Reserva en la misma transacción."""
+    parcela_id = getattr(parcela, "pk", parcela)
+    with transaction.atomic():
+        if estado != "CANCELADA":
+            marcar_reservada(parcela_id)
+        return Reserva.objects.create(
+            usuario=usuario,
+            parcela_id=parcela_id,
+            fecha_reserva=fecha_reserva,
+            estado=estado,
+        )
+
+
+def sincronizar_parcela(reserva, estado_anterior, parcela_anterior):
+    """
+    Ajusta el estado de las parcelas tras editar una reserva: cancelarla
+    libera su parcela y reactivarla o moverla a otra parcela la reserva.
+    Debe llamarse dentro de la transacción que guarda la reserva.
+    """
+    activa_antes = estado_anterior != "CANCELADA"
+    activa_ahora = reserva.estado != "CANCELADA"
+    cambio_parcela = reserva.parcela_id != parcela_anterior
+    if activa_antes and (not activa_ahora or cambio_parcela):
+        liberar_parcela(parcela_anterior)
+    if activa_ahora and (not activa_antes or cambio_parcela):
+        marcar_reservada(reserva.parcela_id)
+
+
+def vincular_por_email(email):
+    """
+    Enlaza el Usuario del cementerio con la cuenta (User) del mismo email si
+    cada uno es el único con ese email y ninguno está enlazado. Devuelve el
+    id de la cuenta enlazada o None.
+    """
+    if not email:
+        return None
+    cuentas = list(get_user_model().objects.filter(email__iexact=email).values_list("pk", flat=True)[:2])
+    usuarios = list(Usuario.objects.filter(email__iexact=email, user__isnull=True).values_list("pk", flat=True)[:2])
+    if len(cuentas) != 1 or len(usuarios) != 1 or Usuario.objects.filter(user_id=cuentas[0]).exists():
+        return None
+    Usuario.objects.filter(pk=usuarios[0], user__isnull=True).update(user_id=cuentas[0], updated_at=timezone.now())
+    invalidate_model_on_commit(Usuario)
+    return cuentas[0]
@@ -0,0 +1,101 @@
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .cache import invalidate_model_on_commit
+from .models import Usuario, Parcela, Reserva, Pago, Difunto
+from .rollups import CAMPOS_PAGO, CAMPOS_PARCELA, anteriores, datos, datos_reserva, registrar_cambio
+from .search import instalar_fts_sqlite
+from .services import vincular_por_email
+from .sync import registrar_borrado
+
+
+TRACKED_MODELS = (Usuario, Parcela, Reserva, Pago, Difunto)
+
+
+def invalidar_caches(sender, using="default", **kwargs):
+    invalidate_model_on_commit(sender, using=using)
+
+
+def guardar_lapida(sender, instance, using="default", **kwargs):
+    # En la transacción del borrado (la del Collector)
+    registrar_borrado(sender, instance.pk, using)
+
+
+for model in TRACKED_MODELS:
+    post_save.connect(invalidar_caches, sender=model, dispatch_uid=f"invalidar_{model.__name__}_save")
+    post_delete.connect(invalidar_caches, sender=model, dispatch_uid=f"invalidar_{model.__name__}_delete")
+    post_delete.connect(guardar_lapida, sender=model, dispatch_uid=f"lapida_{model.__name__}_delete")
+
+
+# Rollups de reportes: save() de estos modelos corre en una transacción
+# (AtomicSaveModel) y los borrados en la del Collector, así que los deltas
+# se escriben en la misma transacción que el cambio.
+
+def fila_rollup(instance):
+    if isinstance(instance, Reserva):
+        return datos_reserva(instance)
+    return datos(instance, CAMPOS_PAGO if isinstance(instance, Pago) else CAMPOS_PARCELA)
+
+
+def rollup_anterior(sender, instance, raw=False, using="default", **kwargs):
+    instance._rollup_anterior = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        instance._rollup_anterior = anteriores(sender, [instance.pk]).get(instance.pk)
+
+
+def rollup_guardado(sender, instance, raw=False, using="default", **kwargs):
+    if not raw:
+        registrar_cambio(sender, getattr(instance, "_rollup_anterior", None), fila_rollup(instance), using)
+
+
+def rollup_antes_de_borrar(sender, instance, **kwargs):
+    # La instancia puede estar desactualizada (p. ej. el estado que cambió un
+    # UPDATE condicional): se resta lo que hay guardado
+    instance._rollup_anterior = anteriores(sender, [instance.pk]).get(instance.pk)
+
+
+def rollup_borrado(sender, instance, using="default", **kwargs):
+    anterior = getattr(instance, "_rollup_anterior", None) or fila_rollup(instance)
+    registrar_cambio(sender, anterior, None, using)
+
+
+for model in (Pago, Reserva, Parcela):
+    pre_save.connect(rollup_anterior, sender=model, dispatch_uid=f"rollup_{model.__name__}_pre_save")
+    post_save.connect(rollup_guardado, sender=model, dispatch_uid=f"rollup_{model.__name__}_save")
+    pre_delete.connect(rollup_antes_de_borrar, sender=model, dispatch_uid=f"rollup_{model.__name__}_pre_delete")
+    post_delete.connect(rollup_borrado, sender=model, dispatch_uid=f"rollup_{model.__name__}_delete")
+
+
+def invalidar_token_usuario(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
+
+
+def invalidar_token(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.user_id)
+
+
+def vincular_cuenta(sender, instance, created=False, raw=False, **kwargs):
+    """Una cuenta o un Usuario nuevos se enlazan con su pareja del mismo email."""
+    if created and not raw:
+        user_id = vincular_por_email(instance.email)
+        if user_id is not None and sender is Usuario:
+            instance.user_id = user_id
+
+
+post_save.connect(vincular_cuenta, sender=User, dispatch_uid="vincular_cuenta_user")
+post_save.connect(vincular_cuenta, sender=Usuario, dispatch_uid="vincular_cuenta_usuario")
+post_save.connect(invalidar_token_usuario, sender=User, dispatch_uid="invalidar_token_usuario_save")
+post_delete.connect(invalidar_token_usuario, sender=User, dispatch_uid="invalidar_token_usuario_delete")
+post_delete.connect(invalidar_token, sender=Token, dispatch_uid="invalidar_token_delete")
+
+
+def instalar_indice_busqueda(sender, using="default", **kwargs):
+    instalar_fts_sqlite(connections[using])
+
+
+post_migrate.connect(instalar_indice_busqueda, sender=apps.get_app_config("cementerio"), dispatch_uid="instalar_indice_busqueda")
@@ -0,0 +1,74 @@
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+
+
+@lru_cache(maxsize=None)
+def campos_disponibles(serializer_class):
+    return frozenset(serializer_class().fields) | frozenset(getattr(serializer_class, "expandable_fields", {}))
+
+
+class SparseFieldsetMixin:
+    """
+    Lecturas con ?fields=a,b,c y ?expand=x,y.
+
+    `fields` recorta la salida y, en el camino rápido (rows.py), también las
+    columnas del SELECT. `expand` anida las relaciones declaradas en
+    `expandable_fields` del serializador: las claves foráneas con
+    select_related (un JOIN) y las inversas con prefetch_related. Las
+    escrituras ignoran ambos parámetros.
+    """
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+
+    def _lista_param(self, nombre):
+        valor = self.request.query_params.get(nombre, "")
+        return list(dict.fromkeys(v.strip() for v in valor.split(",") if v.strip()))
+
+    def get_serializer_options(self):
+        if self.request is None or self.request.method not in ("GET", "HEAD"):
+            return {}
+        if not hasattr(self, "_serializer_options"):
+            self._serializer_options = self._leer_opciones()
+        return self._serializer_options
+
+    def _leer_opciones(self):
+        serializer_class = self.get_serializer_class()
+        expandibles = getattr(serializer_class, "expandable_fields", {})
+        opciones = {}
+
+        expand = self._lista_param(self.expand_query_param)
+        invalidos = [nombre for nombre in expand if nombre not in expandibles]
+        if invalidos:
+            raise ValidationError({self.expand_query_param: [
+                f"No se puede expandir: {', '.join(invalidos)}. "
+                f"Opciones: {', '.join(expandibles) or 'ninguna'}."
+            ]})
+        if expand:
+            opciones["expand"] = tuple(sorted(expand))
+
+        fields = self._lista_param(self.fields_query_param)
+        invalidos = [nombre for nombre in fields if nombre not in campos_disponibles(serializer_class)]
+        if invalidos:
+            raise ValidationError({self.fields_query_param: [f"Campos desconocidos: {', '.join(invalidos)}."]})
+        if fields:
+            opciones["fields"] = tuple(sorted(fields))
+        return opciones
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, **{**self.get_serializer_options(), **kwargs})
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        model = queryset.model
+        for nombre in self.get_serializer_options().get("expand", ()):
+            relacion = model._meta.get_field(nombre)
+            if relacion.concrete:
+                queryset = queryset.select_related(nombre)
+            else:
+                relacionado = relacion.related_model
+                queryset = queryset.prefetch_related(
+                    Prefetch(nombre, queryset=relacionado._default_manager.order_by(relacionado._meta.pk.name))
+                )
+        return queryset
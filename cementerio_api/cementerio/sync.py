@@ -0,0 +1,162 @@
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .db_router import leer_de
+from .models import Borrado
+
+
+WATERMARK_HEADER = "X-Sync-Watermark"
+
+
+def get_watermark_lag():
+    return getattr(settings, "SYNC_WATERMARK_LAG", 5)
+
+
+def get_max_changes():
+    return getattr(settings, "SYNC_MAX_CHANGES", 5000)
+
+
+def get_tombstone_days():
+    return getattr(settings, "SYNC_TOMBSTONE_DAYS", 30)
+
+
+def marca_de_agua():
+    """
+    Instante desde el que el cliente debe pedir la próxima vez. Va
+    SYNC_WATERMARK_LAG segundos por detrás del reloj: una transacción que
+    puso updated_at justo antes y aún no había confirmado se vuelve a
+    enviar en la siguiente sincronización en lugar de perderse. Solo si
+    confirma antes de ese margen: las escrituras masivas usan Sello.
+    """
+    return timezone.now() - timedelta(seconds=get_watermark_lag())
+
+
+class EscrituraDemasiadoLarga(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "La escritura tardó demasiado y se ha deshecho. Inténtelo con menos filas."
+    default_code = "escritura_demasiado_larga"
+
+
+class Sello:
+    """
+    updated_at de una escritura masiva (UPDATE, bulk_create, COPY) o del
+    borrado de muchas filas (deleted_at de las lápidas), tomado
+    con el reloj de la aplicación como marca_de_agua(). Se crea dentro de
+    la transacción justo antes de escribir y comprobar() se llama al final,
+    antes de confirmar: si entre ambos pasó más de SYNC_WATERMARK_LAG lanza
+    EscrituraDemasiadoLarga y la transacción se deshace, porque sus filas
+    quedarían por detrás de una marca ya entregada y ningún cliente las
+    recibiría. save() y los UPDATE de una fila no lo necesitan.
+    """
+
+    def __init__(self):
+        self.instante = timezone.now()
+        self._inicio = time.monotonic()
+
+    def comprobar(self):
+        lag = get_watermark_lag()
+        duracion = time.monotonic() - self._inicio
+        # Con SYNC_WATERMARK_LAG = 0 no hay margen que respetar
+        if lag and duracion > lag:
+            raise EscrituraDemasiadoLarga(
+                f"La escritura tardó {duracion:.1f}s en confirmarse desde que puso updated_at; "
+                f"el máximo es SYNC_WATERMARK_LAG ({lag}s)."
+            )
+
+
+def formatear(instante):
+    # UTC con "Z": sin "+" que el cliente tenga que escapar en la URL
+    return instante.astimezone(dt_timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def registrar_borrado(model, pk, using="default"):
+    Borrado.objects.using(using).create(modelo=model._meta.label_lower, objeto_id=pk)
+
+
+class ResincronizacionNecesaria(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Los cambios pedidos ya no están disponibles. Descargue el listado completo."
+    default_code = "resincronizacion_necesaria"
+
+
+class SyncMixin:
+    """
+    Sincronización por deltas en el listado: ?updated_since=<instante>.
+
+        GET /api/parcelas/?updated_since=2024-05-01T12:00:00.000000Z
+        {"watermark": "...", "results": [...], "deleted": [3, 17]}
+
+    `results` son las filas creadas o modificadas desde ese instante (con
+    ?fields=/?expand= como el listado; sin los demás filtros ni paginación)
+    y `deleted` los ids borrados, sacados de las lápidas (Borrado). El
+    cliente guarda `watermark` y lo envía en la siguiente petición; puede
+    recibir de nuevo alguna fila ya vista, nunca perderla. Todos los
+    listados llevan la cabecera X-Sync-Watermark para empezar tras una
+    descarga completa. Con más de SYNC_MAX_CHANGES cambios, o un instante
+    anterior a las lápidas conservadas, responde 410 y el cliente vuelve a
+    descargar el listado.
+    """
+    sync_query_param = "updated_since"
+
+    def list(self, request, *args, **kwargs):
+        valor = request.query_params.get(self.sync_query_param)
+        if valor is None:
+            # La cabecera la pone snapshot_headers() al leer; una respuesta de
+            # la cache lleva la marca de cuando se leyó y un 304 ninguna
+            return super().list(request, *args, **kwargs)
+        # Antes de leer: lo que cambie mientras tanto entra en el próximo delta
+        marca = marca_de_agua()
+        # De la primaria: una réplica con retraso no tendría lo último
+        with leer_de(None):
+            response = Response(self.cambios_desde(self.parse_instante(valor), marca))
+        response[WATERMARK_HEADER] = formatear(marca)
+        return response
+
+    def snapshot_headers(self):
+        headers = super().snapshot_headers()
+        if self.action == "list":
+            # Antes de leer: lo que cambie mientras tanto entra en el próximo delta
+            headers[WATERMARK_HEADER] = formatear(marca_de_agua())
+        return headers
+
+    def parse_instante(self, valor):
+        # Un "+" sin escapar en la query string llega como espacio
+        try:
+            instante = parse_datetime(valor.strip().replace(" ", "+"))
+        except ValueError:
+            instante = None
+        if instante is None:
+            raise ValidationError({self.sync_query_param: "Use un instante ISO 8601, p. ej. el watermark de la última respuesta."})
+        if timezone.is_naive(instante):
+            instante = timezone.make_aware(instante)
+        if instante < timezone.now() - timedelta(days=get_tombstone_days()):
+            raise ResincronizacionNecesaria()
+        return instante
+
+    def cambios_desde(self, desde, marca):
+        model = self.get_queryset().model
+        pk = model._meta.pk.name
+        limite = get_max_changes()
+        queryset = self.get_queryset().filter(updated_at__gte=desde).order_by("updated_at", pk)
+
+        rows = self.get_row_serializer()
+        if rows is None:
+            filas = list(queryset[:limite + 1])
+        else:
+            filas = list(rows.values(queryset)[:limite + 1])
+        if len(filas) > limite:
+            raise ResincronizacionNecesaria()
+        results = self.get_serializer(filas, many=True).data if rows is None else rows.serialize(filas)
+
+        borrados = (
+            Borrado.objects.filter(modelo=model._meta.label_lower, deleted_at__gte=desde)
+            .order_by("deleted_at").values_list("objeto_id", flat=True)
+        )
+        return {"watermark": formatear(marca), "results": results, "deleted": list(dict.fromkeys(borrados))}
@@ -0,0 +1,165 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+
+from .cache import invalidate_model
+from .models import Usuario, Parcela, Reserva, Pago, Difunto
+from .rollups import reconstruir
+
+
+NOMBRES = [
+    "Ana", "Luis", "María", "José", "Carmen", "Jorge", "Rosa", "Pedro", "Lucía", "Andrés",
+    "Elena", "Diego", "Sofía", "Carlos", "Isabel", "Miguel", "Patricia", "Fernando", "Teresa", "Raúl",
+]
+APELLIDOS = [
+    "López", "Gómez", "Pérez", "Rodríguez", "Sánchez", "Ramírez", "Torres", "Flores", "Vera", "Castillo",
+    "Mendoza", "Zambrano", "Moreira", "Ortiz", "Cedeño", "Vargas", "Herrera", "Chávez", "Salazar", "Andrade",
+]
+TAMANIOS = [("1x2", Decimal("800.00")), ("2x2", Decimal("1500.00")), ("2x3", Decimal("2200.00")), ("3x3", Decimal("3500.00"))]
+METODOS = ["EFECTIVO", "TARJETA", "TRANSFERENCIA"]
+
+# Reparto de estados de las parcelas
+ESTADOS_PARCELA = [("DISPONIBLE", 45), ("RESERVADA", 20), ("OCUPADA", 35)]
+
+INICIO = date(2015, 1, 1)
+DIAS = 365 * 10
+
+
+class Generador:
+    """
+    Cementerio sintético coherente: cada parcela RESERVADA tiene una
+    reserva activa (PENDIENTE o CONFIRMADA), cada OCUPADA una CONFIRMADA y
+    sus difuntos, y las reservas CANCELADAS quedan en parcelas libres o con
+    una reserva posterior. Los pagos siguen el estado de su reserva. Con la
+    misma semilla y las tablas vacías los datos son siempre los mismos.
+    """
+
+    def __init__(self, semilla=1):
+        self.rng = random.Random(semilla)
+
+    def fecha(self, desde=INICIO, dias=DIAS):
+        return desde + timedelta(days=self.rng.randrange(max(dias, 1)))
+
+    def persona(self):
+        return self.rng.choice(NOMBRES), self.rng.choice(APELLIDOS)
+
+    def usuarios(self, n, base):
+        for i in range(n):
+            nombre, apellido = self.persona()
+            yield Usuario(
+                nombre=nombre,
+                apellido=apellido,
+                email=f"sintetico{base + i}@example.com",
+                telefono=f"09{self.rng.randrange(10**8):08d}",
+                tipo_usuario="CLIENTE",
+            )
+
+    def parcela(self, numero):
+        tamanio, precio = self.rng.choice(TAMANIOS)
+        sector = numero // 500
+        parcela = Parcela(
+            ubicacion=f"Sector {sector + 1} - Fila {numero // 25 % 20 + 1} - Número {numero % 25 + 1}",
+            tamanio=tamanio,
+            precio=precio + self.rng.randrange(0, 400, 50),
+            estado=self.rng.choices([e for e, _ in ESTADOS_PARCELA], [p for _, p in ESTADOS_PARCELA])[0],
+        )
+        parcela.actualizar_sector()
+        return parcela
+
+    def reservas(self, parcela, usuarios):
+        """Reservas de la parcela, en orden de fecha; la última es la activa si la hay."""
+        reservas = []
+        fecha = self.fecha(dias=DIAS - 400)
+        if self.rng.random() < (0.15 if parcela.estado == "DISPONIBLE" else 0.1):
+            reservas.append(("CANCELADA", fecha))
+            fecha += timedelta(days=self.rng.randrange(30, 200))
+        if parcela.estado == "RESERVADA":
+            reservas.append((self.rng.choice(["PENDIENTE", "CONFIRMADA"]), fecha))
+        elif parcela.estado == "OCUPADA":
+            reservas.append(("CONFIRMADA", fecha))
+        return [
+            Reserva(usuario_id=self.rng.choice(usuarios), parcela_id=parcela.pk, fecha_reserva=fecha, estado=estado)
+            for estado, fecha in reservas
+        ]
+
+    def pagos(self, reserva, precio):
+        if reserva.estado == "CONFIRMADA":
+            cuotas, estado = self.rng.randint(1, 4), "PAGADO"
+        elif reserva.estado == "PENDIENTE":
+            cuotas, estado = self.rng.randint(0, 1), "PENDIENTE"
+        else:
+            cuotas, estado = self.rng.randint(0, 1), "ANULADO"
+        monto = (precio / max(cuotas, 1)).quantize(Decimal("0.01"))
+        fecha = reserva.fecha_reserva
+        for _ in range(cuotas):
+            yield Pago(
+                reserva_id=reserva.pk, monto=monto, fecha_pago=fecha,
+                metodo_pago=self.rng.choice(METODOS), estado_pago=estado,
+            )
+            fecha += timedelta(days=self.rng.randrange(15, 60))
+
+    def difuntos(self, parcela, desde):
+        for _ in range(self.rng.choices([1, 2, 3], [70, 25, 5])[0]):
+            nombre, apellido = self.persona()
+            fallecimiento = self.fecha(desde, (INICIO + timedelta(days=DIAS) - desde).days)
+            difunto = Difunto(
+                nombre=nombre,
+                apellido=apellido,
+                fecha_nacimiento=fallecimiento - timedelta(days=self.rng.randrange(365 * 20, 365 * 95)),
+                fecha_fallecimiento=fallecimiento,
+                parcela_id=parcela.pk,
+            )
+            difunto.actualizar_texto_busqueda()
+            yield difunto
+
+
+def sembrar(parcelas, usuarios=None, semilla=1, lote=5000, progreso=None):
+    """
+    Inserta `parcelas` parcelas (y `usuarios`, por defecto una quinta parte)
+    con sus reservas, pagos y difuntos. Cada lote de parcelas se escribe con
+    bulk_create en su propia transacción, así la memoria no crece con la
+    escala. Al final reconstruye los rollups e invalida las caches.
+    Devuelve las filas creadas por modelo.
+    """
+    generador = Generador(semilla)
+    usuarios = usuarios or max(parcelas // 5, 1)
+    creadas = dict.fromkeys(["usuarios", "parcelas", "reservas", "pagos", "difuntos"], 0)
+
+    base = Usuario.objects.count()
+    ids_usuarios = []
+    for inicio in range(0, usuarios, lote):
+        with transaction.atomic():
+            nuevos = Usuario.objects.bulk_create(generador.usuarios(min(lote, usuarios - inicio), base + inicio))
+        ids_usuarios += [usuario.pk for usuario in nuevos]
+    creadas["usuarios"] = len(ids_usuarios)
+
+    numero = Parcela.objects.count()
+    for inicio in range(0, parcelas, lote):
+        with transaction.atomic():
+            bloque = Parcela.objects.bulk_create(generador.parcela(numero + i) for i in range(inicio, min(inicio + lote, parcelas)))
+            reservas = Reserva.objects.bulk_create(
+                [reserva for parcela in bloque for reserva in generador.reservas(parcela, ids_usuarios)], batch_size=lote,
+            )
+            precios = {parcela.pk: parcela.precio for parcela in bloque}
+            pagos = Pago.objects.bulk_create(
+                [pago for reserva in reservas for pago in generador.pagos(reserva, precios[reserva.parcela_id])], batch_size=lote,
+            )
+            ocupadas = {reserva.parcela_id: reserva.fecha_reserva for reserva in reservas if reserva.estado == "CONFIRMADA"}
+            difuntos = Difunto.objects.bulk_create(
+                [d for parcela in bloque if parcela.estado == "OCUPADA" for d in generador.difuntos(parcela, ocupadas[parcela.pk])],
+                batch_size=lote,
+            )
+        creadas["parcelas"] += len(bloque)
+        creadas["reservas"] += len(reservas)
+        creadas["pagos"] += len(pagos)
+        creadas["difuntos"] += len(difuntos)
+        if progreso:
+            progreso(creadas)
+
+    # bulk_create no pasa por las señales de rollups ni de cache
+    reconstruir()
+    for model in (Usuario, Parcela, Reserva, Pago, Difunto):
+        invalidate_model(model)
+    return creadas
@@ -0,0 +1,122 @@
+
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import TestCase
+from .models import Usuario, Parcela, Reserva, Pago, Difunto
+
+
+N_PARCELAS = 3000
+N_RESERVAS = 6000
+N_DIFUNTOS = 3000
+
+
+def sembrar_datos():
+	"""Volumen suficiente para que el planificador prefiera los índices."""
+	usuarios = Usuario.objects.bulk_create([
+		Usuario(nombre=f"Nombre{i}", apellido=f"Apellido{i}", email=f"u{i}@example.com")
+		for i in range(300)
+	])
+	estados = ["OCUPADA"] * 8 + ["RESERVADA", "DISPONIBLE"]
+	parcelas = Parcela.objects.bulk_create([
+		Parcela(ubicacion=f"Sector {i % 20}-{i}", tamanio="2x2", precio=1000 + i, estado=estados[i % 10])
+		for i in range(N_PARCELAS)
+	], batch_size=500)
+	inicio = date(2015, 1, 1)
+	reservas = Reserva.objects.bulk_create([
+		Reserva(
+			usuario=usuarios[i % len(usuarios)],
+			parcela=parcelas[i % len(parcelas)],
+			fecha_reserva=inicio + timedelta(days=i % 3650),
+			estado=["CONFIRMADA", "CONFIRMADA", "CANCELADA", "PENDIENTE"][i % 4],
+		)
+		for i in range(N_RESERVAS)
+	], batch_size=500)
+	Pago.objects.bulk_create([
+		Pago(
+			reserva=reserva,
+			monto=500,
+			fecha_pago=reserva.fecha_reserva,
+			metodo_pago=["EFECTIVO", "TARJETA", "TRANSFERENCIA"][i % 3],
+			estado_pago=["PAGADO", "PAGADO", "PAGADO", "PENDIENTE", "ANULADO"][i % 5],
+		)
+		for i, reserva in enumerate(reservas)
+	], batch_size=500)
+	Difunto.objects.bulk_create([
+		Difunto(
+			nombre=f"Nombre{i % 400}",
+			apellido=f"Apellido{i % 900}",
+			parcela=parcelas[i % len(parcelas)],
+			fecha_fallecimiento=inicio + timedelta(days=i),
+		)
+		for i in range(N_DIFUNTOS)
+	], batch_size=500)
+	with connection.cursor() as cursor:
+		cursor.execute("ANALYZE")
+
+
+class QueryPlanTest(TestCase):
+	"""
+	Las consultas de los listados deben resolverse con índices.
+	SQLite (ruta CI) usa EXPLAIN QUERY PLAN; PostgreSQL usa EXPLAIN.
+	"""
+
+	@classmethod
+	def setUpTestData(cls):
+		sembrar_datos()
+
+	def assertUsaIndice(self, queryset, tabla):
+		plan = queryset.explain()
+		if connection.vendor == "postgresql":
+			self.assertNotIn(f"Seq Scan on {tabla}", plan, plan)
+			self.assertIn("Index", plan, plan)
+		elif connection.vendor == "sqlite":
+			lineas = [linea for linea in plan.splitlines() if tabla in linea]
+			self.assertTrue(lineas, plan)
+			for linea in lineas:
+				self.assertIn("INDEX", linea, plan)
+			self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan, plan)
+		else:
+			self.skipTest(f"Sin verificación de planes para {connection.vendor}")
+
+	def test_reservas_por_fecha(self):
+		qs = Reserva.objects.order_by("-fecha_reserva", "-id_reserva")[:10]
+		self.assertUsaIndice(qs, "cementerio_reserva")
+
+	def test_reservas_por_estado(self):
+		qs = Reserva.objects.filter(estado="PENDIENTE").order_by("-fecha_reserva", "-id_reserva")[:10]
+		self.assertUsaIndice(qs, "cementerio_reserva")
+
+	def test_pagos_por_fecha(self):
+		qs = Pago.objects.order_by("-fecha_pago", "-id_pago")[:10]
+		self.assertUsaIndice(qs, "cementerio_pago")
+
+	def test_pagos_por_estado(self):
+		qs = Pago.objects.filter(estado_pago="PENDIENTE").order_by("-fecha_pago", "-id_pago")[:10]
+		self.assertUsaIndice(qs, "cementerio_pago")
+
+	def test_difuntos_por_apellido_y_nombre(self):
+		qs = Difunto.objects.order_by("apellido", "nombre")[:10]
+		self.assertUsaIndice(qs, "cementerio_difunto")
+
+	def test_parcelas_disponibles(self):
+		qs = Parcela.objects.filter(estado="DISPONIBLE").order_by("id_parcela")[:10]
+		self.assertUsaIndice(qs, "cementerio_parcela")
+
+	def test_parcelas_por_estado(self):
+		qs = Parcela.objects.filter(estado="OCUPADA")
+		self.assertUsaIndice(qs, "cementerio_parcela")
+
+	def test_parcelas_por_rango_de_precio(self):
+		qs = Parcela.objects.filter(precio__gte=1100, precio__lte=1200)
+		self.assertUsaIndice(qs, "cementerio_parcela")
+
+	def test_pagos_por_metodo_y_fechas(self):
+		qs = Pago.objects.filter(
+			metodo_pago="TARJETA", fecha_pago__range=(date(2016, 1, 1), date(2016, 3, 31)),
+		).order_by("-fecha_pago", "-id_pago")[:10]
+		self.assertUsaIndice(qs, "cementerio_pago")
+
+	def test_reservas_por_parcela(self):
+		qs = Reserva.objects.filter(parcela_id__in=[1, 2, 3])
+		self.assertUsaIndice(qs, "cementerio_reserva")
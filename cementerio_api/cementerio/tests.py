@@ -1,7 +1,60 @@
 
-from django.test import TestCase
-from .models import Usuario, Parcela, Reserva, Pago, Difunto
-from datetime import date
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature, tag
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from .authentication import token_cache
+from .backends.pool import ConnectionPool, PoolTimeout
+from .db_router import PrimaryReplicaRouter, leer_de
+from .exceptions import ParcelaNoDisponible
+from .expiry import expirar_reservas
+from .jobs import TAREAS, ErrorDefinitivo, encolar, reclamar, recuperar_abandonados
+from . import metrics
+from .metrics import MmapValues, _clave
+from .models import (
+	Usuario, Parcela, Reserva, Pago, Difunto, Borrado, Job,
+	IngresoDiario, IngresoMensual, ReservaMensual, OcupacionSector,
+)
+from .rollups import reconstruir
+from .rows import get_row_serializer
+from .search import buscar_difuntos
+from .serializers import UsuarioSerializer, ParcelaSerializer, ReservaSerializer, PagoSerializer, DifuntoSerializer
+from .services import reservar_parcela
+from .throttling import TokenBuckets
+from .middleware import brotli
+from .renderers import FastJSONRenderer, msgpack
+from .views import PagoViewSet, ReservaViewSet
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
+import asyncio
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import zlib
+from unittest import mock
 
 class UsuarioModelTest(TestCase):
 	def test_crear_usuario(self):
@@ -41,3 +94,1783 @@ class DifuntoModelTest(TestCase):
 		parcela = Parcela.objects.create(ubicacion="D1", tamanio="1x1", precio=300.00)
 		difunto = Difunto.objects.create(nombre="Pedro", apellido="Ramírez", parcela=parcela, fecha_fallecimiento=date.today())
 		self.assertEqual(str(difunto), "Pedro Ramírez")
+
+class StatsViewTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.client = APIClient()
+		admin = User.objects.create_user(username="admin", password="1234", is_staff=True)
+		self.client.force_authenticate(admin)
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		for i in range(12):
+			Parcela.objects.create(ubicacion=f"A{i}", tamanio="2x2", precio=100, estado="OCUPADA" if i < 4 else "DISPONIBLE")
+		parcela = Parcela.objects.first()
+		reserva = Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date.today(), estado="CONFIRMADA")
+		Pago.objects.create(reserva=reserva, monto=100, fecha_pago=date.today(), metodo_pago="EFECTIVO", estado_pago="PAGADO")
+		Pago.objects.create(reserva=reserva, monto=50, fecha_pago=date.today(), metodo_pago="TARJETA")
+
+	def test_estadisticas_no_limitadas_por_paginacion(self):
+		data = self.client.get("/api/stats/").json()
+		self.assertEqual(data["usuarios"], 1)
+		self.assertEqual(data["parcelas"]["total"], 12)
+		self.assertEqual(data["parcelas"]["disponibles"], 8)
+		self.assertEqual(data["parcelas"]["ocupadas"], 4)
+		self.assertEqual(data["reservas"]["confirmadas"], 1)
+		self.assertEqual(data["pagos"]["total"], 2)
+		self.assertEqual(data["pagos"]["pagados"], 1)
+		self.assertEqual(data["pagos"]["monto_total"], 150)
+		self.assertEqual(data["pagos"]["monto_pagado"], 100)
+		self.assertEqual(data["pagos"]["monto_por_metodo"], {"EFECTIVO": 100, "TARJETA": 50})
+
+	def test_cache_e_invalidacion(self):
+		self.client.get("/api/stats/")
+		with self.assertNumQueries(0):
+			self.client.get("/api/stats/")
+		Difunto.objects.create(nombre="Pedro", apellido="Ramírez", parcela=Parcela.objects.first(), fecha_fallecimiento=date.today())
+		self.assertEqual(self.client.get("/api/stats/").json()["difuntos"], 1)
+
+	def test_requiere_admin(self):
+		self.assertEqual(APIClient().get("/api/stats/").status_code, 401)
+
+class KeysetPaginationTest(TestCase):
+	def setUp(self):
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		parcela = Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+		# Varias reservas comparten fecha para ejercitar el desempate por pk
+		for i in range(25):
+			Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1 + i // 3))
+		self.client = APIClient()
+
+	def test_recorre_todas_las_paginas_sin_repetir(self):
+		url = "/api/reservas/?pagination=cursor"
+		vistos = []
+		while url:
+			data = self.client.get(url).json()
+			self.assertNotIn("count", data)
+			vistos.extend(r["id_reserva"] for r in data["results"])
+			url = data["next"]
+		esperado = list(Reserva.objects.order_by("-fecha_reserva", "-id_reserva").values_list("id_reserva", flat=True))
+		self.assertEqual(vistos, esperado)
+
+	def test_pagina_anterior(self):
+		primera = self.client.get("/api/reservas/?pagination=cursor").json()
+		segunda = self.client.get(primera["next"]).json()
+		anterior = self.client.get(segunda["previous"]).json()
+		self.assertEqual(anterior["results"], primera["results"])
+
+	def test_cursor_invalido(self):
+		self.assertEqual(self.client.get("/api/pagos/?cursor=xyz").status_code, 404)
+
+	def test_paginacion_por_numero_por_defecto(self):
+		self.assertEqual(self.client.get("/api/reservas/").json()["count"], 25)
+
+class DifuntoSearchTest(TestCase):
+	def setUp(self):
+		parcela = Parcela.objects.create(ubicacion="Sector A", tamanio="2x2", precio=100)
+		for nombre, apellido in [
+			("José", "Ramírez"), ("María", "Núñez"), ("Pedro", "Gómez"), ("Juan", "Pérez"), ("Ana", "Ramos"),
+		]:
+			Difunto.objects.create(nombre=nombre, apellido=apellido, parcela=parcela, fecha_fallecimiento=date.today())
+		self.client = APIClient()
+
+	def buscar(self, termino):
+		data = self.client.get("/api/difuntos/", {"search": termino}).json()
+		return [f"{d['nombre']} {d['apellido']}" for d in data["results"]]
+
+	def test_sin_tildes(self):
+		self.assertEqual(self.buscar("nunez"), ["María Núñez"])
+
+	def test_con_error_de_tipeo(self):
+		self.assertEqual(self.buscar("Ramires")[0], "José Ramírez")
+
+	def test_nombre_y_apellido(self):
+		self.assertEqual(self.buscar("juan perez"), ["Juan Pérez"])
+
+	def test_indice_sigue_ediciones(self):
+		difunto = Difunto.objects.get(apellido="Gómez")
+		difunto.apellido = "Villacís"
+		difunto.save()
+		self.assertEqual(self.buscar("villacis"), ["Pedro Villacís"])
+		self.assertEqual(self.buscar("gomez"), [])
+		difunto.delete()
+		self.assertEqual(self.buscar("villacis"), [])
+
+	def test_no_expone_texto_busqueda(self):
+		data = self.client.get("/api/difuntos/").json()
+		self.assertNotIn("texto_busqueda", data["results"][0])
+
+class ResponseCacheTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+		self.client = APIClient()
+
+	def test_segunda_lectura_sin_consultas(self):
+		primera = self.client.get("/api/parcelas/")
+		with self.assertNumQueries(0):
+			segunda = self.client.get("/api/parcelas/")
+		self.assertEqual(primera.json(), segunda.json())
+		self.assertEqual(primera["ETag"], segunda["ETag"])
+
+	def test_if_none_match_devuelve_304(self):
+		etag = self.client.get("/api/parcelas/")["ETag"]
+		with self.assertNumQueries(0):
+			response = self.client.get("/api/parcelas/", HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+
+	def test_if_modified_since(self):
+		last_modified = self.client.get("/api/parcelas/")["Last-Modified"]
+		response = self.client.get("/api/parcelas/", HTTP_IF_MODIFIED_SINCE=last_modified)
+		self.assertEqual(response.status_code, 304)
+
+	def test_escritura_invalida(self):
+		etag = self.client.get("/api/parcelas/")["ETag"]
+		Parcela.objects.create(ubicacion="A2", tamanio="2x2", precio=100)
+		response = self.client.get("/api/parcelas/", HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()["count"], 2)
+
+	def test_invalida_dependencias(self):
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		Reserva.objects.create(usuario=usuario, parcela=Parcela.objects.first(), fecha_reserva=date.today())
+		self.client.get("/api/reservas/")
+		usuario.nombre = "Analía"
+		usuario.save()
+		data = self.client.get("/api/reservas/").json()
+		self.assertEqual(data["results"][0]["usuario_nombre"], "Analía")
+
+	def test_query_string_en_la_clave(self):
+		Parcela.objects.create(ubicacion="B1", tamanio="2x2", precio=100)
+		self.assertNotEqual(
+			self.client.get("/api/parcelas/?search=A1")["ETag"],
+			self.client.get("/api/parcelas/?search=B1")["ETag"],
+		)
+
+	def test_expand_invalida_relacionados(self):
+		def cambiar(instancia, **campos):
+			instancia = type(instancia).objects.get(pk=instancia.pk)
+			for campo, valor in campos.items():
+				setattr(instancia, campo, valor)
+			instancia.save()
+
+		parcela = Parcela.objects.first()
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		reserva = Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1))
+		Pago.objects.create(reserva=reserva, monto="50", fecha_pago=date(2024, 1, 2), metodo_pago="EFECTIVO")
+		Difunto.objects.create(nombre="José", apellido="Ramírez", parcela=parcela, fecha_fallecimiento=date(2020, 1, 1))
+		escrituras = {
+			"/api/usuarios/?expand=reservas": lambda: Reserva.objects.create(
+				usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 3, 1),
+			),
+			"/api/parcelas/?expand=difuntos": lambda: Difunto.objects.create(
+				nombre="Rosa", apellido="Díaz", parcela=parcela, fecha_fallecimiento=date(2021, 1, 1),
+			),
+			"/api/reservas/?expand=pagos": lambda: Pago.objects.create(
+				reserva=reserva, monto="25", fecha_pago=date(2024, 1, 3), metodo_pago="TARJETA",
+			),
+			"/api/reservas/?expand=usuario": lambda: cambiar(usuario, nombre="Analía"),
+			"/api/reservas/?expand=parcela": lambda: cambiar(parcela, tamanio="3x3"),
+			"/api/pagos/?expand=reserva": lambda: cambiar(reserva, fecha_reserva=date(2024, 2, 1)),
+			"/api/difuntos/?expand=parcela": lambda: cambiar(parcela, ubicacion="A2"),
+		}
+		for url, escribir in escrituras.items():
+			with self.subTest(url=url):
+				antes = self.client.get(url).json()
+				escribir()
+				despues = self.client.get(url).json()
+				cache.clear()
+				self.assertEqual(despues, self.client.get(url).json())
+				self.assertNotEqual(despues, antes)
+
+class CachedTokenAuthenticationTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		token_cache.clear()
+		self.user = User.objects.create_user(username="admin", password="1234", is_staff=True)
+		self.token = Token.objects.create(user=self.user)
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+	def test_sin_consultas_en_estado_estable(self):
+		self.client.get("/api/me/")
+		with self.assertNumQueries(0):
+			response = self.client.get("/api/me/")
+		self.assertEqual(response.json()["username"], "admin")
+
+	def test_token_borrado_invalida(self):
+		self.client.get("/api/me/")
+		self.token.delete()
+		self.assertEqual(self.client.get("/api/me/").status_code, 401)
+
+	def test_usuario_desactivado_invalida(self):
+		self.client.get("/api/me/")
+		self.user.is_active = False
+		self.user.save()
+		self.assertEqual(self.client.get("/api/me/").status_code, 401)
+
+	def test_cambios_por_me_view(self):
+		self.client.get("/api/me/")
+		self.client.patch("/api/me/", {"first_name": "Ana"}, format="json")
+		self.assertEqual(self.client.get("/api/me/").json()["first_name"], "Ana")
+
+	def test_token_expirado(self):
+		with self.settings(TOKEN_EXPIRATION_SECONDS=60):
+			Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(minutes=5))
+			self.assertEqual(self.client.get("/api/me/").status_code, 401)
+
+	def test_login_renueva_token_expirado(self):
+		with self.settings(TOKEN_EXPIRATION_SECONDS=60):
+			Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(minutes=5))
+			# El 401 deja la clave vieja en token_cache
+			self.assertEqual(self.client.get("/api/me/").status_code, 401)
+			login = APIClient().post("/api/auth/login/", {"username": "admin", "password": "1234"}, format="json")
+			self.assertEqual(login.status_code, 200)
+			self.assertNotEqual(login.json()["token"], self.token.key)
+			self.assertEqual(self.client.get("/api/me/").status_code, 401)
+			self.client.credentials(HTTP_AUTHORIZATION=f"Token {login.json()['token']}")
+			self.assertEqual(self.client.get("/api/me/").json()["username"], "admin")
+			# Mientras no expire, otro login devuelve el mismo
+			otro = APIClient().post("/api/auth/login/", {"username": "admin", "password": "1234"}, format="json")
+			self.assertEqual(otro.json()["token"], login.json()["token"])
+
+	def test_contadores(self):
+		antes = token_cache.stats()
+		self.client.get("/api/me/")
+		self.client.get("/api/me/")
+		stats = self.client.get("/api/auth/cache-stats/").json()
+		self.assertEqual(stats["misses"] - antes["misses"], 1)
+		self.assertEqual(stats["hits"] - antes["hits"], 2)
+
+class BulkEndpointsTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.client = APIClient()
+		self.client.force_authenticate(User.objects.create_user(username="admin", password="1234", is_staff=True))
+		self.parcela = Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+
+	def test_crear_parcelas(self):
+		filas = [{"ubicacion": f"Sector N-{i}", "tamanio": "2x2", "precio": "500.00"} for i in range(2500)]
+		with CaptureQueriesContext(connection) as consultas:
+			response = self.client.post("/api/parcelas/bulk/", filas, format="json")
+		self.assertEqual(response.status_code, 201)
+		# Unos pocos INSERT multi-fila, no uno por parcela
+		self.assertLess(len(consultas), 25)
+		self.assertEqual(response.json()["creados"], 2500)
+		self.assertEqual(Parcela.objects.count(), 2501)
+
+	def test_errores_por_fila_sin_escribir(self):
+		filas = [
+			{"ubicacion": "X1", "tamanio": "2x2", "precio": "100"},
+			{"ubicacion": "X2", "tamanio": "2x2", "precio": "-5"},
+		]
+		response = self.client.post("/api/parcelas/bulk/", filas, format="json")
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual([e["fila"] for e in response.json()["errores"]], [1])
+		self.assertEqual(Parcela.objects.count(), 1)
+
+	def test_crear_difuntos_resuelve_parcelas_en_lote(self):
+		otra = Parcela.objects.create(ubicacion="A2", tamanio="2x2", precio=100)
+		filas = [
+			{"nombre": "José", "apellido": "Ramírez", "parcela": self.parcela.pk, "fecha_fallecimiento": "2020-01-01"},
+			{"nombre": "Ana", "apellido": "Núñez", "parcela": otra.pk, "fecha_fallecimiento": "2021-01-01"},
+			{"nombre": "Sin", "apellido": "Parcela", "parcela": 9999, "fecha_fallecimiento": "2021-01-01"},
+		]
+		response = self.client.post("/api/difuntos/bulk/", filas, format="json")
+		self.assertEqual(response.json()["errores"][0]["fila"], 2)
+		response = self.client.post("/api/difuntos/bulk/", filas[:2], format="json")
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(Difunto.objects.get(apellido="Núñez").texto_busqueda, "ana nunez")
+
+	def test_actualizar_y_borrar(self):
+		ids = self.client.post("/api/parcelas/bulk/", [
+			{"ubicacion": f"B{i}", "tamanio": "2x2", "precio": "100"} for i in range(3)
+		], format="json").json()["ids"]
+		response = self.client.patch("/api/parcelas/bulk/", [
+			{"id_parcela": pk, "estado": "OCUPADA"} for pk in ids
+		] + [{"id_parcela": 9999, "estado": "OCUPADA"}], format="json")
+		self.assertEqual(response.json()["errores"][0]["fila"], 3)
+		response = self.client.patch("/api/parcelas/bulk/", [
+			{"id_parcela": pk, "estado": "OCUPADA"} for pk in ids
+		], format="json")
+		self.assertEqual(response.json()["actualizados"], 3)
+		self.assertEqual(Parcela.objects.filter(estado="OCUPADA").count(), 3)
+		response = self.client.delete("/api/parcelas/bulk/", {"ids": ids}, format="json")
+		self.assertEqual(response.json()["borrados"], 3)
+
+	@override_settings(SYNC_WATERMARK_LAG=1e-9)
+	def test_escritura_que_confirma_tarde_se_deshace(self):
+		response = self.client.post("/api/parcelas/bulk/", [{"ubicacion": "C1", "tamanio": "2x2", "precio": "100"}], format="json")
+		self.assertEqual(response.status_code, 503)
+		self.assertEqual(Parcela.objects.count(), 1)
+		response = self.client.delete("/api/parcelas/bulk/", {"ids": [self.parcela.pk]}, format="json")
+		self.assertEqual(response.status_code, 503)
+		self.assertTrue(Parcela.objects.filter(pk=self.parcela.pk).exists())
+
+	def test_invalida_cache(self):
+		self.assertEqual(self.client.get("/api/parcelas/").json()["count"], 1)
+		self.client.post("/api/parcelas/bulk/", [{"ubicacion": "C1", "tamanio": "2x2", "precio": "100"}], format="json")
+		self.assertEqual(self.client.get("/api/parcelas/").json()["count"], 2)
+
+	def test_requiere_admin(self):
+		response = APIClient().post("/api/parcelas/bulk/", [], format="json")
+		self.assertEqual(response.status_code, 401)
+
+class ReservaConcurrenciaTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.client = APIClient()
+		self.client.force_authenticate(User.objects.create_user(username="admin", password="1234", is_staff=True))
+		self.usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		self.parcela = Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+
+	def reservar(self, parcela):
+		return self.client.post("/api/reservas/", {
+			"usuario": self.usuario.pk, "parcela": parcela.pk, "fecha_reserva": "2024-01-01",
+		}, format="json")
+
+	def test_segunda_reserva_devuelve_409(self):
+		self.assertEqual(self.reservar(self.parcela).status_code, 201)
+		self.parcela.refresh_from_db()
+		self.assertEqual(self.parcela.estado, "RESERVADA")
+		response = self.reservar(self.parcela)
+		self.assertEqual(response.status_code, 409)
+		self.assertEqual(response.json()["status_code"], 409)
+		self.assertEqual(Reserva.objects.count(), 1)
+
+	def test_cancelar_libera_la_parcela(self):
+		pk = self.reservar(self.parcela).json()["id_reserva"]
+		self.client.patch(f"/api/reservas/{pk}/", {"estado": "CANCELADA"}, format="json")
+		self.parcela.refresh_from_db()
+		self.assertEqual(self.parcela.estado, "DISPONIBLE")
+		self.assertEqual(self.reservar(self.parcela).status_code, 201)
+
+	def test_mover_a_parcela_ocupada_no_cambia_nada(self):
+		otra = Parcela.objects.create(ubicacion="A2", tamanio="2x2", precio=100, estado="OCUPADA")
+		pk = self.reservar(self.parcela).json()["id_reserva"]
+		response = self.client.patch(f"/api/reservas/{pk}/", {"parcela": otra.pk}, format="json")
+		self.assertEqual(response.status_code, 409)
+		self.assertEqual(Reserva.objects.get(pk=pk).parcela_id, self.parcela.pk)
+		self.parcela.refresh_from_db()
+		self.assertEqual(self.parcela.estado, "RESERVADA")
+
+	def test_borrar_libera_la_parcela(self):
+		pk = self.reservar(self.parcela).json()["id_reserva"]
+		self.assertEqual(self.client.delete(f"/api/reservas/{pk}/").status_code, 204)
+		self.parcela.refresh_from_db()
+		self.assertEqual(self.parcela.estado, "DISPONIBLE")
+
+	def test_invalida_cache_de_parcelas(self):
+		self.assertEqual(self.client.get("/api/parcelas/").json()["results"][0]["estado"], "DISPONIBLE")
+		self.reservar(self.parcela)
+		self.assertEqual(self.client.get("/api/parcelas/").json()["results"][0]["estado"], "RESERVADA")
+
+@skipUnlessDBFeature("has_select_for_update")
+class ReservaCarreraTest(TransactionTestCase):
+	"""Peticiones simultáneas reales; SQLite serializa las escrituras y no aplica."""
+
+	def test_una_sola_reserva_gana(self):
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		parcela = Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+
+		def intento(_):
+			try:
+				reservar_parcela(usuario, parcela.pk, date(2024, 1, 1))
+				return True
+			except ParcelaNoDisponible:
+				return False
+			finally:
+				connections.close_all()
+
+		with ThreadPoolExecutor(max_workers=8) as pool:
+			resultados = list(pool.map(intento, range(16)))
+		self.assertEqual(resultados.count(True), 1)
+		self.assertEqual(Reserva.objects.filter(parcela=parcela).count(), 1)
+
+class RowSerializerTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		parcela = Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio="1234.5")
+		reserva = Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1))
+		Pago.objects.create(reserva=reserva, monto="99.9", fecha_pago=date(2024, 1, 2), metodo_pago="EFECTIVO")
+		Difunto.objects.create(nombre="José", apellido="Ramírez", parcela=parcela, fecha_fallecimiento=date(2020, 1, 1))
+		Difunto.objects.create(
+			nombre="Luis", apellido="Núñez", parcela=parcela, fecha_nacimiento=date(1950, 5, 5),
+			fecha_fallecimiento=date(2021, 1, 1), notas="Traslado",
+		)
+
+	def test_misma_salida_que_model_serializer(self):
+		for serializer_class in [UsuarioSerializer, ParcelaSerializer, ReservaSerializer, PagoSerializer, DifuntoSerializer]:
+			model = serializer_class.Meta.model
+			rows = get_row_serializer(serializer_class)
+			queryset = model.objects.order_by("pk")
+			esperado = json.loads(json.dumps(serializer_class(queryset, many=True).data))
+			obtenido = rows.serialize(rows.values(queryset))
+			self.assertEqual(obtenido, esperado, serializer_class.__name__)
+			self.assertEqual([list(f) for f in obtenido], [list(f) for f in esperado])
+
+	def test_listado_con_una_consulta_por_pagina(self):
+		with self.assertNumQueries(2):
+			response = APIClient().get("/api/reservas/")
+		fila = response.json()["results"][0]
+		self.assertEqual(fila["usuario_nombre"], "Ana")
+		self.assertEqual(fila["parcela_ubicacion"], "A1")
+
+	def test_detalle(self):
+		pago = Pago.objects.get()
+		response = APIClient().get(f"/api/pagos/{pago.pk}/")
+		self.assertEqual(response.json(), PagoSerializer(pago).data)
+		self.assertEqual(APIClient().get("/api/pagos/9999/").status_code, 404)
+		self.assertEqual(APIClient().get("/api/pagos/abc/").status_code, 404)
+
+	def test_serializador_no_compatible(self):
+		class ConMetodo(ParcelaSerializer):
+			etiqueta = serializers.SerializerMethodField()
+
+			def get_etiqueta(self, obj):
+				return str(obj)
+
+		self.assertIsNone(get_row_serializer(ConMetodo))
+
+class SparseFieldsetTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.client = APIClient()
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		self.parcela = Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+		self.reserva = Reserva.objects.create(usuario=usuario, parcela=self.parcela, fecha_reserva=date(2024, 1, 1))
+		Pago.objects.create(reserva=self.reserva, monto="50", fecha_pago=date(2024, 1, 2), metodo_pago="EFECTIVO")
+		Pago.objects.create(reserva=self.reserva, monto="25", fecha_pago=date(2024, 1, 3), metodo_pago="TARJETA")
+		Difunto.objects.create(
+			nombre="José", apellido="Ramírez", parcela=self.parcela, fecha_fallecimiento=date(2020, 1, 1), notas="x" * 5000,
+		)
+
+	def test_fields_recorta_salida_y_select(self):
+		with CaptureQueriesContext(connection) as consultas:
+			response = self.client.get("/api/difuntos/?fields=nombre,apellido")
+		self.assertEqual(response.json()["results"], [{"nombre": "José", "apellido": "Ramírez"}])
+		self.assertNotIn("notas", consultas.captured_queries[-1]["sql"])
+
+	def test_expand_misma_salida_que_model_serializer(self):
+		response = self.client.get("/api/reservas/?expand=usuario,parcela,pagos")
+		esperado = ReservaSerializer(
+			Reserva.objects.all(), many=True, expand=("pagos", "parcela", "usuario"),
+		).data
+		self.assertEqual(response.json()["results"], json.loads(json.dumps(esperado)))
+		self.assertEqual(response.json()["results"][0]["usuario"]["email"], "ana@example.com")
+		self.assertEqual([p["monto"] for p in response.json()["results"][0]["pagos"]], ["50.00", "25.00"])
+		cache.clear()
+		with mock.patch.object(ReservaViewSet, "fast_read", False):
+			lento = self.client.get("/api/reservas/?expand=usuario,parcela,pagos")
+		self.assertEqual(lento.json(), response.json())
+
+	def test_expand_sin_consultas_por_fila(self):
+		otro = Usuario.objects.create(nombre="Luis", apellido="Núñez", email="luis@example.com")
+		for i in range(5):
+			parcela = Parcela.objects.create(ubicacion=f"B{i}", tamanio="2x2", precio=100)
+			Reserva.objects.create(usuario=otro, parcela=parcela, fecha_reserva=date(2024, 2, 1))
+		# COUNT, página con JOIN a usuario/parcela y una consulta para los pagos
+		with self.assertNumQueries(3):
+			response = self.client.get("/api/reservas/?expand=usuario,pagos&fields=id_reserva,usuario,pagos")
+		self.assertEqual(len(response.json()["results"]), 6)
+		self.assertEqual(set(response.json()["results"][0]), {"id_reserva", "usuario", "pagos"})
+
+	def test_detalle_y_cursor(self):
+		response = self.client.get(f"/api/reservas/{self.reserva.pk}/?fields=estado&expand=parcela")
+		self.assertEqual(response.json(), {"estado": "PENDIENTE", "parcela": ParcelaSerializer(self.parcela).data})
+		response = self.client.get("/api/pagos/?pagination=cursor&page_size=1&fields=monto")
+		self.assertEqual(response.json()["results"], [{"monto": "25.00"}])
+		self.assertEqual(self.client.get(response.json()["next"]).json()["results"], [{"monto": "50.00"}])
+
+	def test_parametros_invalidos(self):
+		self.assertEqual(self.client.get("/api/difuntos/?fields=nope").status_code, 400)
+		response = self.client.get("/api/difuntos/?expand=pagos")
+		self.assertEqual(response.status_code, 400)
+		self.assertIn("parcela", str(response.json()))
+
+	def test_escrituras_ignoran_fields(self):
+		admin = APIClient()
+		admin.force_authenticate(User.objects.create_user(username="admin", password="1234", is_staff=True))
+		response = admin.post("/api/parcelas/?fields=ubicacion", {"ubicacion": "C1", "tamanio": "2x2", "precio": "10"}, format="json")
+		self.assertEqual(response.status_code, 201)
+		self.assertIn("id_parcela", response.json())
+
+@override_settings(SQL_INSTRUMENTATION=True, SLOW_REQUEST_MS=10000, SLOW_REQUEST_QUERIES=50, N_PLUS_ONE_THRESHOLD=5)
+class SQLInstrumentationTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		for i in range(6):
+			parcela = Parcela.objects.create(ubicacion=f"A{i}", tamanio="2x2", precio=100)
+			Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1))
+
+	def test_server_timing(self):
+		response = APIClient().get("/api/reservas/")
+		timing = response["Server-Timing"]
+		self.assertIn('desc="2 consultas"', timing)
+		self.assertIn("serializer;dur=", timing)
+		self.assertIn("view;dur=", timing)
+
+	def test_detecta_n_mas_1(self):
+		with mock.patch.object(ReservaViewSet, "fast_read", False), \
+				mock.patch.object(ReservaViewSet, "queryset", Reserva.objects.order_by("-fecha_reserva")), \
+				self.assertLogs("cementerio.sql", level="WARNING") as logs:
+			APIClient().get("/api/reservas/")
+		self.assertTrue(any("Posible N+1" in linea for linea in logs.output))
+
+	@override_settings(SLOW_REQUEST_QUERIES=1)
+	def test_peticion_lenta_con_su_consulta(self):
+		with self.assertLogs("cementerio.sql", level="WARNING") as logs:
+			APIClient().get("/api/reservas/")
+		self.assertIn("Consulta más lenta", logs.output[0])
+		self.assertIn("SELECT", logs.output[0])
+
+	@override_settings(SQL_INSTRUMENTATION=False)
+	def test_apagado(self):
+		self.assertNotIn("Server-Timing", APIClient().get("/api/reservas/"))
+
+class MetricsTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		token_cache.clear()
+		self.directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+		ajustes = override_settings(METRICS_DIR=self.directorio)
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		self.admin = User.objects.create_user(username="admin", password="1234", is_staff=True)
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+
+	def metricas(self):
+		response = self.client.get("/metrics")
+		self.assertEqual(response.status_code, 200)
+		return response.content.decode()
+
+	def test_peticiones_latencia_y_cache(self):
+		self.client.get("/api/parcelas/")
+		self.client.get("/api/parcelas/")
+		texto = self.metricas()
+		self.assertIn(
+			'cementerio_http_requests_total{action="list",method="GET",status="200",view="ParcelaViewSet"} 2.0', texto,
+		)
+		self.assertIn('cementerio_http_request_duration_seconds_count{action="list",view="ParcelaViewSet"} 2.0', texto)
+		self.assertIn('cementerio_cache_requests_total{cache="response",result="hit"} 1.0', texto)
+		self.assertIn('cementerio_db_queries_total{action="list",view="ParcelaViewSet"}', texto)
+		buckets = [l for l in texto.splitlines() if l.startswith("cementerio_http_request_duration_seconds_bucket") and "ParcelaViewSet" in l]
+		self.assertTrue(buckets[-1].startswith('cementerio_http_request_duration_seconds_bucket{action="list",le="+Inf"'))
+
+	def test_fallos_de_autenticacion(self):
+		APIClient().get("/metrics")
+		APIClient().post("/api/auth/login/", {"username": "admin", "password": "mal"}, format="json")
+		texto = self.metricas()
+		self.assertIn('cementerio_auth_failures_total{reason="not_authenticated"} 1.0', texto)
+		self.assertIn('cementerio_auth_failures_total{reason="login"} 1.0', texto)
+
+	def test_suma_ficheros_de_varios_workers(self):
+		# Otro worker con más entradas de las que caben en el tamaño inicial del fichero
+		otro = MmapValues(os.path.join(self.directorio, "99999999.db"))
+		for i in range(2000):
+			otro.inc(_clave("cementerio_auth_failures_total", "cementerio_auth_failures_total", {"reason": f"r{i:040d}"}), 1)
+		otro.inc(_clave("cementerio_auth_failures_total", "cementerio_auth_failures_total", {"reason": "login"}), 2.5)
+		self.client.post("/api/auth/login/", {"username": "admin", "password": "mal"}, format="json")
+		texto = self.metricas()
+		self.assertIn(f'cementerio_auth_failures_total{{reason="r{1999:040d}"}} 1.0', texto)
+		self.assertIn('cementerio_auth_failures_total{reason="login"} 3.5', texto)
+
+	def test_solo_admin(self):
+		cliente = APIClient()
+		cliente.force_authenticate(User.objects.create_user(username="normal", password="1234"))
+		self.assertEqual(cliente.get("/metrics").status_code, 403)
+
+class AsyncReadViewsTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		token_cache.clear()
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		for i in range(12):
+			parcela = Parcela.objects.create(ubicacion=f"A{i}", tamanio="2x2", precio=100)
+			reserva = Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1) + timedelta(days=i))
+			Pago.objects.create(reserva=reserva, monto="10", fecha_pago=reserva.fecha_reserva, metodo_pago="EFECTIVO")
+		Difunto.objects.create(nombre="José", apellido="Ramírez", parcela=parcela, fecha_fallecimiento=date(2020, 1, 1))
+		self.admin = User.objects.create_user(username="admin", password="1234", is_staff=True)
+		self.token = Token.objects.create(user=self.admin).key
+
+	async def test_misma_respuesta_que_el_viewset(self):
+		for url in [
+			"/api/{}/reservas/?page=2&expand=pagos",
+			"/api/{}/pagos/?pagination=cursor&fields=id_pago,monto",
+			"/api/{}/difuntos/?search=ramirez",
+			"/api/{}/parcelas/?ordering=-precio&page_size=3",
+		]:
+			esperado = await self.async_client.get(url.format("").replace("//", "/"))
+			cache.clear()
+			obtenido = await self.async_client.get(url.format("async"))
+			self.assertEqual(obtenido.status_code, 200, url)
+			self.assertEqual(
+				json.loads(obtenido.content.decode().replace("/api/async/", "/api/")), esperado.json(), url,
+			)
+
+	async def test_detalle_y_404(self):
+		reserva = await Reserva.objects.afirst()
+		response = await self.async_client.get(f"/api/async/reservas/{reserva.pk}/?fields=estado")
+		self.assertEqual(response.json(), {"estado": "PENDIENTE"})
+		self.assertEqual((await self.async_client.get("/api/async/reservas/99999/")).status_code, 404)
+		self.assertEqual((await self.async_client.get("/api/async/parcelas/?page=50")).status_code, 404)
+
+	async def test_token_y_permisos(self):
+		self.assertEqual((await self.async_client.get("/api/async/reservas/export/")).status_code, 401)
+		response = await self.async_client.get("/api/async/parcelas/", headers={"Authorization": "Token nope"})
+		self.assertEqual(response.status_code, 401)
+		auth = {"Authorization": f"Token {self.token}"}
+		response = await self.async_client.get("/api/async/reservas/export/?formato=ndjson", headers=auth)
+		filas = [json.loads(linea) async for linea in response.streaming_content]
+		self.assertEqual(len(filas), 12)
+		# Segunda petición: token desde la cache, sin consultar la base de datos
+		self.assertEqual((await self.async_client.get("/api/async/parcelas/", headers=auth)).status_code, 200)
+		self.assertGreaterEqual(token_cache.hits, 1)
+
+@override_settings(READ_REPLICAS=["replica"], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTest(TestCase):
+	databases = {"default", "replica"}
+
+	def setUp(self):
+		cache.clear()
+		token_cache.clear()
+		# La "réplica" tiene otros datos para saber de dónde se leyó
+		Parcela.objects.create(ubicacion="primaria", tamanio="2x2", precio=100)
+		Parcela.objects.using("replica").create(ubicacion="replica", tamanio="2x2", precio=100)
+		admin = User.objects.create_user(username="admin", password="1234", is_staff=True)
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=admin).key}")
+
+	def ubicaciones(self, client=None, antigua=False):
+		if antigua:
+			# Parcela modificada hace tiempo: solo la marca del cliente decide
+			cache.set("cementerio:version:cementerio.parcela", 0, None)
+		# Query string distinta en cada lectura para no servirla desde la cache
+		self.lecturas = getattr(self, "lecturas", 0) + 1
+		response = (client or APIClient()).get(f"/api/parcelas/?_={self.lecturas}")
+		return [p["ubicacion"] for p in response.json()["results"]]
+
+	def test_router(self):
+		router = PrimaryReplicaRouter()
+		self.assertIsNone(router.db_for_read(Parcela))
+		with leer_de("replica"):
+			self.assertEqual(router.db_for_read(Parcela), "replica")
+			self.assertIsNone(router.db_for_read(User))
+			self.assertEqual(router.db_for_write(Parcela), "default")
+			with transaction.atomic():
+				self.assertIsNone(router.db_for_read(Parcela))
+
+	def test_get_lee_de_la_replica(self):
+		self.assertEqual(self.ubicaciones(antigua=True), ["replica"])
+
+	def test_datos_recientes_desde_la_primaria(self):
+		# setUp acaba de escribir parcelas: la réplica podría no tenerlas aún
+		self.assertEqual(self.ubicaciones(), ["primaria"])
+
+	def test_lee_sus_propias_escrituras(self):
+		self.assertEqual(self.ubicaciones(self.client, antigua=True), ["replica"])
+		response = self.client.post("/api/usuarios/", {"nombre": "Ana", "apellido": "López", "email": "ana@example.com"})
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(self.ubicaciones(self.client, antigua=True), ["primaria"])
+		# Otro cliente sigue leyendo de la réplica
+		self.assertEqual(self.ubicaciones(antigua=True), ["replica"])
+
+	def test_busqueda_en_la_base_del_queryset(self):
+		# Mismo id en las dos bases con otro nombre: los ids del índice deben ser de la réplica
+		for alias, apellido in [("default", "Ramírez"), ("replica", "Ramírez Soto")]:
+			parcela = Parcela.objects.using(alias).create(ubicacion="B1", tamanio="2x2", precio=100)
+			difunto = Difunto(nombre="José", apellido=apellido, parcela=parcela, fecha_fallecimiento=date(2020, 1, 1))
+			difunto.actualizar_texto_busqueda()
+			difunto.save(using=alias)
+		Difunto.objects.using("default").filter(apellido="Ramírez").update(texto_busqueda="otro nombre")
+		encontrados = buscar_difuntos(Difunto.objects.using("replica"), "ramirez").values_list("apellido", flat=True)
+		self.assertEqual(list(encontrados), ["Ramírez Soto"])
+
+class ConnectionPoolTest(TestCase):
+	def crear(self):
+		return sqlite3.connect(":memory:", check_same_thread=False)
+
+	@staticmethod
+	def comprobar(conexion):
+		try:
+			conexion.execute("SELECT 1")
+			return True
+		except sqlite3.Error:
+			return False
+
+	def test_reutiliza_conexiones(self):
+		pool = ConnectionPool("test", max_size=2)
+		conexion = pool.acquire(self.crear)
+		pool.release(conexion)
+		self.assertIs(pool.acquire(self.crear), conexion)
+		stats = pool.stats()
+		self.assertEqual((stats["created"], stats["reused"], stats["in_use"], stats["idle"]), (1, 1, 1, 0))
+
+	def test_espera_y_timeout(self):
+		pool = ConnectionPool("test", max_size=1, timeout=0.05)
+		conexion = pool.acquire(self.crear)
+		with self.assertRaises(PoolTimeout):
+			pool.acquire(self.crear)
+		self.assertEqual(pool.stats()["timeout"], 1)
+		pool.release(conexion)
+		self.assertIs(pool.acquire(self.crear), conexion)
+
+	def test_health_check_descarta_conexiones_rotas(self):
+		pool = ConnectionPool("test", max_size=1, check_after=0)
+		conexion = pool.acquire(self.crear)
+		pool.release(conexion)
+		conexion.close()
+		nueva = pool.acquire(self.crear, self.comprobar)
+		self.assertIsNot(nueva, conexion)
+		stats = pool.stats()
+		self.assertEqual((stats["health_check_failed"], stats["discarded"], stats["open"]), (1, 1, 1))
+
+	def test_backend_devuelve_la_conexion_al_pool(self):
+		from django.db.backends.sqlite3 import base
+		from .backends.pool import PooledDatabaseWrapperMixin
+
+		DatabaseWrapper = type("DatabaseWrapper", (PooledDatabaseWrapperMixin, base.DatabaseWrapper), {})
+		with tempfile.TemporaryDirectory() as directorio:
+			settings_dict = {
+				**connection.settings_dict,
+				"NAME": os.path.join(directorio, "pool.sqlite3"),
+				"POOL": {"MAX_SIZE": 2},
+			}
+			wrapper = DatabaseWrapper(settings_dict, alias="pool_test")
+			wrapper.ensure_connection()
+			cruda = wrapper.connection
+			wrapper.close()
+			wrapper.ensure_connection()
+			self.assertIs(wrapper.connection, cruda)
+			self.assertEqual(wrapper.pool.stats()["reused"], 1)
+			wrapper.close()
+			wrapper.pool.close()
+
+class FieldFilterTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		otro = Usuario.objects.create(nombre="Luis", apellido="Gómez", email="luis@example.com")
+		for i, estado in enumerate(["DISPONIBLE", "RESERVADA", "OCUPADA", "DISPONIBLE"]):
+			parcela = Parcela.objects.create(ubicacion=f"A{i}", tamanio="2x2", precio=100 * (i + 1), estado=estado)
+			reserva = Reserva.objects.create(
+				usuario=usuario if i % 2 else otro, parcela=parcela, fecha_reserva=date(2024, 1, 1) + timedelta(days=30 * i),
+			)
+			Pago.objects.create(
+				reserva=reserva, monto="10", fecha_pago=reserva.fecha_reserva,
+				metodo_pago=["EFECTIVO", "TARJETA"][i % 2], estado_pago="PAGADO",
+			)
+		self.usuario = usuario
+		self.client = APIClient()
+
+	def ids(self, url, campo):
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, 200, response.content)
+		return sorted(fila[campo] for fila in response.json()["results"])
+
+	def test_exacto_e_in(self):
+		self.assertEqual(len(self.ids("/api/parcelas/?estado=DISPONIBLE", "id_parcela")), 2)
+		self.assertEqual(len(self.ids("/api/parcelas/?estado__in=RESERVADA,OCUPADA", "id_parcela")), 2)
+		esperado = sorted(Reserva.objects.filter(usuario=self.usuario).values_list("id_reserva", flat=True))
+		self.assertEqual(self.ids(f"/api/reservas/?usuario={self.usuario.pk}", "id_reserva"), esperado)
+
+	def test_rangos(self):
+		precios = [p["precio"] for p in self.client.get("/api/parcelas/?precio__gte=200&precio__lte=300").json()["results"]]
+		self.assertEqual(sorted(precios), ["200.00", "300.00"])
+		fechas = self.ids("/api/pagos/?fecha_pago__range=2024-01-15,2024-03-15&metodo_pago=TARJETA", "fecha_pago")
+		self.assertEqual(fechas, ["2024-01-31"])
+		self.assertEqual(self.ids("/api/reservas/?fecha_reserva__gte=2024-03-01", "fecha_reserva"), ["2024-03-01", "2024-03-31"])
+
+	def test_valores_invalidos(self):
+		for url in [
+			"/api/parcelas/?estado=LIBRE",
+			"/api/parcelas/?precio__gte=barato",
+			"/api/parcelas/?precio__gt=100",
+			"/api/pagos/?fecha_pago__range=2024-01-01",
+			"/api/reservas/?parcela=abc",
+		]:
+			self.assertEqual(self.client.get(url).status_code, 400, url)
+
+	def test_sin_like(self):
+		with CaptureQueriesContext(connection) as consultas:
+			self.client.get("/api/parcelas/?estado=DISPONIBLE")
+		sql = " ".join(q["sql"] for q in consultas.captured_queries)
+		self.assertNotIn("LIKE", sql.upper())
+		self.assertIn("DISPONIBLE", sql)
+
+class RollupsTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		self.parcelas = [
+			Parcela.objects.create(ubicacion=f"Sector {sector} - Fila {i}", tamanio="2x2", precio=100)
+			for i, sector in enumerate("AAB")
+		]
+		self.client = APIClient()
+		self.client.force_authenticate(User.objects.create_user(username="admin", password="1234", is_staff=True))
+
+	@staticmethod
+	def rollups():
+		"""Filas no vacías de cada rollup, para comparar con una reconstrucción."""
+		from .models import IngresoDiario, ReservaMensual
+		tablas = {
+			IngresoDiario: ("fecha", "metodo_pago", "estado_pago", "total", "pagos"),
+			IngresoMensual: ("mes", "metodo_pago", "estado_pago", "total", "pagos"),
+			ReservaMensual: ("mes", "sector", "estado", "reservas"),
+			OcupacionSector: ("sector", "estado", "parcelas"),
+		}
+		ultimo = {IngresoDiario: "pagos", IngresoMensual: "pagos", ReservaMensual: "reservas", OcupacionSector: "parcelas"}
+		return {
+			model.__name__: sorted(model.objects.exclude(**{ultimo[model]: 0}).values_list(*campos))
+			for model, campos in tablas.items()
+		}
+
+	def assertIgualAReconstruir(self):
+		incremental = self.rollups()
+		reconstruir()
+		self.assertEqual(incremental, self.rollups())
+		return incremental
+
+	def test_escrituras_mantienen_los_rollups(self):
+		reservas = [
+			self.client.post("/api/reservas/", {
+				"usuario": self.usuario.pk, "parcela": parcela.pk, "fecha_reserva": f"2024-0{i + 1}-15",
+			}).json()["id_reserva"]
+			for i, parcela in enumerate(self.parcelas)
+		]
+		for i, reserva in enumerate(reservas):
+			Pago.objects.create(reserva_id=reserva, monto="100.50", fecha_pago=date(2024, 1 + i, 20), metodo_pago="EFECTIVO")
+		pago = Pago.objects.first()
+		pago.metodo_pago, pago.estado_pago, pago.monto = "TARJETA", "PAGADO", "80"
+		pago.save()
+		Pago.objects.last().delete()
+		self.client.patch(f"/api/reservas/{reservas[1]}/", {"estado": "CANCELADA"})
+		parcela = Parcela.objects.get(pk=self.parcelas[2].pk)
+		parcela.ubicacion = "Sector C - Fila 1"
+		parcela.save()
+		rollups = self.assertIgualAReconstruir()
+		self.assertIn(("Sector A", "DISPONIBLE", 1), rollups["OcupacionSector"])
+		self.assertIn(("Sector C", "RESERVADA", 1), rollups["OcupacionSector"])
+		self.assertIn((date(2024, 3, 1), "Sector C", "PENDIENTE", 1), rollups["ReservaMensual"])
+		# Borrar una parcela borra en cascada sus reservas y pagos
+		self.parcelas[0].delete()
+		self.assertIgualAReconstruir()
+
+	def test_bulk_mantiene_los_rollups(self):
+		filas = [{"ubicacion": f"Sector N - {i}", "tamanio": "2x2", "precio": "10"} for i in range(5)]
+		ids = self.client.post("/api/parcelas/bulk/", filas, format="json").json()["ids"]
+		self.client.patch("/api/parcelas/bulk/", [{"id_parcela": ids[0], "ubicacion": "Sector M - 1", "estado": "OCUPADA"}], format="json")
+		self.client.delete("/api/parcelas/bulk/", {"ids": ids[1:3]}, format="json")
+		rollups = self.assertIgualAReconstruir()
+		self.assertIn(("Sector N", "DISPONIBLE", 2), rollups["OcupacionSector"])
+		self.assertIn(("Sector M", "OCUPADA", 1), rollups["OcupacionSector"])
+
+	def test_reporte_solo_lee_rollups(self):
+		reserva = Reserva.objects.create(usuario=self.usuario, parcela=self.parcelas[0], fecha_reserva=date(2023, 12, 1))
+		for dia, metodo in [(1, "EFECTIVO"), (2, "EFECTIVO"), (3, "TARJETA")]:
+			Pago.objects.create(reserva=reserva, monto="50", fecha_pago=date(2024, 2, dia), metodo_pago=metodo, estado_pago="PAGADO")
+		with self.assertNumQueries(3):
+			data = self.client.get("/api/reports/?desde=2024-01&hasta=2024-12").json()
+		self.assertEqual(
+			[(f["periodo"], f["metodo_pago"], f["pagos"]) for f in data["ingresos"]],
+			[("2024-02", "EFECTIVO", 2), ("2024-02", "TARJETA", 1)],
+		)
+		self.assertEqual(data["reservas"], [])
+		sector_a = next(s for s in data["ocupacion"] if s["sector"] == "Sector A")
+		self.assertEqual((sector_a["total"], sector_a["DISPONIBLE"]), (2, 2))
+		diario = self.client.get("/api/reports/?granularidad=dia&desde=2024-02-02&hasta=2024-02-03").json()
+		self.assertEqual([f["periodo"] for f in diario["ingresos"]], ["2024-02-02", "2024-02-03"])
+		self.assertEqual(self.client.get("/api/reports/?granularidad=dia").status_code, 400)
+		self.assertEqual(self.client.get("/api/reports/?desde=2024-13").status_code, 400)
+
+class ExportTest(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		self.client.force_authenticate(User.objects.create_user(username="admin", password="1234", is_staff=True))
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		parcela = Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+		for i in range(30):
+			reserva = Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1), estado="CONFIRMADA" if i % 2 else "PENDIENTE")
+			Pago.objects.create(reserva=reserva, monto="10.50", fecha_pago=date(2024, 1, 2), metodo_pago="EFECTIVO")
+
+	def contenido(self, response):
+		return b"".join(response.streaming_content).decode()
+
+	def test_csv_completo(self):
+		response = self.client.get("/api/pagos/export/")
+		self.assertTrue(response.streaming)
+		lineas = self.contenido(response).strip().splitlines()
+		self.assertEqual(lineas[0], "id_pago,reserva,fecha_pago,monto,metodo_pago,estado_pago")
+		self.assertEqual(len(lineas), 31)
+		self.assertIn("2024-01-02,10.50,EFECTIVO", lineas[1])
+
+	def test_ndjson_respeta_busqueda(self):
+		response = self.client.get("/api/reservas/export/", {"formato": "ndjson", "search": "CONFIRMADA"})
+		filas = [json.loads(linea) for linea in self.contenido(response).splitlines()]
+		self.assertEqual(len(filas), 15)
+		self.assertEqual(filas[0]["usuario_apellido"], "López")
+
+	def test_formato_invalido(self):
+		self.assertEqual(self.client.get("/api/pagos/export/", {"formato": "xml"}).status_code, 400)
+
+	def test_requiere_admin(self):
+		self.assertEqual(APIClient().get("/api/pagos/export/").status_code, 401)
+
+
+def servir_asgi(ruta, enviar, cabeceras=(), query_string=b""):
+	"""Una petición GET por la aplicación ASGI, como la serviría uvicorn."""
+	scope = {
+		"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+		"scheme": "http", "path": ruta, "raw_path": ruta.encode(), "query_string": query_string,
+		"root_path": "", "headers": [(b"host", b"testserver"), *cabeceras],
+		"client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+	}
+	mensajes = iter([{"type": "http.request", "body": b"", "more_body": False}])
+
+	async def recibir():
+		try:
+			return next(mensajes)
+		except StopIteration:
+			# El cliente no se desconecta
+			await asyncio.Event().wait()
+
+	async_to_sync(ASGIHandler())(scope, recibir, enviar)
+
+class ExportAsgiTest(TransactionTestCase):
+	"""
+	El servidor ASGI de verdad (ASGIHandler.send_response), no el cliente de
+	pruebas. La vista síncrona corre en otro hilo: los datos deben estar
+	confirmados.
+	"""
+
+	def test_streaming_bajo_asgi(self):
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		parcela = Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+		reserva = Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1))
+		Pago.objects.bulk_create(
+			Pago(reserva=reserva, monto="10.50", fecha_pago=date(2024, 1, 2), metodo_pago="TRANSFERENCIA")
+			for _ in range(20000)
+		)
+		token = Token.objects.create(user=User.objects.create_user(username="admin", password="1234", is_staff=True))
+
+		for encoding in ["identity", "gzip"]:
+			with self.subTest(encoding=encoding):
+				descompresor = zlib.decompressobj(31) if encoding == "gzip" else None
+				recibido = {"lineas": 0, "trozos": 0}
+
+				async def enviar(mensaje):
+					if mensaje["type"] == "http.response.start":
+						recibido["cabeceras"] = dict(mensaje["headers"])
+					elif mensaje.get("body"):
+						cuerpo = descompresor.decompress(mensaje["body"]) if descompresor else mensaje["body"]
+						recibido["lineas"] += cuerpo.count(b"\n")
+						recibido["trozos"] += 1
+
+				tracemalloc.start()
+				try:
+					with mock.patch.object(PagoViewSet, "export_chunk_size", 200):
+						servir_asgi("/api/pagos/export/", enviar, [
+							(b"authorization", f"Token {token.key}".encode()),
+							(b"accept-encoding", encoding.encode()),
+						])
+					_, pico = tracemalloc.get_traced_memory()
+				finally:
+					tracemalloc.stop()
+
+				self.assertEqual(recibido["cabeceras"].get(b"Content-Encoding"), b"gzip" if descompresor else None)
+				self.assertEqual(recibido["lineas"], 20001)
+				self.assertGreater(recibido["trozos"], 20000)
+				# En streaming ~0,8 MB; leído entero con sync_to_async(list), más de 1,5 MB
+				self.assertLess(pico, 1.2 * 1024 * 1024, f"pico de {pico / 1024 / 1024:.1f} MB")
+
+class ImportCementerioCommandTest(TestCase):
+	def escribir_csv(self, nombre, filas):
+		ruta = os.path.join(self.directorio.name, f"{nombre}.csv")
+		with open(ruta, "w", newline="", encoding="utf-8") as f:
+			writer = csv.DictWriter(f, fieldnames=list(filas[0]))
+			writer.writeheader()
+			writer.writerows(filas)
+		return ruta
+
+	def setUp(self):
+		self.directorio = tempfile.TemporaryDirectory()
+		self.addCleanup(self.directorio.cleanup)
+		self.archivos = {
+			"usuarios": self.escribir_csv("usuarios", [
+				{"id_usuario": i, "nombre": f"N{i}", "apellido": "A", "email": f"u{i}@example.com"} for i in range(1, 51)
+			]),
+			"parcelas": self.escribir_csv("parcelas", [
+				{"id_parcela": i, "ubicacion": f"S-{i}", "tamanio": "2x2", "precio": "100.00", "estado": "OCUPADA"} for i in range(1, 101)
+			]),
+			"reservas": self.escribir_csv("reservas", [
+				{"id_reserva": i, "usuario": (i % 50) + 1, "parcela": i, "fecha_reserva": "2020-05-01", "estado": "CONFIRMADA"} for i in range(1, 101)
+			] + [{"id_reserva": 500, "usuario": 999, "parcela": 1, "fecha_reserva": "2020-05-01", "estado": "CONFIRMADA"}]),
+			"pagos": self.escribir_csv("pagos", [
+				{"id_pago": i, "reserva": i, "monto": "100.00", "fecha_pago": "2020-05-02", "metodo_pago": "EFECTIVO", "estado_pago": "PAGADO"} for i in range(1, 101)
+			] + [{"id_pago": 500, "reserva": 1, "monto": "abc", "fecha_pago": "2020-05-02", "metodo_pago": "EFECTIVO", "estado_pago": "PAGADO"}]),
+			"difuntos": self.escribir_csv("difuntos", [
+				{"id_difunto": i, "nombre": "José", "apellido": f"Núñez{i}", "parcela": i, "fecha_fallecimiento": "2019-01-01"} for i in range(1, 101)
+			]),
+		}
+		self.estado = os.path.join(self.directorio.name, "estado.json")
+
+	def importar(self, **extra):
+		opciones = {**self.archivos, "chunk_size": 30, "estado": self.estado, "stdout": io.StringIO()}
+		opciones.update(extra)
+		call_command("import_cementerio", **opciones)
+		return opciones["stdout"].getvalue()
+
+	def test_importa_y_descarta_filas_invalidas(self):
+		self.importar()
+		self.assertEqual(Usuario.objects.count(), 50)
+		self.assertEqual(Parcela.objects.count(), 100)
+		# La reserva con usuario inexistente y el pago con monto inválido se omiten
+		self.assertEqual(Reserva.objects.count(), 100)
+		self.assertEqual(Pago.objects.count(), 100)
+		self.assertEqual(Difunto.objects.get(pk=7).texto_busqueda, "jose nunez7")
+		self.assertFalse(os.path.exists(self.estado))
+
+	def test_reanudar_es_idempotente(self):
+		with open(self.estado, "w") as f:
+			json.dump({"usuarios": 50, "parcelas": 60}, f)
+		salida = self.importar(reanudar=True, reservas=None, pagos=None, difuntos=None)
+		self.assertIn("parcelas: reanudando tras 60 filas", salida)
+		self.assertEqual(Usuario.objects.count(), 0)
+		self.assertEqual(Parcela.objects.count(), 40)
+		self.importar(reservas=None, pagos=None, difuntos=None)
+		self.assertEqual(Parcela.objects.count(), 100)
+
+	@override_settings(SYNC_WATERMARK_LAG=1e-9)
+	def test_lote_que_confirma_tarde_se_deshace(self):
+		# Sus filas quedarían por detrás de un watermark ya entregado
+		with self.assertRaisesMessage(CommandError, "usuarios: lote deshecho tras 0 filas"):
+			self.importar()
+		self.assertEqual(Usuario.objects.count(), 0)
+		self.assertFalse(os.path.exists(self.estado))
+		with self.settings(SYNC_WATERMARK_LAG=5):
+			self.importar()
+		self.assertEqual(Usuario.objects.count(), 50)
+
+	def test_valores_que_no_caben_en_postgresql(self):
+		# Pasan el patrón pero el CAST fallaría y abortaría el lote entero
+		if connection.vendor != "postgresql":
+			self.skipTest("Solo el camino COPY de PostgreSQL convierte en SQL")
+		pago = {"reserva": 1, "monto": "100.00", "fecha_pago": "2020-05-02", "metodo_pago": "EFECTIVO", "estado_pago": "PAGADO"}
+		self.archivos["pagos"] = self.escribir_csv("pagos", [{"id_pago": i, **pago} for i in range(1, 11)] + [
+			{**pago, "id_pago": 11, "fecha_pago": "2020-13-45"},
+			{**pago, "id_pago": 12, "fecha_pago": "2021-02-29"},
+			{**pago, "id_pago": 13, "fecha_pago": "0000-01-01"},
+			{**pago, "id_pago": 3000000000},
+			{**pago, "id_pago": 14, "reserva": 3000000000},
+			{**pago, "id_pago": 15, "monto": "123456789.00"},
+			{**pago, "id_pago": 16, "monto": "10.505"},
+			{**pago, "id_pago": 17, "fecha_pago": "2020-2-29", "monto": "99999999.99"},
+		])
+		self.importar(difuntos=None)
+		self.assertEqual(sorted(Pago.objects.values_list("pk", flat=True)), list(range(1, 11)) + [17])
+		self.assertEqual(Pago.objects.get(pk=17).fecha_pago, date(2020, 2, 29))
+
+@override_settings(SYNC_WATERMARK_LAG=0)
+class DeltaSyncTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		self.parcelas = [
+			Parcela.objects.create(ubicacion=f"Sector A - {i}", tamanio="2x2", precio=100) for i in range(3)
+		]
+		self.client = APIClient()
+
+	def delta(self, url, desde, **params):
+		response = self.client.get(url, {"updated_since": desde, **params})
+		self.assertEqual(response.status_code, 200, response.content)
+		self.assertEqual(response["X-Sync-Watermark"], response.json()["watermark"])
+		return response.json()
+
+	def test_marcas_de_tiempo(self):
+		parcela = self.parcelas[0]
+		self.assertIsNotNone(parcela.created_at)
+		antes = parcela.updated_at
+		reservar_parcela(self.usuario, parcela, date.today())
+		parcela.refresh_from_db()
+		self.assertGreater(parcela.updated_at, antes)
+		self.assertEqual(parcela.created_at, Parcela.objects.get(pk=parcela.pk).created_at)
+
+	def test_solo_cambios_y_borrados(self):
+		inicial = self.client.get("/api/parcelas/")
+		marca = inicial["X-Sync-Watermark"]
+		self.assertEqual(self.delta("/api/parcelas/", marca)["results"], [])
+
+		self.parcelas[0].precio = 150
+		self.parcelas[0].save()
+		nueva = Parcela.objects.create(ubicacion="Sector B - 1", tamanio="1x2", precio=80)
+		borrada = self.parcelas[2].pk
+		self.parcelas[2].delete()
+
+		datos = self.delta("/api/parcelas/", marca)
+		self.assertEqual([fila["id_parcela"] for fila in datos["results"]], [self.parcelas[0].pk, nueva.pk])
+		self.assertEqual(datos["results"][0]["precio"], "150.00")
+		self.assertEqual(datos["deleted"], [borrada])
+		# Con ?fields= como el listado
+		fila = self.delta("/api/parcelas/", marca, fields="id_parcela,updated_at")["results"][0]
+		self.assertEqual(set(fila), {"id_parcela", "updated_at"})
+
+		siguiente = self.delta("/api/parcelas/", datos["watermark"])
+		self.assertEqual((siguiente["results"], siguiente["deleted"]), ([], []))
+
+	def test_respuesta_de_la_cache_con_su_marca(self):
+		primera = self.client.get("/api/parcelas/")
+		# Desde la cache: la marca de cuando se leyeron los datos, no una nueva
+		segunda = self.client.get("/api/parcelas/")
+		self.assertEqual(segunda["X-Sync-Watermark"], primera["X-Sync-Watermark"])
+		self.assertEqual(segunda.json(), primera.json())
+		no_modificada = self.client.get("/api/parcelas/", HTTP_IF_NONE_MATCH=primera["ETag"])
+		self.assertEqual(no_modificada.status_code, 304)
+		self.assertFalse(no_modificada.has_header("X-Sync-Watermark"))
+
+	def test_escrituras_masivas_cuentan(self):
+		admin = User.objects.create_user(username="admin", password="x", is_staff=True)
+		self.client.force_authenticate(admin)
+		marca = self.client.get("/api/parcelas/")["X-Sync-Watermark"]
+		response = self.client.patch(
+			"/api/parcelas/bulk/", [{"id_parcela": self.parcelas[1].pk, "tamanio": "3x3"}], format="json",
+		)
+		self.assertEqual(response.status_code, 200, response.content)
+		ids = [fila["id_parcela"] for fila in self.delta("/api/parcelas/", marca)["results"]]
+		self.assertEqual(ids, [self.parcelas[1].pk])
+
+	def test_borrado_en_cascada_deja_lapidas(self):
+		reserva = reservar_parcela(self.usuario, self.parcelas[0], date.today())
+		marca = self.client.get("/api/reservas/")["X-Sync-Watermark"]
+		usuario_id = self.usuario.pk
+		self.usuario.delete()
+		self.assertEqual(self.delta("/api/reservas/", marca)["deleted"], [reserva.pk])
+		self.assertEqual(self.delta("/api/usuarios/", marca)["deleted"], [usuario_id])
+
+	@override_settings(SYNC_MAX_CHANGES=2, SYNC_TOMBSTONE_DAYS=30)
+	def test_resincronizacion(self):
+		antigua = (timezone.now() - timedelta(days=31)).isoformat()
+		self.assertEqual(self.client.get("/api/parcelas/", {"updated_since": antigua}).status_code, 410)
+		reciente = (timezone.now() - timedelta(hours=1)).isoformat()
+		self.assertEqual(self.client.get("/api/parcelas/", {"updated_since": reciente}).status_code, 410)
+		self.assertEqual(self.client.get("/api/parcelas/?updated_since=ayer").status_code, 400)
+
+	def test_purge_tombstones(self):
+		self.parcelas[0].delete()
+		Borrado.objects.update(deleted_at=timezone.now() - timedelta(days=40))
+		reciente = self.parcelas[1].pk
+		self.parcelas[1].delete()
+		call_command("purge_tombstones", stdout=io.StringIO())
+		self.assertEqual(list(Borrado.objects.values_list("objeto_id", flat=True)), [reciente])
+
+class SyntheticBenchmarkTest(TestCase):
+	def test_seed_synthetic_coherente(self):
+		call_command("seed_synthetic", parcelas=120, lote=50, stdout=io.StringIO())
+		self.assertEqual(Parcela.objects.count(), 120)
+		self.assertEqual(Usuario.objects.count(), 24)
+		activas = Reserva.objects.exclude(estado="CANCELADA")
+		self.assertEqual(
+			set(activas.values_list("parcela_id", flat=True)),
+			set(Parcela.objects.exclude(estado="DISPONIBLE").values_list("pk", flat=True)),
+		)
+		self.assertFalse(Parcela.objects.filter(estado="OCUPADA", difuntos__isnull=True).exists())
+		self.assertFalse(Pago.objects.filter(reserva__estado="CANCELADA").exclude(estado_pago="ANULADO").exists())
+		self.assertEqual(Parcela.objects.exclude(sector="").count(), 120)
+		self.assertEqual(OcupacionSector.objects.filter(parcelas__gt=0).count(), Parcela.objects.values("sector", "estado").distinct().count())
+
+	def test_benchmark_detecta_regresiones(self):
+		with tempfile.TemporaryDirectory() as directorio:
+			baseline = os.path.join(directorio, "endpoints.json")
+			opciones = {"parcelas": 30, "repeticiones": 1, "baseline": baseline, "rutas": "parcela", "stdout": io.StringIO()}
+			call_command("benchmark_endpoints", guardar=True, **opciones)
+			with open(baseline) as f:
+				datos = json.load(f)
+			self.assertIn("GET parcela-list", datos["rutas"])
+			self.assertIn("POST parcela-bulk", datos["rutas"])
+			self.assertEqual(Parcela.objects.count(), 0)
+
+			# La latencia depende de la máquina: sin --umbral-ms solo se avisa
+			datos["rutas"]["GET parcela-list"]["p95_ms"] = 0
+			with open(baseline, "w") as f:
+				json.dump(datos, f)
+			salida = io.StringIO()
+			call_command("benchmark_endpoints", **{**opciones, "stdout": salida})
+			self.assertIn("aviso GET parcela-list: p95_ms 0.00 ->", salida.getvalue())
+			with self.assertRaisesMessage(CommandError, "1 regresiones"):
+				call_command("benchmark_endpoints", umbral_ms=0, stderr=io.StringIO(), **opciones)
+
+			datos["rutas"]["GET parcela-list"]["consultas"] -= 1
+			with open(baseline, "w") as f:
+				json.dump(datos, f)
+			with self.assertRaisesMessage(CommandError, "1 regresiones"):
+				call_command("benchmark_endpoints", stderr=io.StringIO(), **opciones)
+
+class MisDatosTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.cuenta = User.objects.create_user(username="ana", password="x", email="Ana@Example.com")
+		self.usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		otro = Usuario.objects.create(nombre="Luis", apellido="Gómez", email="luis@example.com")
+		self.parcelas = [Parcela.objects.create(ubicacion=f"A{i}", tamanio="2x2", precio=100) for i in range(8)]
+		for i, estado in enumerate(["PENDIENTE", "CONFIRMADA", "CANCELADA"]):
+			reserva = reservar_parcela(self.usuario, self.parcelas[i], date(2024, 1, 1) + timedelta(days=i), estado=estado)
+			Pago.objects.create(reserva=reserva, monto="10.50", fecha_pago=date(2024, 2, 1), metodo_pago="EFECTIVO", estado_pago="PAGADO")
+			Pago.objects.create(reserva=reserva, monto="5", fecha_pago=date(2024, 3, 1), metodo_pago="TARJETA")
+		reserva_ajena = reservar_parcela(otro, self.parcelas[7], date(2024, 1, 1))
+		Pago.objects.create(reserva=reserva_ajena, monto="99", fecha_pago=date(2024, 2, 1), metodo_pago="EFECTIVO")
+		self.client = APIClient()
+		self.client.force_authenticate(self.cuenta)
+
+	def test_vincula_por_email(self):
+		self.usuario.refresh_from_db()
+		self.assertEqual(self.usuario.user_id, self.cuenta.pk)
+		# En el otro orden: primero el Usuario y luego la cuenta
+		cuenta = User.objects.create_user(username="luis", password="x", email="luis@example.com")
+		self.assertEqual(Usuario.objects.get(email="luis@example.com").user_id, cuenta.pk)
+		# Dos cuentas con el mismo email: no se adivina
+		User.objects.create_user(username="eva1", email="eva@example.com")
+		User.objects.create_user(username="eva2", email="eva@example.com")
+		self.assertIsNone(Usuario.objects.create(nombre="Eva", apellido="Ruiz", email="eva@example.com").user_id)
+
+	def test_cuenta_no_visible_ni_editable(self):
+		datos = APIClient().get(f"/api/usuarios/{self.usuario.pk}/").json()
+		self.assertNotIn("user", datos)
+		admin = APIClient()
+		admin.force_authenticate(User.objects.create_user(username="admin", password="x", is_staff=True))
+		otra = User.objects.create_user(username="intrusa", password="x")
+		response = admin.patch(f"/api/usuarios/{self.usuario.pk}/", {"user": otra.pk, "telefono": "600"}, format="json")
+		self.assertEqual(response.status_code, 200)
+		self.assertNotIn("user", response.json())
+		self.usuario.refresh_from_db()
+		self.assertEqual(self.usuario.user_id, self.cuenta.pk)
+
+	def test_mis_reservas(self):
+		response = self.client.get("/api/me/reservas/")
+		self.assertEqual(response.status_code, 200)
+		datos = response.json()
+		self.assertEqual(datos["totales"], {"pendientes": 1, "confirmadas": 1, "canceladas": 1, "total": 3})
+		self.assertEqual(datos["count"], 3)
+		self.assertEqual({r["usuario"] for r in datos["results"]}, {self.usuario.pk})
+		pagos = datos["results"][0]["pagos"]
+		self.assertEqual([p["fecha_pago"] for p in pagos], ["2024-03-01", "2024-02-01"])
+		self.assertEqual(pagos[0]["reserva_id_reserva"], datos["results"][0]["id_reserva"])
+
+	def test_consultas_constantes(self):
+		with CaptureQueriesContext(connection) as antes:
+			self.client.get("/api/me/reservas/")
+		for parcela in self.parcelas[3:7]:
+			reserva = reservar_parcela(self.usuario, parcela, date(2024, 5, 1))
+			Pago.objects.create(reserva=reserva, monto="1", fecha_pago=date(2024, 5, 1), metodo_pago="EFECTIVO")
+		with self.assertNumQueries(len(antes)):
+			self.assertEqual(len(self.client.get("/api/me/reservas/").json()["results"]), 7)
+		with self.assertNumQueries(3):
+			self.client.get("/api/me/pagos/")
+
+	def test_mis_pagos(self):
+		datos = self.client.get("/api/me/pagos/").json()
+		self.assertEqual(datos["count"], 6)
+		self.assertEqual(datos["totales"]["pagados"], 3)
+		self.assertEqual(datos["totales"]["pendientes"], 3)
+		self.assertEqual(datos["totales"]["monto_pagado"], 31.5)
+		self.assertEqual(datos["totales"]["monto_pendiente"], 15.0)
+
+	def test_sin_usuario_enlazado(self):
+		self.client.force_authenticate(User.objects.create_user(username="sin_usuario"))
+		datos = self.client.get("/api/me/reservas/").json()
+		self.assertEqual((datos["count"], datos["totales"]["total"]), (0, 0))
+		self.client.force_authenticate(None)
+		self.assertEqual(self.client.get("/api/me/pagos/").status_code, 401)
+
+
+class JobsTest(TestCase):
+	def setUp(self):
+		self.directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+		ajustes = override_settings(MEDIA_ROOT=self.directorio, JOBS_BACKOFF_BASE=30)
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		self.admin = User.objects.create_user(username="admin", password="1234", is_staff=True)
+		self.client = APIClient()
+		self.client.force_authenticate(self.admin)
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		parcela = Parcela.objects.create(ubicacion="Sector A - 1", tamanio="2x2", precio=1000)
+		reserva = Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1))
+		for i, estado in enumerate(["PAGADO", "PAGADO", "PENDIENTE"]):
+			Pago.objects.create(reserva=reserva, monto=100 + i, fecha_pago=date(2024, 1, 2), metodo_pago="EFECTIVO", estado_pago=estado)
+
+	def trabajar(self):
+		salida = io.StringIO()
+		call_command("run_workers", hilos=0, una_vez=True, stdout=salida)
+		return salida.getvalue()
+
+	def encolar(self, tipo, **parametros):
+		response = self.client.post("/api/jobs/", {"tipo": tipo, "parametros": parametros}, format="json")
+		self.assertEqual(response.status_code, 202, response.data)
+		return response
+
+	def test_exportacion_en_segundo_plano(self):
+		response = self.encolar("exportar", recurso="pagos", formato="csv", filtros={"estado_pago": "PAGADO"})
+		self.assertEqual(response.data["estado"], "PENDIENTE")
+		self.assertTrue(response["Location"].endswith(f"/api/jobs/{response.data['id']}/"))
+		self.assertIsNone(response.data["resultado_url"])
+
+		self.assertIn("1 trabajos ejecutados", self.trabajar())
+		estado = self.client.get(response["Location"]).data
+		self.assertEqual(estado["estado"], "COMPLETADO")
+		self.assertEqual(estado["progreso"], 100)
+		self.assertEqual(estado["resultado"], {"filas": 2})
+		self.assertEqual(estado["intentos"], 1)
+
+		descarga = self.client.get(estado["resultado_url"])
+		self.assertEqual(descarga.status_code, 200)
+		self.assertEqual(descarga["Content-Type"], "text/csv; charset=utf-8")
+		filas = list(csv.reader(io.StringIO(b"".join(descarga.streaming_content).decode())))
+		self.assertEqual(filas[0][:2], ["id_pago", "reserva"])
+		self.assertEqual(len(filas), 3)
+
+	def test_validacion_al_encolar(self):
+		for datos in [
+			{"tipo": "desconocido"},
+			{"tipo": "exportar", "parametros": {"recurso": "difuntos"}},
+			{"tipo": "exportar", "parametros": {"recurso": "pagos", "formato": "xls"}},
+			{"tipo": "exportar", "parametros": {"recurso": "pagos", "filtros": {"estado_pago": "X"}}},
+			{"tipo": "importar", "parametros": {"tabla": "parcelas"}},
+		]:
+			self.assertEqual(self.client.post("/api/jobs/", datos, format="json").status_code, 400, datos)
+		self.assertFalse(Job.objects.exists())
+
+		cliente = APIClient()
+		cliente.force_authenticate(User.objects.create_user(username="cliente", password="1234"))
+		self.assertEqual(cliente.post("/api/jobs/", {"tipo": "reconstruir_rollups"}, format="json").status_code, 403)
+
+	def test_resultado_antes_de_terminar(self):
+		job = self.encolar("reconstruir_rollups").data
+		self.assertEqual(self.client.get(f"/api/jobs/{job['id']}/resultado/").status_code, 409)
+		self.trabajar()
+		job = self.client.get(f"/api/jobs/{job['id']}/").data
+		self.assertEqual(job["estado"], "COMPLETADO")
+		self.assertEqual(job["resultado"]["OcupacionSector"], 1)
+		# Sin fichero que descargar
+		self.assertEqual(self.client.get(f"/api/jobs/{job['id']}/resultado/").status_code, 404)
+
+	def test_reintentos_con_backoff(self):
+		llamadas = []
+
+		def inestable(job, fallos):
+			llamadas.append(job.intentos)
+			if len(llamadas) <= fallos:
+				raise RuntimeError("base de datos ocupada")
+			return "ok"
+
+		with mock.patch.dict(TAREAS, {"inestable": (inestable, None)}), self.assertLogs("cementerio.jobs", "WARNING"):
+			job = self.encolar("inestable", fallos=2).data
+			self.trabajar()
+			job = Job.objects.get(pk=job["id"])
+			self.assertEqual((job.estado, job.intentos), ("PENDIENTE", 1))
+			self.assertIn("base de datos ocupada", job.error)
+			# Entre la mitad y el total de JOBS_BACKOFF_BASE
+			self.assertGreater(job.ejecutar_desde, timezone.now() + timedelta(seconds=14))
+			self.assertIn("0 trabajos ejecutados", self.trabajar())
+
+			with override_settings(JOBS_BACKOFF_BASE=0):
+				Job.objects.filter(pk=job.pk).update(ejecutar_desde=timezone.now())
+				self.trabajar()
+			job.refresh_from_db()
+			self.assertEqual((job.estado, job.intentos, job.resultado), ("COMPLETADO", 3, "ok"))
+			self.assertEqual(llamadas, [1, 2, 3])
+
+			llamadas.clear()
+			with override_settings(JOBS_BACKOFF_BASE=0):
+				job = Job.objects.get(pk=self.encolar("inestable", fallos=10).data["id"])
+				self.trabajar()
+			job.refresh_from_db()
+			self.assertEqual((job.estado, job.intentos), ("FALLIDO", 3))
+			self.assertIsNotNone(job.terminado_en)
+
+	def test_error_definitivo_no_se_reintenta(self):
+		def invalido(job):
+			raise ErrorDefinitivo("parámetros imposibles")
+
+		with mock.patch.dict(TAREAS, {"invalido": (invalido, None)}), self.assertLogs("cementerio.jobs", "WARNING"):
+			job = self.encolar("invalido").data
+			self.trabajar()
+		job = Job.objects.get(pk=job["id"])
+		self.assertEqual((job.estado, job.intentos), ("FALLIDO", 1))
+		self.assertIn("parámetros imposibles", job.error)
+
+	def test_reclamar_y_recuperar_abandonados(self):
+		job = Job.objects.get(pk=self.encolar("reconstruir_rollups").data["id"])
+		self.assertEqual(reclamar("worker-1").pk, job.pk)
+		self.assertIsNone(reclamar("worker-2"))
+		self.assertEqual(recuperar_abandonados(), 0)
+
+		# El worker-1 murió hace rato: vuelve a la cola, hasta agotar los intentos
+		Job.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - timedelta(hours=1))
+		self.assertEqual(recuperar_abandonados(), 1)
+		job.refresh_from_db()
+		self.assertEqual((job.estado, job.worker), ("PENDIENTE", ""))
+		Job.objects.filter(pk=job.pk).update(
+			estado="EN_CURSO", intentos=job.max_intentos, heartbeat=timezone.now() - timedelta(hours=1),
+		)
+		recuperar_abandonados()
+		job.refresh_from_db()
+		self.assertEqual(job.estado, "FALLIDO")
+
+	def test_importacion_con_fichero(self):
+		contenido = "id_parcela,ubicacion,tamanio,precio,estado\n" + "".join(
+			f"{1000 + i},Sector Z - {i},2x2,500.00,DISPONIBLE\n" for i in range(25)
+		)
+		response = self.client.post("/api/jobs/", {
+			"tipo": "importar",
+			"parametros": json.dumps({"tabla": "parcelas"}),
+			"entrada": SimpleUploadedFile("parcelas.csv", contenido.encode(), content_type="text/csv"),
+		}, format="multipart")
+		self.assertEqual(response.status_code, 202, response.data)
+		self.trabajar()
+		job = Job.objects.get(pk=response.data["id"])
+		self.assertEqual(job.estado, "COMPLETADO", job.error)
+		self.assertIn("parcelas: 25 filas importadas", job.resultado["salida"])
+		self.assertEqual(Parcela.objects.filter(sector="Sector Z").count(), 25)
+
+
+class JobsLatidoTest(TransactionTestCase):
+	"""El latido sale de otro hilo y solo ve lo confirmado: sin transacción de prueba."""
+
+	@override_settings(JOBS_STALE_SECONDS=0.3)
+	def test_trabajo_largo_en_primer_plano_no_se_reclama(self):
+		recuperados = []
+
+		def lento(job):
+			# Más que JOBS_STALE_SECONDS sin informar de avance; otro worker mira entonces
+			time.sleep(0.8)
+			recuperados.append(recuperar_abandonados())
+			return "ok"
+
+		with mock.patch.dict(TAREAS, {"lento": (lento, None)}):
+			job = encolar("lento")
+			call_command("run_workers", hilos=0, una_vez=True, stdout=io.StringIO())
+		job.refresh_from_db()
+		self.assertEqual(recuperados, [0])
+		self.assertEqual(job.estado, "COMPLETADO")
+		self.assertEqual(job.intentos, 1)
+
+
+def rollups_actuales():
+	"""Filas con valores no nulos de las cuatro tablas de rollup, para comparar con reconstruir()."""
+	return {
+		IngresoDiario: set(IngresoDiario.objects.filter(pagos__gt=0).values_list("fecha", "metodo_pago", "estado_pago", "total", "pagos")),
+		IngresoMensual: set(IngresoMensual.objects.filter(pagos__gt=0).values_list("mes", "metodo_pago", "estado_pago", "total", "pagos")),
+		ReservaMensual: set(ReservaMensual.objects.filter(reservas__gt=0).values_list("mes", "sector", "estado", "reservas")),
+		OcupacionSector: set(OcupacionSector.objects.filter(parcelas__gt=0).values_list("sector", "estado", "parcelas")),
+	}
+
+
+class ExpiryTest(TestCase):
+	def setUp(self):
+		self.hoy = date(2024, 6, 1)
+		self.usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		viejo = self.hoy - timedelta(days=45)
+
+		def reserva(sector, fecha, estado="PENDIENTE", pagos=()):
+			parcela = Parcela.objects.create(ubicacion=f"{sector} - {Parcela.objects.count()}", tamanio="2x2", precio=1000)
+			reserva = reservar_parcela(self.usuario, parcela, fecha, estado)
+			for estado_pago in pagos:
+				Pago.objects.create(reserva=reserva, monto=250, fecha_pago=fecha, metodo_pago="EFECTIVO", estado_pago=estado_pago)
+			return reserva
+
+		self.sin_pagos = [reserva("Sector A", viejo - timedelta(days=i)) for i in range(5)]
+		self.con_pendiente = reserva("Sector B", viejo, pagos=["PENDIENTE", "ANULADO"])
+		self.pagada = reserva("Sector B", viejo, pagos=["PENDIENTE", "PAGADO"])
+		self.reciente = reserva("Sector A", self.hoy - timedelta(days=10))
+		self.confirmada = reserva("Sector C", viejo, estado="CONFIRMADA")
+
+	def test_cancela_las_caducadas_por_lotes(self):
+		total = expirar_reservas(hoy=self.hoy, dias=30, lote=2)
+		self.assertEqual(total, {"reservas": 6, "pagos": 1, "parcelas": 6, "lotes": 3})
+
+		caducadas = self.sin_pagos + [self.con_pendiente]
+		for reserva in caducadas:
+			reserva.refresh_from_db()
+			self.assertEqual(reserva.estado, "CANCELADA")
+			self.assertEqual(reserva.parcela.estado, "DISPONIBLE")
+			self.assertGreater(reserva.updated_at, reserva.created_at)
+		self.assertEqual(
+			sorted(self.con_pendiente.pagos.values_list("estado_pago", flat=True)), ["ANULADO", "ANULADO"],
+		)
+		for reserva, estado in [(self.pagada, "PENDIENTE"), (self.reciente, "PENDIENTE"), (self.confirmada, "CONFIRMADA")]:
+			reserva.refresh_from_db()
+			self.assertEqual(reserva.estado, estado)
+			self.assertEqual(reserva.parcela.estado, "RESERVADA")
+
+		# Los deltas agrupados dejan los rollups igual que recalcularlos
+		incrementales = rollups_actuales()
+		reconstruir()
+		self.assertEqual(incrementales, rollups_actuales())
+
+		# Una segunda pasada no encuentra nada
+		self.assertEqual(expirar_reservas(hoy=self.hoy, dias=30)["reservas"], 0)
+
+	def test_parcela_con_otra_reserva_activa_sigue_reservada(self):
+		reserva = self.sin_pagos[0]
+		Reserva.objects.create(usuario=self.usuario, parcela=reserva.parcela, fecha_reserva=self.hoy, estado="CONFIRMADA")
+		expirar_reservas(hoy=self.hoy, dias=30)
+		reserva.refresh_from_db()
+		self.assertEqual(reserva.estado, "CANCELADA")
+		self.assertEqual(reserva.parcela.estado, "RESERVADA")
+
+	def test_maximo_y_desactivada(self):
+		self.assertEqual(expirar_reservas(hoy=self.hoy, dias=30, lote=2, maximo=3)["reservas"], 3)
+		with override_settings(RESERVA_EXPIRY_DAYS=None):
+			self.assertEqual(expirar_reservas(hoy=self.hoy)["reservas"], 0)
+		self.assertEqual(Reserva.objects.filter(estado="CANCELADA").count(), 3)
+
+	def test_comando_y_metricas(self):
+		directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+		salida = io.StringIO()
+		with override_settings(METRICS_DIR=directorio), mock.patch("cementerio.expiry.timezone.localdate", return_value=self.hoy):
+			call_command("expire_reservations", dias=30, lote=4, stdout=salida)
+			texto = metrics.collect()
+		self.assertIn("6 reservas caducadas, 1 pagos anulados y 6 parcelas liberadas en 2 lotes", salida.getvalue())
+		self.assertIn('cementerio_expiry_swept_total{modelo="reservas"} 6.0', texto)
+		self.assertIn("cementerio_expiry_runs_total{} 1.0", texto)
+
+
+@tag("lento")
+class ExpiryEscalaTest(TestCase):
+	"""
+	Un millón de reservas caducadas: la memoria de Python depende del lote
+	y no del total, y el barrido termina en un tiempo acotado. Los datos se
+	insertan con INSERT ... SELECT sobre una serie generada en SQL. Tarda un
+	par de minutos: el CI lo omite en cada push (--exclude-tag lento) y lo
+	ejecuta cada noche (--tag lento).
+	"""
+	N = 1_000_000
+	LOTE = 10_000
+	SERIE = {
+		"sqlite": "(WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < %s) SELECT i FROM n)",
+		"postgresql": "(SELECT generate_series(1, %s) AS i)",
+	}
+	FECHA = {
+		"sqlite": "date('2019-01-01', '+' || (p.id_parcela %% 1000) || ' days')",
+		"postgresql": "DATE '2019-01-01' + (p.id_parcela %% 1000)",
+	}
+
+	def sembrar(self):
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		with connection.cursor() as cursor:
+			cursor.execute(
+				"INSERT INTO cementerio_parcela (ubicacion, tamanio, estado, precio, sector, created_at, updated_at) "
+				"SELECT 'Sector ' || (s.i %% 20) || ' - ' || s.i, '2x2', 'RESERVADA', 1000, 'Sector ' || (s.i %% 20), "
+				f"CURRENT_TIMESTAMP, CURRENT_TIMESTAMP FROM {self.SERIE[connection.vendor]} AS s",
+				[self.N],
+			)
+			cursor.execute(
+				"INSERT INTO cementerio_reserva (fecha_reserva, estado, parcela_id, usuario_id, created_at, updated_at) "
+				f"SELECT {self.FECHA[connection.vendor]}, 'PENDIENTE', p.id_parcela, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP "
+				"FROM cementerio_parcela p",
+				[usuario.pk],
+			)
+			# Una de cada cinco con un pago; la mitad de esos, PAGADO (no caducan)
+			cursor.execute(
+				"INSERT INTO cementerio_pago (reserva_id, monto, fecha_pago, metodo_pago, estado_pago, created_at, updated_at) "
+				"SELECT r.id_reserva, 100, r.fecha_reserva, 'EFECTIVO', "
+				"CASE WHEN r.id_reserva %% 10 = 0 THEN 'PAGADO' ELSE 'PENDIENTE' END, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP "
+				"FROM cementerio_reserva r WHERE r.id_reserva %% 5 = 0",
+				[],
+			)
+		reconstruir()
+
+	def test_millon_de_reservas_en_memoria_y_tiempo_acotados(self):
+		if connection.vendor not in self.SERIE:
+			self.skipTest(f"Sin generador de series para {connection.vendor}")
+		self.sembrar()
+		pagadas = Pago.objects.filter(estado_pago="PAGADO").count()
+
+		tracemalloc.start()
+		inicio = time.monotonic()
+		try:
+			total = expirar_reservas(hoy=date(2024, 1, 1), dias=30, lote=self.LOTE)
+			duracion = time.monotonic() - inicio
+			_, pico = tracemalloc.get_traced_memory()
+		finally:
+			tracemalloc.stop()
+
+		self.assertEqual(total["reservas"], self.N - pagadas)
+		self.assertEqual(total["parcelas"], self.N - pagadas)
+		self.assertEqual(total["pagos"], pagadas)
+		# Las PAGADO no son candidatas: no ocupan sitio en los lotes
+		self.assertEqual(total["lotes"], -(-(self.N - pagadas) // self.LOTE))
+		self.assertFalse(Reserva.objects.filter(estado="PENDIENTE").exclude(pagos__estado_pago="PAGADO").exists())
+		# Solo los ids del lote: la lista de un millón de ids ya ocuparía ~40 MB
+		self.assertLess(pico, 32 * 1024 * 1024, f"pico de {pico / 1024 / 1024:.1f} MB")
+		self.assertLess(duracion, 300, f"{duracion:.0f}s")
+		self.assertEqual(OcupacionSector.objects.filter(estado="DISPONIBLE").aggregate(n=Sum("parcelas"))["n"], self.N - pagadas)
+
+
+
+def gastar_en_otro_proceso(ruta, clave, veces):
+	"""Otro worker de gunicorn: su propia conexión al mismo fichero."""
+	cubos = TokenBuckets(ruta)
+	return sum(cubos.gastar(clave, 50, 0.001)[0] for _ in range(veces))
+
+
+class ThrottleTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		token_cache.clear()
+		directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+		self.ruta = os.path.join(directorio, "throttle.sqlite3")
+		rest_framework = {
+			**settings.REST_FRAMEWORK,
+			"DEFAULT_THROTTLE_RATES": {
+				"anon": "5/min", "user": "100/min", "admin": None, "busqueda": "2/min", "exportacion": "1/hour",
+			},
+		}
+		ajustes = override_settings(
+			THROTTLE_ENABLED=True, THROTTLE_DB=self.ruta, METRICS_DIR=directorio, REST_FRAMEWORK=rest_framework,
+		)
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		Parcela.objects.create(ubicacion="A1", tamanio="2x2", precio=100)
+
+	def test_anonimo_429_con_retry_after(self):
+		for _ in range(5):
+			self.assertEqual(self.client.get("/api/parcelas/").status_code, 200)
+		response = self.client.get("/api/parcelas/")
+		self.assertEqual(response.status_code, 429)
+		self.assertEqual(response.json()["status_code"], 429)
+		# Una ficha cada 12 s
+		self.assertIn(int(response["Retry-After"]), (11, 12))
+		self.assertIn('cementerio_throttled_total{scope="anon"} 1.0', metrics.collect())
+		# Otra IP tiene su propio cubo; detrás de nginx cuenta la de X-Forwarded-For
+		self.assertEqual(self.client.get("/api/parcelas/", REMOTE_ADDR="10.0.0.2").status_code, 200)
+		self.assertEqual(self.client.get("/api/parcelas/", HTTP_X_FORWARDED_FOR="10.0.0.3").status_code, 200)
+
+	def test_busqueda_y_exportacion_con_su_propio_cubo(self):
+		for _ in range(2):
+			self.assertEqual(self.client.get("/api/parcelas/?search=A1").status_code, 200)
+		self.assertEqual(self.client.get("/api/parcelas/?search=A1").status_code, 429)
+		self.assertEqual(self.client.get("/api/parcelas/").status_code, 200)
+
+		cliente = APIClient()
+		cliente.force_authenticate(User.objects.create_user(username="admin", password="1234", is_staff=True))
+		self.assertEqual(cliente.get("/api/reservas/export/").status_code, 200)
+		response = cliente.get("/api/reservas/export/")
+		self.assertEqual(response.status_code, 429)
+		self.assertGreater(int(response["Retry-After"]), 3500)
+		# Sin límite para el rol admin
+		for _ in range(20):
+			self.assertEqual(cliente.get("/api/parcelas/").status_code, 200)
+
+	async def test_vistas_async(self):
+		for _ in range(5):
+			self.assertEqual((await self.async_client.get("/api/async/parcelas/")).status_code, 200)
+		response = await self.async_client.get("/api/async/parcelas/")
+		self.assertEqual(response.status_code, 429)
+		self.assertTrue(response["Retry-After"])
+
+	def test_relleno(self):
+		cubos = TokenBuckets(self.ruta)
+		self.assertEqual([cubos.gastar("k", 2, 1.0, ahora=100)[0] for _ in range(3)], [True, True, False])
+		self.assertAlmostEqual(cubos.gastar("k", 2, 1.0, ahora=100.25)[1], 0.75)
+		self.assertTrue(cubos.gastar("k", 2, 1.0, ahora=101)[0])
+		# Lleno tras el periodo, sin pasar de la capacidad
+		self.assertEqual([cubos.gastar("k", 2, 1.0, ahora=200)[0] for _ in range(3)], [True, True, False])
+		cubos.purgar(300)
+		self.assertTrue(cubos.gastar("k", 2, 1.0, ahora=300)[0])
+
+	def test_compartido_entre_procesos(self):
+		contexto = multiprocessing.get_context("fork")
+		with contexto.Pool(4) as pool:
+			permitidas = pool.starmap(gastar_en_otro_proceso, [(self.ruta, "anon:1.2.3.4", 25)] * 4)
+		# 100 intentos contra un cubo de 50 que apenas se rellena
+		self.assertEqual(sum(permitidas), 50)
+
+	def test_coste_por_peticion(self):
+		cubos = TokenBuckets(self.ruta)
+		cubos.gastar("k", 10, 1.0)
+		inicio = time.perf_counter()
+		for i in range(1000):
+			cubos.gastar(f"k{i % 50}", 10, 1.0)
+		self.assertLess((time.perf_counter() - inicio) / 1000, 0.001)
+
+
+class WireFormatsTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		for i in range(30):
+			Parcela.objects.create(ubicacion=f"Sector Norte - Fila {i} - Número {i}", tamanio="2x2", precio="1500.50")
+		self.admin = APIClient()
+		self.admin.force_authenticate(User.objects.create_user(username="admin", password="1234", is_staff=True))
+
+	def test_json_igual_que_drf(self):
+		datos = {
+			"monto": Decimal("750.50"),
+			"fecha": date(2024, 2, 29),
+			"instante": timezone.make_aware(datetime(2024, 1, 1, 10, 30, 15, 123456), dt_timezone.utc),
+			"texto": "Ramírez ñ \u2028 línea \u2029",
+			"lista": ReturnList([{"a": 1}, {"b": None}], serializer=None),
+		}
+		self.assertEqual(FastJSONRenderer().render(datos), JSONRenderer().render(datos))
+		self.assertIn(b"\\u2028", FastJSONRenderer().render(datos))
+		# La única diferencia, documentada: NaN e infinito salen como null en vez de error
+		with self.assertRaises(ValueError):
+			JSONRenderer().render({"x": float("nan")})
+		self.assertEqual(FastJSONRenderer().render({"x": float("nan"), "y": float("inf")}), b'{"x":null,"y":null}')
+		self.assertEqual(self.client.get("/api/parcelas/").json()["count"], 30)
+
+	def test_parser_json(self):
+		response = self.admin.post("/api/parcelas/", b'{"ubicacion": "Sector Sur - Fila 1', content_type="application/json")
+		self.assertEqual(response.status_code, 400)
+		self.assertIn("JSON parse error", str(response.json()["detail"]))
+		response = self.admin.post(
+			"/api/parcelas/", {"ubicacion": "Sector Sur - Fila 1 - Número 1", "tamanio": "2x2", "precio": "900.00"}, format="json",
+		)
+		self.assertEqual(response.status_code, 201)
+
+	@skipUnless(msgpack, "msgpack no está instalado")
+	def test_msgpack_por_accept(self):
+		response = self.client.get("/api/parcelas/", HTTP_ACCEPT="application/msgpack")
+		self.assertEqual(response["Content-Type"], "application/msgpack")
+		self.assertEqual(msgpack.unpackb(response.content), self.client.get("/api/parcelas/").json())
+		cuerpo = msgpack.packb({"ubicacion": "Sector Sur - Fila 2 - Número 2", "tamanio": "2x2", "precio": "900.00"})
+		response = self.admin.post("/api/parcelas/", cuerpo, content_type="application/msgpack")
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(self.admin.post("/api/parcelas/", b"\xc1", content_type="application/msgpack").status_code, 400)
+
+	def test_gzip_con_umbral(self):
+		normal = self.client.get("/api/parcelas/")
+		response = self.client.get("/api/parcelas/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+		self.assertEqual(response["Content-Encoding"], "gzip")
+		self.assertIn("Accept-Encoding", response["Vary"])
+		self.assertEqual(gzip.decompress(response.content), normal.content)
+		self.assertEqual(int(response["Content-Length"]), len(response.content))
+		self.assertFalse(self.client.get("/api/parcelas/", HTTP_ACCEPT_ENCODING="gzip;q=0").has_header("Content-Encoding"))
+		with override_settings(COMPRESSION_MIN_BYTES=len(normal.content) + 1):
+			self.assertFalse(self.client.get("/api/parcelas/", HTTP_ACCEPT_ENCODING="gzip").has_header("Content-Encoding"))
+
+	@skipUnless(brotli, "brotli no está instalado")
+	def test_brotli_preferido(self):
+		response = self.client.get("/api/parcelas/", HTTP_ACCEPT_ENCODING="gzip, br")
+		self.assertEqual(response["Content-Encoding"], "br")
+		self.assertEqual(brotli.decompress(response.content), self.client.get("/api/parcelas/").content)
+
+	def test_exportacion_en_streaming(self):
+		usuario = Usuario.objects.create(nombre="Ana", apellido="López", email="ana@example.com")
+		for parcela in Parcela.objects.all()[:3]:
+			Reserva.objects.create(usuario=usuario, parcela=parcela, fecha_reserva=date(2024, 1, 1))
+		response = self.admin.get("/api/reservas/export/?formato=ndjson", HTTP_ACCEPT_ENCODING="gzip")
+		self.assertEqual(response["Content-Encoding"], "gzip")
+		filas = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+		self.assertEqual(len(filas), 3)
+
+	def test_benchmark(self):
+		salida = io.StringIO()
+		call_command("benchmark_renderers", filas=20, repeticiones=1, stdout=salida)
+		self.assertIn("Pago     json orjson  gzip", salida.getvalue())
+		self.assertIn("Difunto  json DRF", salida.getvalue())
+		self.assertEqual(Parcela.objects.count(), 30)
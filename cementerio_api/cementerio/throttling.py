@@ -0,0 +1,196 @@
+import fcntl
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+
+# Una sola sentencia: SQLite toma el bloqueo de escritura del fichero, así
+# que leer el cubo, rellenarlo y gastar una ficha es atómico entre procesos.
+# En el SET las columnas valen lo que valían antes de la sentencia.
+_GASTAR = """
+INSERT INTO cubos (clave, fichas, instante, permitido) VALUES (:clave, :capacidad - 1, :ahora, 1)
+ON CONFLICT (clave) DO UPDATE SET
+    permitido = MIN(:capacidad, fichas + MAX(:ahora - instante, 0) * :ritmo) >= 1,
+    fichas = MIN(:capacidad, fichas + MAX(:ahora - instante, 0) * :ritmo)
+        - (MIN(:capacidad, fichas + MAX(:ahora - instante, 0) * :ritmo) >= 1),
+    instante = :ahora
+RETURNING fichas, permitido
+"""
+
+# Proporción de peticiones que además borran los cubos ya llenos (un cubo
+# lleno equivale a uno que no existe), para que el fichero no crezca con
+# cada IP que pasa
+_PROBABILIDAD_PURGA = 0.001
+
+_PERIODOS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def throttle_enabled():
+    return getattr(settings, "THROTTLE_ENABLED", True)
+
+
+def get_throttle_db():
+    return getattr(settings, "THROTTLE_DB", "/tmp/cementerio_api_throttle.sqlite3")
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    "120/min" -> (capacidad 120, ritmo 2 fichas por segundo). El cubo admite
+    ráfagas de hasta `capacidad` peticiones y se rellena en un periodo.
+    """
+    numero, periodo = rate.split("/")
+    capacidad = int(numero)
+    return capacidad, capacidad / _PERIODOS[periodo.strip()[0]]
+
+
+def periodo_maximo():
+    """Segundos que tarda en llenarse el cubo más lento de los configurados."""
+    rates = [rate for rate in api_settings.DEFAULT_THROTTLE_RATES.values() if rate]
+    return max((capacidad / ritmo for capacidad, ritmo in map(parse_rate, rates)), default=0)
+
+
+class TokenBuckets:
+    """
+    Cubos de fichas en un fichero SQLite local compartido por los workers
+    de gunicorn de la máquina, sin Redis. Cada proceso e hilo abre su
+    propia conexión; el fichero está en WAL y sin fsync, así que perderlo
+    en un reinicio solo vacía los límites.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None, check_same_thread=False)
+            conexion.execute("PRAGMA synchronous=OFF")
+            # Pasar a WAL no espera al busy_timeout: si los workers arrancan a
+            # la vez sobre un fichero nuevo, uno recibe "database is locked".
+            # Se prepara de uno en uno con un flock sobre un fichero aparte.
+            with open(f"{self.ruta}.lock", "a") as candado:
+                fcntl.flock(candado, fcntl.LOCK_EX)
+                conexion.execute("PRAGMA journal_mode=WAL")
+                conexion.execute(
+                    "CREATE TABLE IF NOT EXISTS cubos "
+                    "(clave TEXT PRIMARY KEY, fichas REAL NOT NULL, instante REAL NOT NULL, permitido INTEGER NOT NULL)"
+                )
+            self._local.conexion = conexion
+        return conexion
+
+    def gastar(self, clave, capacidad, ritmo, ahora=None):
+        """
+        Gasta una ficha del cubo `clave`. Devuelve (permitido, espera): los
+        segundos hasta que haya una ficha si no quedaba ninguna.
+        """
+        ahora = time.time() if ahora is None else ahora
+        conexion = self._conexion()
+        fichas, permitido = conexion.execute(
+            _GASTAR, {"clave": clave, "capacidad": capacidad, "ritmo": ritmo, "ahora": ahora},
+        ).fetchone()
+        if permitido:
+            return True, None
+        return False, (1 - fichas) / ritmo
+
+    def purgar(self, antes_de):
+        """Borra los cubos sin uso desde `antes_de`."""
+        self._conexion().execute("DELETE FROM cubos WHERE instante < ?", [antes_de])
+
+    def vaciar(self):
+        self._conexion().execute("DELETE FROM cubos")
+
+
+_cubos = None
+_cubos_clave = None
+_cubos_lock = threading.Lock()
+
+
+def cubos():
+    """Los cubos del fichero THROTTLE_DB de este proceso; se reabre tras un fork."""
+    global _cubos, _cubos_clave
+    clave = (os.getpid(), get_throttle_db())
+    if _cubos_clave != clave:
+        with _cubos_lock:
+            if _cubos_clave != clave:
+                _cubos = TokenBuckets(clave[1])
+                _cubos_clave = clave
+    return _cubos
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base de los límites de peticiones con cubos de fichas compartidos.
+
+    Los ritmos se configuran por alcance en
+    REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] ("120/min"); un alcance sin
+    ritmo no se limita. Las subclases eligen el alcance con get_scope().
+    """
+
+    def get_scope(self, request, view):
+        raise NotImplementedError
+
+    def get_ident_for(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"u{request.user.pk}"
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        self.espera = None
+        if not throttle_enabled():
+            return True
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if not rate:
+            return True
+        capacidad, ritmo = parse_rate(rate)
+        almacen = cubos()
+        permitido, self.espera = almacen.gastar(f"{scope}:{self.get_ident_for(request)}", capacidad, ritmo)
+        if random.random() < _PROBABILIDAD_PURGA:
+            # Pasado el periodo más largo cualquier cubo está lleno
+            almacen.purgar(time.time() - periodo_maximo())
+        if not permitido:
+            metrics.inc("cementerio_throttled_total", scope=scope)
+        return permitido
+
+    def wait(self):
+        return self.espera
+
+
+class RoleRateThrottle(TokenBucketThrottle):
+    """Un cubo por cliente según quién es: anon (por IP), user o admin."""
+
+    def get_scope(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return "anon"
+        return "admin" if user.is_staff else "user"
+
+
+class ExpensiveRateThrottle(TokenBucketThrottle):
+    """
+    Un segundo cubo para las acciones caras: las que declaran
+    `throttle_scope` (las exportaciones) y los listados con ?search=, que
+    no usan índices y recorren la tabla.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if scope:
+            return scope
+        if getattr(view, "action", None) == "list" and request.query_params.get(api_settings.SEARCH_PARAM):
+            return "busqueda"
+        return None
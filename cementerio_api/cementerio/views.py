@@ -1,13 +1,36 @@
-from rest_framework import viewsets, status
+from datetime import date, timedelta
+from decimal import Decimal
+
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
+from rest_framework.reverse import reverse
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Prefetch, Sum
+from django.http import FileResponse, HttpResponse
 
-from .models import Usuario, Parcela, Reserva, Pago, Difunto
+from . import metrics
+from .authentication import token_cache, token_expirado
+from .bulk import BulkMixin
+from .cache import STATS_CACHE_KEY, CachedResponseMixin, get_stats_timeout
+from .db_router import ReplicaReadMixin
+from .export import ExportMixin
+from .exceptions import ResultadoNoDisponible
+from .filters import EXACTO, RANGO, FieldFilterBackend
+from .jobs import encolar
+from .models import (
+    Usuario, Parcela, Reserva, Pago, Difunto,
+    IngresoDiario, IngresoMensual, ReservaMensual, OcupacionSector, Job,
+)
 from .serializers import (
     UsuarioSerializer,
     ParcelaSerializer,
@@ -15,13 +38,51 @@ from .serializers import (
     PagoSerializer,
     DifuntoSerializer,
     AuthUserSerializer,
+    JobSerializer,
+    JobCreateSerializer,
 )
+from .pagination import KeysetPagination
 from .permissions import IsAdminOrReadOnly
+from .rows import FastReadMixin
+from .search import DifuntoSearchFilter
+from .sparse import SparseFieldsetMixin
+from .sync import SyncMixin
+from .services import liberar_parcela, reservar_parcela, sincronizar_parcela
 
 
-class BaseViewSet(viewsets.ModelViewSet):
-    filter_backends = [SearchFilter, OrderingFilter]
+def conteo_por(queryset, campo, claves):
+    """Filas por valor de `campo` en una consulta agrupada: {nombre: n, ..., "total": n}."""
+    filas = queryset.order_by().values(campo).annotate(n=Count("pk"))
+    conteos = {fila[campo]: fila["n"] for fila in filas}
+    resultado = {nombre: conteos.get(valor, 0) for valor, nombre in claves}
+    resultado["total"] = sum(conteos.values())
+    return resultado
+
+
+ESTADOS_PARCELA = [("DISPONIBLE", "disponibles"), ("RESERVADA", "reservadas"), ("OCUPADA", "ocupadas")]
+ESTADOS_RESERVA = [("PENDIENTE", "pendientes"), ("CONFIRMADA", "confirmadas"), ("CANCELADA", "canceladas")]
+ESTADOS_PAGO = {"PENDIENTE": "pendientes", "PAGADO": "pagados", "ANULADO": "anulados"}
+
+
+class BaseViewSet(ReplicaReadMixin, SyncMixin, CachedResponseMixin, SparseFieldsetMixin, FastReadMixin, viewsets.ModelViewSet):
+    filter_backends = [FieldFilterBackend, SearchFilter, OrderingFilter]
+    # Filtros exactos y por rango (?campo=, ?campo__in=, ?campo__gte=...)
+    filter_fields = {}
     permission_classes = [IsAdminOrReadOnly]
+    # Campo de fecha para la paginación por cursor (?pagination=cursor)
+    keyset_field = None
+
+    def usa_keyset(self):
+        params = self.request.query_params
+        return bool(self.keyset_field) and (
+            params.get("pagination") == "cursor" or KeysetPagination.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.usa_keyset():
+            self._paginator = KeysetPagination(self.keyset_field, api_settings.PAGE_SIZE)
+        return super().paginator
 
 
 class MeView(APIView):
@@ -47,6 +108,66 @@ class MeView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class MisDatosView(ReplicaReadMixin, APIView):
+    """
+    Base de /api/me/reservas/ y /api/me/pagos/: solo las filas del Usuario
+    enlazado con la cuenta autenticada (Usuario.user), paginadas, con los
+    totales por estado de todas ellas calculados en SQL. Una cuenta sin
+    Usuario enlazado recibe listas vacías.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def paginada(self, request, queryset, serializer_class, totales, **opciones):
+        paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+        pagina = paginator.paginate_queryset(queryset, request, view=self)
+        data = serializer_class(pagina, many=True, **opciones).data
+        response = paginator.get_paginated_response(data)
+        response.data["totales"] = totales
+        return response
+
+
+class MisReservasView(MisDatosView):
+    """
+    GET /api/me/reservas/
+    Reservas del cliente con sus pagos anidados. Cuatro consultas sea cual
+    sea el número de reservas: totales, count, página (con usuario y parcela
+    en un JOIN) y los pagos de la página con prefetch_related.
+    """
+
+    def get(self, request):
+        reservas = Reserva.objects.filter(usuario__user=request.user)
+        queryset = (
+            reservas.select_related("usuario", "parcela")
+            .prefetch_related(Prefetch("pagos", queryset=Pago.objects.order_by("-fecha_pago", "-id_pago")))
+            .order_by("-fecha_reserva", "-id_reserva")
+        )
+        totales = conteo_por(reservas, "estado", ESTADOS_RESERVA)
+        return self.paginada(request, queryset, ReservaSerializer, totales, expand=("pagos",))
+
+
+class MisPagosView(MisDatosView):
+    """
+    GET /api/me/pagos/
+    Pagos de todas las reservas del cliente, con número y monto por estado.
+    """
+
+    def get(self, request):
+        pagos = Pago.objects.filter(reserva__usuario__user=request.user)
+        queryset = pagos.select_related("reserva").order_by("-fecha_pago", "-id_pago")
+        return self.paginada(request, queryset, PagoSerializer, self.totales(pagos))
+
+    @staticmethod
+    def totales(pagos):
+        totales = {"total": 0, **dict.fromkeys(ESTADOS_PAGO.values(), 0)}
+        montos = {f"monto_{estado.lower()}": Decimal("0") for estado in ESTADOS_PAGO}
+        for fila in pagos.order_by().values("estado_pago").annotate(n=Count("pk"), monto=Sum("monto")):
+            totales["total"] += fila["n"]
+            if fila["estado_pago"] in ESTADOS_PAGO:
+                totales[ESTADOS_PAGO[fila["estado_pago"]]] = fila["n"]
+                montos[f"monto_{fila['estado_pago'].lower()}"] = fila["monto"] or Decimal("0")
+        return {**totales, **montos}
+
+
 class AuthUserViewSet(viewsets.ModelViewSet):
     """ViewSet para gestionar usuarios de autenticación (Django User)"""
     queryset = User.objects.all().order_by('id')
@@ -60,30 +181,289 @@ class UsuarioViewSet(BaseViewSet):
     queryset = Usuario.objects.all().order_by("id_usuario")
     serializer_class = UsuarioSerializer
     search_fields = ["nombre", "apellido", "email", "telefono", "tipo_usuario"]
+    filter_fields = {"tipo_usuario": EXACTO}
 
 
-class ParcelaViewSet(BaseViewSet):
+class ParcelaViewSet(BulkMixin, BaseViewSet):
     queryset = Parcela.objects.all().order_by("id_parcela")
     serializer_class = ParcelaSerializer
     search_fields = ["ubicacion", "estado", "tamanio"]
+    filter_fields = {"estado": EXACTO, "tamanio": EXACTO, "precio": RANGO}
+
+    def preparar_instancia_bulk(self, instance):
+        instance.actualizar_sector()
+
+    def campos_derivados_bulk(self, campos):
+        return {"sector"} if "ubicacion" in campos else set()
 
 
-class ReservaViewSet(BaseViewSet):
+class ReservaViewSet(ExportMixin, BaseViewSet):
     queryset = Reserva.objects.select_related("usuario", "parcela").all().order_by("-fecha_reserva")
     serializer_class = ReservaSerializer
+    keyset_field = "fecha_reserva"
+    cache_dependencies = [Reserva, Usuario, Parcela]
+    export_fields = [
+        ("id_reserva", "id_reserva"),
+        ("fecha_reserva", "fecha_reserva"),
+        ("estado", "estado"),
+        ("usuario", "usuario_id"),
+        ("usuario_nombre", "usuario__nombre"),
+        ("usuario_apellido", "usuario__apellido"),
+        ("parcela", "parcela_id"),
+        ("parcela_ubicacion", "parcela__ubicacion"),
+    ]
     search_fields = ["usuario__nombre", "usuario__apellido", "parcela__ubicacion", "estado"]
+    filter_fields = {"estado": EXACTO, "fecha_reserva": RANGO, "parcela": EXACTO, "usuario": EXACTO}
 
+    def perform_create(self, serializer):
+        serializer.instance = reservar_parcela(**serializer.validated_data)
 
-class PagoViewSet(BaseViewSet):
+    def perform_update(self, serializer):
+        estado_anterior = serializer.instance.estado
+        parcela_anterior = serializer.instance.parcela_id
+        with transaction.atomic():
+            reserva = serializer.save()
+            sincronizar_parcela(reserva, estado_anterior, parcela_anterior)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if instance.estado != "CANCELADA":
+                liberar_parcela(instance.parcela_id)
+            instance.delete()
+
+
+class PagoViewSet(ExportMixin, BaseViewSet):
     queryset = Pago.objects.select_related("reserva").all().order_by("-fecha_pago")
     serializer_class = PagoSerializer
+    keyset_field = "fecha_pago"
+    cache_dependencies = [Pago, Reserva]
+    export_fields = [
+        ("id_pago", "id_pago"),
+        ("reserva", "reserva_id"),
+        ("fecha_pago", "fecha_pago"),
+        ("monto", "monto"),
+        ("metodo_pago", "metodo_pago"),
+        ("estado_pago", "estado_pago"),
+    ]
     search_fields = ["estado_pago", "metodo_pago", "reserva__id_reserva"]
+    filter_fields = {"estado_pago": EXACTO, "metodo_pago": EXACTO, "fecha_pago": RANGO, "reserva": EXACTO}
 
 
-class DifuntoViewSet(BaseViewSet):
+class DifuntoViewSet(BulkMixin, BaseViewSet):
     queryset = Difunto.objects.select_related("parcela").all().order_by("apellido", "nombre")
     serializer_class = DifuntoSerializer
-    search_fields = ["nombre", "apellido", "parcela__ubicacion"]
+    cache_dependencies = [Difunto, Parcela]
+    # Búsqueda por nombre con índice trigram (PostgreSQL) o FTS5 (SQLite)
+    filter_backends = [FieldFilterBackend, DifuntoSearchFilter, OrderingFilter]
+    filter_fields = {"parcela": EXACTO}
+
+    def preparar_instancia_bulk(self, instance):
+        instance.actualizar_texto_busqueda()
+
+    def campos_derivados_bulk(self, campos):
+        return {"texto_busqueda"} if campos & {"nombre", "apellido"} else set()
+
+
+class StatsView(APIView):
+    """
+    GET /api/stats/
+    Estadísticas agregadas para el dashboard, calculadas con consultas
+    agrupadas en la base de datos y cacheadas hasta la siguiente escritura.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        data = cache.get(STATS_CACHE_KEY)
+        metrics.inc("cementerio_cache_requests_total", cache="stats", result="miss" if data is None else "hit")
+        if data is None:
+            data = self.calcular_estadisticas()
+            cache.set(STATS_CACHE_KEY, data, get_stats_timeout())
+        return Response(data)
+
+    def calcular_estadisticas(self):
+        parcelas = conteo_por(Parcela.objects, "estado", ESTADOS_PARCELA)
+        reservas = conteo_por(Reserva.objects, "estado", ESTADOS_RESERVA)
+
+        pagos = {
+            "total": 0,
+            "pendientes": 0,
+            "pagados": 0,
+            "anulados": 0,
+            "monto_total": Decimal("0"),
+            "monto_pagado": Decimal("0"),
+            "monto_por_metodo": {},
+        }
+        filas = (
+            Pago.objects.order_by()
+            .values("estado_pago", "metodo_pago")
+            .annotate(n=Count("pk"), monto=Sum("monto"))
+        )
+        for fila in filas:
+            monto = fila["monto"] or Decimal("0")
+            pagos["total"] += fila["n"]
+            if fila["estado_pago"] in ESTADOS_PAGO:
+                pagos[ESTADOS_PAGO[fila["estado_pago"]]] += fila["n"]
+            pagos["monto_total"] += monto
+            if fila["estado_pago"] == "PAGADO":
+                pagos["monto_pagado"] += monto
+            por_metodo = pagos["monto_por_metodo"]
+            por_metodo[fila["metodo_pago"]] = por_metodo.get(fila["metodo_pago"], Decimal("0")) + monto
+
+        return {
+            "usuarios": Usuario.objects.count(),
+            "parcelas": parcelas,
+            "reservas": reservas,
+            "pagos": pagos,
+            "difuntos": Difunto.objects.count(),
+        }
+
+
+class ReportsView(APIView):
+    """
+    GET /api/reports/?desde=2023-01&hasta=2024-12[&granularidad=dia]
+    Ingresos por periodo, método y estado de pago; reservas por mes, sector
+    y estado; y ocupación actual por sector. Solo lee las tablas de rollup,
+    así que varios años de informe son unas decenas de filas.
+    Con granularidad=dia las fechas son YYYY-MM-DD y el rango máximo es
+    MAX_DIAS.
+    """
+    permission_classes = [IsAdminUser]
+    MAX_DIAS = 366
+    ESTADOS_PARCELA = [estado for estado, _ in Parcela.ESTADO_CHOICES]
+
+    def get(self, request):
+        granularidad = request.query_params.get("granularidad", "mes")
+        if granularidad not in ("mes", "dia"):
+            raise ValidationError({"granularidad": "Use mes o dia."})
+        desde = self.fecha(request, "desde", granularidad)
+        hasta = self.fecha(request, "hasta", granularidad, fin=True)
+        if granularidad == "dia":
+            if desde is None or hasta is None or (hasta - desde).days >= self.MAX_DIAS:
+                raise ValidationError({"desde": f"Con granularidad=dia indique desde y hasta (máximo {self.MAX_DIAS} días)."})
+            ingresos = self.filtrar(IngresoDiario.objects, "fecha", desde, hasta)
+            campo_periodo, formato = "fecha", "%Y-%m-%d"
+        else:
+            ingresos = self.filtrar(IngresoMensual.objects, "mes", desde, hasta)
+            campo_periodo, formato = "mes", "%Y-%m"
+
+        reservas = self.filtrar(ReservaMensual.objects, "mes", desde, hasta)
+        return Response({
+            "granularidad": granularidad,
+            "ingresos": [
+                {
+                    "periodo": fila[campo_periodo].strftime(formato),
+                    "metodo_pago": fila["metodo_pago"],
+                    "estado_pago": fila["estado_pago"],
+                    "total": fila["total"],
+                    "pagos": fila["pagos"],
+                }
+                for fila in ingresos.filter(pagos__gt=0)
+                .order_by(campo_periodo, "metodo_pago", "estado_pago")
+                .values(campo_periodo, "metodo_pago", "estado_pago", "total", "pagos")
+            ],
+            "reservas": [
+                {"periodo": fila["mes"].strftime("%Y-%m"), "sector": fila["sector"], "estado": fila["estado"], "reservas": fila["reservas"]}
+                for fila in reservas.filter(reservas__gt=0)
+                .order_by("mes", "sector", "estado").values("mes", "sector", "estado", "reservas")
+            ],
+            "ocupacion": self.ocupacion(),
+        })
+
+    @staticmethod
+    def fecha(request, nombre, granularidad, fin=False):
+        valor = request.query_params.get(nombre)
+        if not valor:
+            return None
+        try:
+            if granularidad == "dia":
+                return date.fromisoformat(valor)
+            inicio = date.fromisoformat(f"{valor}-01")
+        except ValueError:
+            formato = "YYYY-MM-DD" if granularidad == "dia" else "YYYY-MM"
+            raise ValidationError({nombre: f"Formato {formato}."})
+        if not fin:
+            return inicio
+        return (inicio + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+
+    @staticmethod
+    def filtrar(queryset, campo, desde, hasta):
+        if desde is not None:
+            queryset = queryset.filter(**{f"{campo}__gte": desde})
+        if hasta is not None:
+            queryset = queryset.filter(**{f"{campo}__lte": hasta})
+        return queryset
+
+    def ocupacion(self):
+        sectores = {}
+        for fila in OcupacionSector.objects.filter(parcelas__gt=0).order_by("sector").values("sector", "estado", "parcelas"):
+            sector = sectores.setdefault(fila["sector"], {"sector": fila["sector"], **dict.fromkeys(self.ESTADOS_PARCELA, 0)})
+            sector[fila["estado"]] = fila["parcelas"]
+        for sector in sectores.values():
+            sector["total"] = sum(sector[estado] for estado in self.ESTADOS_PARCELA)
+            ocupadas = sector["total"] - sector["DISPONIBLE"]
+            sector["porcentaje_ocupado"] = round(100 * ocupadas / sector["total"], 1) if sector["total"] else 0.0
+        return list(sectores.values())
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Trabajos en segundo plano (ver jobs.py y run_workers):
+
+        POST /api/jobs/ {"tipo": "exportar", "parametros": {"recurso": "pagos", "formato": "csv"}}
+        -> 202 {"id": 7, "estado": "PENDIENTE", ...} y Location: /api/jobs/7/
+        GET  /api/jobs/7/            estado, progreso (0-100), resultado o error
+        GET  /api/jobs/7/resultado/  el fichero generado
+
+    Las importaciones se envían en multipart con el CSV en `entrada` y
+    `parametros` como texto JSON ({"tabla": "parcelas"}). Sin cache ni
+    réplica: el progreso tiene que verse al momento.
+    """
+    queryset = Job.objects.order_by("-pk")
+    serializer_class = JobSerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {"estado": EXACTO, "tipo": EXACTO}
+
+    def create(self, request, *args, **kwargs):
+        entrada = JobCreateSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        job = encolar(usuario=request.user, **entrada.validated_data)
+        serializer = self.get_serializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED, headers={"Location": reverse("job-detail", args=[job.pk], request=request)})
+
+    @action(detail=True, methods=["get"])
+    def resultado(self, request, pk=None):
+        job = self.get_object()
+        if job.estado != "COMPLETADO":
+            raise ResultadoNoDisponible()
+        if not job.archivo:
+            raise NotFound("Este trabajo no genera fichero; vea 'resultado'.")
+        return FileResponse(
+            job.archivo.open("rb"),
+            as_attachment=True,
+            filename=job.archivo.name.rsplit("/", 1)[-1],
+            content_type=job.content_type or None,
+        )
+
+
+class AuthCacheStatsView(APIView):
+    """GET /api/auth/cache-stats/: contadores de la cache de tokens de este worker"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(token_cache.stats())
+
+
+class MetricsView(APIView):
+    """
+    GET /metrics
+    Métricas en formato de texto de Prometheus, sumadas entre todos los
+    workers de gunicorn (ver cementerio.metrics).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.collect(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 class CustomAuthToken(ObtainAuthToken):
@@ -93,9 +473,17 @@ class CustomAuthToken(ObtainAuthToken):
     """
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data, context={"request": request})
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            metrics.inc("cementerio_auth_failures_total", reason="login")
+            raise ValidationError(serializer.errors)
         user = serializer.validated_data["user"]
-        token, created = Token.objects.get_or_create(user=user)
+        with transaction.atomic():
+            token, created = Token.objects.select_for_update().get_or_create(user=user)
+            if token_expirado(token):
+                # Borrarlo saca la clave vieja de token_cache en todos los
+                # workers (señal post_delete de Token, ver signals.py)
+                token.delete()
+                token = Token.objects.create(user=user)
         return Response({
             "token": token.key,
             "user_id": user.id,
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 
@@ -47,8 +48,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cementerio.metrics.MetricsMiddleware',
+    'cementerio.instrumentation.SQLInstrumentationMiddleware',
+    'cementerio.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'cementerio.middleware.AsyncWhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,24 +91,150 @@ if IS_CI:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
-        }
+        },
+        # Segunda base para probar el router de réplicas en local
+        # (READ_REPLICAS=replica); los tests la crean aparte
+        "replica": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db_replica.sqlite3",
+        },
     }
+    READ_REPLICAS = [alias for alias in os.getenv('READ_REPLICAS', '').split(',') if alias]
 else:
     # Use PostgreSQL in production/local development
+    # Pool por proceso (cementerio.backends.pool): con CONN_MAX_AGE = 0 cada
+    # petición devuelve su conexión al pool al terminar
+    DB_POOL = {
+        "MAX_SIZE": int(os.getenv('DB_POOL_SIZE', '10')),
+        # Segundos esperando una conexión libre antes de fallar
+        "TIMEOUT": 30,
+        # Segundos libre tras los que una conexión se comprueba antes de usarla
+        "CHECK_AFTER": 30,
+        # Segundos de vida máxima de una conexión
+        "MAX_LIFETIME": 3600,
+    }
     DATABASES = {
         "default": {
-            "ENGINE": "django.db.backends.postgresql",
-            "NAME": "cementerio_db",
-            "USER": "postgres",
-            "PASSWORD": "Abc123",
-            "HOST": "localhost",
-            "PORT": "5432",
+            "ENGINE": "cementerio.backends.postgresql",
+            # Las variables DB_* las define deploy.yml para los tests
+            "NAME": os.getenv('DB_NAME', 'cementerio_db'),
+            "USER": os.getenv('DB_USER', 'postgres'),
+            "PASSWORD": os.getenv('DB_PASSWORD', 'Abc123'),
+            "HOST": os.getenv('DB_HOST', 'localhost'),
+            "PORT": os.getenv('DB_PORT', '5432'),
+            "CONN_MAX_AGE": 0,
+            "POOL": DB_POOL,
+        }
+    }
+    # Réplicas de lectura: DATABASE_REPLICAS="host1,host2" añade los alias
+    # replica_1, replica_2... con la misma base de datos y credenciales
+    for numero, host in enumerate(filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1):
+        DATABASES[f"replica_{numero}"] = {
+            **DATABASES["default"],
+            "HOST": host.strip(),
+            "TEST": {"MIRROR": "default"},
+        }
+    READ_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+DATABASE_ROUTERS = ["cementerio.db_router.PrimaryReplicaRouter"]
+# Segundos que un cliente lee de la primaria tras escribir (y que cualquier
+# lectura de un modelo recién modificado va a la primaria)
+REPLICA_STICKY_SECONDS = 5
+
+# Cache
+# Los workers de gunicorn son procesos separados: en producción se usa una
+# caché en disco compartida para que la invalidación llegue a todos ellos.
+
+if IS_CI:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv('CACHE_DIR', '/tmp/cementerio_api_cache'),
         }
     }
 
+# Segundos que se conservan las estadísticas del dashboard (/api/stats/)
+STATS_CACHE_TIMEOUT = 300
+
+# Segundos que se conservan las respuestas GET cacheadas de los viewsets.
+# Se invalidan antes con cada escritura en los modelos de los que dependen.
+RESPONSE_CACHE_TIMEOUT = 600
+
+# Cache de tokens en cada proceso (cementerio.authentication)
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 300
+# Antigüedad máxima de un token en segundos; None = sin caducidad
+TOKEN_EXPIRATION_SECONDS = None
+
+# Sincronización por deltas (?updated_since=, cementerio.sync): el watermark
+# va SYNC_WATERMARK_LAG segundos por detrás para no perder transacciones que
+# confirman tarde; con más de SYNC_MAX_CHANGES cambios se responde 410. Las
+# lápidas de borrados se conservan SYNC_TOMBSTONE_DAYS días (purge_tombstones).
+# Una escritura masiva (importación, caducidad, /bulk/) que tarda más que
+# SYNC_WATERMARK_LAG en confirmar desde que pone updated_at se deshace (ver
+# cementerio.sync.Sello): bajar el tamaño del lote o subir este valor.
+SYNC_WATERMARK_LAG = 5
+SYNC_MAX_CHANGES = 5000
+SYNC_TOMBSTONE_DAYS = 30
+
+# Trabajos en segundo plano (cementerio.jobs, manage.py run_workers): hilos
+# del pool, segundos entre consultas a la cola, intentos por trabajo y
+# backoff exponencial entre ellos (base y tope en segundos). Un trabajo sin
+# latido en JOBS_STALE_SECONDS se da por abandonado y vuelve a la cola.
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '2'))
+JOBS_POLL_INTERVAL = 1.0
+JOBS_MAX_ATTEMPTS = 3
+JOBS_BACKOFF_BASE = 30
+JOBS_BACKOFF_MAX = 3600
+JOBS_STALE_SECONDS = 300
+
+# Caducidad de reservas (cementerio.expiry, manage.py expire_reservations):
+# una reserva PENDIENTE sin pagos PAGADO con más de RESERVA_EXPIRY_DAYS días
+# se cancela y su parcela vuelve a DISPONIBLE, en lotes de
+# RESERVA_EXPIRY_BATCH filas por transacción. None desactiva la caducidad.
+RESERVA_EXPIRY_DAYS = 30
+RESERVA_EXPIRY_BATCH = 1000
+
+# Instrumentación por petición (cementerio.instrumentation): cabecera
+# Server-Timing y registro de peticiones lentas y patrones N+1 en el logger
+# "cementerio.sql". Apagada, el middleware no se carga.
+SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', 'false').lower() == 'true'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '500'))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', '50'))
+N_PLUS_ONE_THRESHOLD = 10
+
+# Métricas de Prometheus en /metrics (cementerio.metrics). Cada worker
+# escribe en su propio fichero mmap dentro de METRICS_DIR y /metrics suma
+# todos; el directorio debe ser local y compartido por los workers.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/cementerio_api_metrics')
+
+# Compresión de respuestas (cementerio.middleware.CompressionMiddleware):
+# brotli si el paquete está instalado y el cliente lo acepta, si no gzip
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "cementerio": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "cementerio.authentication.CachedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
@@ -117,8 +247,39 @@ REST_FRAMEWORK = {
         "rest_framework.filters.OrderingFilter",
     ],
     "EXCEPTION_HANDLER": "cementerio.exceptions.custom_exception_handler",
+    # JSON con orjson (cementerio.renderers); MessagePack solo si está instalado
+    "DEFAULT_RENDERER_CLASSES": [
+        "cementerio.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ] + (["cementerio.renderers.MessagePackRenderer"] if find_spec("msgpack") else []),
+    "DEFAULT_PARSER_CLASSES": [
+        "cementerio.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ] + (["cementerio.renderers.MessagePackParser"] if find_spec("msgpack") else []),
+    # Límites por cubos de fichas compartidos entre workers (cementerio.throttling):
+    # uno por rol y otro para búsquedas y exportaciones. "N/periodo" admite
+    # ráfagas de N peticiones y se rellena en el periodo; None = sin límite
+    "DEFAULT_THROTTLE_CLASSES": [
+        "cementerio.throttling.RoleRateThrottle",
+        "cementerio.throttling.ExpensiveRateThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": os.getenv('THROTTLE_ANON', '120/min'),
+        "user": os.getenv('THROTTLE_USER', '600/min'),
+        "admin": os.getenv('THROTTLE_ADMIN', '3000/min'),
+        "busqueda": os.getenv('THROTTLE_BUSQUEDA', '30/min'),
+        "exportacion": os.getenv('THROTTLE_EXPORTACION', '20/hour'),
+    },
+    # nginx delante: la IP del cliente es la última de X-Forwarded-For
+    "NUM_PROXIES": int(os.getenv('NUM_PROXIES', '1')),
 }
 
+# Fichero SQLite local de los cubos, compartido por los workers de la
+# máquina; en CI va apagado y las pruebas que lo necesitan lo activan
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'false' if IS_CI else 'true').lower() == 'true'
+THROTTLE_DB = os.getenv('THROTTLE_DB', '/tmp/cementerio_api_throttle.sqlite3')
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from cementerio.async_views import AsyncListView, AsyncDetailView, AsyncExportView
 from cementerio.views import (
     UsuarioViewSet,
     ParcelaViewSet,
@@ -10,7 +11,14 @@ from cementerio.views import (
     DifuntoViewSet,
     CustomAuthToken,
     AuthUserViewSet,
+    JobViewSet,
     MeView,
+    MisReservasView,
+    MisPagosView,
+    StatsView,
+    ReportsView,
+    AuthCacheStatsView,
+    MetricsView,
 )
 
 router = DefaultRouter()
@@ -20,10 +28,34 @@ router.register(r"reservas", ReservaViewSet, basename="reserva")
 router.register(r"pagos", PagoViewSet, basename="pago")
 router.register(r"difuntos", DifuntoViewSet, basename="difunto")
 router.register(r"auth-users", AuthUserViewSet, basename="auth-user")
+router.register(r"jobs", JobViewSet, basename="job")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include(router.urls)),
     path("api/auth/login/", CustomAuthToken.as_view(), name="api_login"),
+    path("api/auth/cache-stats/", AuthCacheStatsView.as_view(), name="auth_cache_stats"),
     path("api/me/", MeView.as_view(), name="me"),
+    path("api/me/reservas/", MisReservasView.as_view(), name="me_reservas"),
+    path("api/me/pagos/", MisPagosView.as_view(), name="me_pagos"),
+    path("api/stats/", StatsView.as_view(), name="stats"),
+    path("api/reports/", ReportsView.as_view(), name="reports"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
+
+# Lecturas async (ORM async) para desplegar bajo un worker ASGI
+for prefijo, viewset in [
+    ("parcelas", ParcelaViewSet),
+    ("difuntos", DifuntoViewSet),
+    ("reservas", ReservaViewSet),
+    ("pagos", PagoViewSet),
+]:
+    opciones = {"viewset_class": viewset, "sync_filters": viewset is DifuntoViewSet}
+    urlpatterns.append(path(f"api/async/{prefijo}/", AsyncListView.as_view(**opciones), name=f"async-{prefijo}-list"))
+    if hasattr(viewset, "aexport"):
+        urlpatterns.append(path(
+            f"api/async/{prefijo}/export/", AsyncExportView.as_view(**opciones), name=f"async-{prefijo}-export",
+        ))
+    urlpatterns.append(path(
+        f"api/async/{prefijo}/<pk>/", AsyncDetailView.as_view(**opciones), name=f"async-{prefijo}-detail",
+    ))